@@ -0,0 +1,27 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for the collectd plugin. They run against the fake collectd
+module in tests, so that they can be run without collectd.
+"""
+
+import os
+import sys
+
+# Make the fake collectd module importable before the plugin is imported.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                             'tests'))
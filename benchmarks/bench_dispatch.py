@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmarks of the dispatch paths of CollectdPlugin, without any HTTP.
+
+    python -m benchmarks.bench_dispatch --sizes 10 1000 100000
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from benchmarks import fixtures
+from benchmarks.bench_read import DispatchCounter, make_plugin
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+
+def bench_dispatch_values(plugin, queues):
+    """
+    Dispatches one value per queue.
+    """
+    for queue in queues:
+        plugin.dispatch_values(queue['messages'], 'rabbitmq_default',
+                               'queues', queue['name'], 'messages')
+
+
+def bench_dispatch_message_stats(plugin, queues):
+    """
+    Dispatches the message stats of every queue.
+    """
+    for queue in queues:
+        plugin.dispatch_message_stats(queue, queue['vhost'], 'queues',
+                                      queue['name'])
+
+
+def bench_dispatch_queue_stats(plugin, queues):
+    """
+    Dispatches the queue stats of every queue.
+    """
+    for queue in queues:
+        plugin.dispatch_queue_stats(queue, queue['vhost'], 'queues',
+                                    queue['name'])
+
+
+def bench_dispatch_nodes(plugin, queues):
+    """
+    Dispatches one set of node stats per queue.
+    """
+    nodes = [fixtures.node('rabbit@bench')]
+    plugin.rabbit.get_nodes = lambda: nodes
+    for _ in queues:
+        plugin.dispatch_nodes()
+
+
+def bench_dispatch_overview(plugin, queues):
+    """
+    Dispatches one overview per queue.
+    """
+    overview = fixtures.ClusterGenerator(queues=10).overview_payload()
+    plugin.rabbit.get_overview_stats = lambda: overview
+    for _ in queues:
+        plugin.dispatch_overview()
+
+
+def bench_generate_vhost_name(plugin, queues):
+    """
+    Normalizes the vhost name of every queue. Counted per call instead of
+    per metric.
+    """
+    for queue in queues:
+        plugin.generate_vhost_name(queue['vhost'])
+
+
+BENCHMARKS = [
+    ('dispatch_values', bench_dispatch_values),
+    ('dispatch_message_stats', bench_dispatch_message_stats),
+    ('dispatch_queue_stats', bench_dispatch_queue_stats),
+    ('dispatch_nodes', bench_dispatch_nodes),
+    ('dispatch_overview', bench_dispatch_overview),
+    ('generate_vhost_name', bench_generate_vhost_name),
+]
+
+
+def count_allocations(func, plugin, queues):
+    """
+    Returns the number of memory blocks allocated by a call, as traced by
+    tracemalloc, or None without tracemalloc, as Python 2.7 has no other
+    way to count allocations.
+    """
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func(plugin, queues)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.count_diff for stat in after.compare_to(before,
+                                                            'lineno')
+               if stat.count_diff > 0)
+
+
+def run(sizes=None, repeat=3):
+    """
+    Runs every benchmark for every number of queues and returns the results.
+    """
+    plugin = make_plugin(15672)
+    results = []
+    with DispatchCounter() as counter:
+        for size in sizes or DEFAULT_SIZES:
+            generator = fixtures.ClusterGenerator(queues=size, idle=0.0)
+            queues = generator.queue_payloads('/')
+            for name, func in BENCHMARKS:
+                counter.count = 0
+                func(plugin, queues)
+                metrics = counter.count or len(queues)
+
+                timer = timeit.Timer(lambda: func(plugin, queues))
+                elapsed = min(timer.repeat(repeat=repeat, number=1))
+                result = dict(benchmark=name, queues=size, metrics=metrics,
+                              ns_per_metric=elapsed * 1e9 / metrics)
+                allocations = count_allocations(func, plugin, queues)
+                if allocations is not None:
+                    result['allocations_per_metric'] = (
+                        float(allocations) / metrics)
+                results.append(result)
+    return results
+
+
+def report(results):
+    """
+    Prints results as a table. Allocations are left out without
+    tracemalloc.
+    """
+    if tracemalloc is None:
+        print("tracemalloc is not available, allocations are not measured")
+        print("%-24s %8s %10s %12s" % ('benchmark', 'queues', 'metrics',
+                                       'ns/metric'))
+        for result in results:
+            print("%(benchmark)-24s %(queues)8d %(metrics)10d "
+                  "%(ns_per_metric)12.0f" % result)
+        return
+    print("%-24s %8s %10s %12s %14s" % ('benchmark', 'queues', 'metrics',
+                                        'ns/metric', 'blocks/metric'))
+    for result in results:
+        print("%(benchmark)-24s %(queues)8d %(metrics)10d "
+              "%(ns_per_metric)12.0f %(allocations_per_metric)14.2f" %
+              result)
+
+
+def main(argv=None):
+    """
+    Parses arguments and runs the benchmarks.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_SIZES,
+                        help='numbers of synthetic queues')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per benchmark, the fastest is reported')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, sort_keys=True))
+    else:
+        report(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks full CollectdPlugin.read cycles against a stand-in management API.
+
+    python -m benchmarks.bench_read --vhosts 2 --queues 1000 --cycles 3
+
+Cycles captured from a real cluster with the CaptureFile option can be
+replayed instead of using the stand-in server:
+
+    python -m benchmarks.bench_read --replay capture.jsonl.gz --realtime
+"""
+
+import argparse
+import json
+import resource
+import sys
+import time
+
+import collectd
+
+from benchmarks.server import StandInServer
+from collectd_rabbitmq import collectd_plugin
+from collectd_rabbitmq import utils
+
+
+class DispatchCounter(object):
+    """
+    Replaces collectd.Values.dispatch with a counter.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.original = None
+
+    def __enter__(self):
+        self.original = collectd.Values.dispatch
+        counter = self
+
+        def dispatch(values, *args, **kwargs):  # pylint: disable=W0613
+            counter.count += 1
+        collectd.Values.dispatch = dispatch
+        return self
+
+    def __exit__(self, *args):
+        collectd.Values.dispatch = self.original
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in kilobytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_plugin(port, **config_options):
+    """
+    Returns a CollectdPlugin reading from the stand-in server on port.
+    """
+    connection = utils.ConnectionInfo('127.0.0.1', port)
+    config = utils.Config(utils.Auth(), connection, **config_options)
+    return collectd_plugin.CollectdPlugin(config)
+
+
+def run(vhosts=1, queues=100, exchanges=10, latency=0.0, padding=0,
+        cycles=3, config_options=None, **cluster_options):
+    """
+    Runs cycles reads and returns a dictionary of results. Other keyword
+    arguments are passed to the stand-in server.
+    """
+    server = StandInServer(latency=latency, vhosts=vhosts, queues=queues,
+                           exchanges=exchanges, padding=padding,
+                           **cluster_options)
+    with server, DispatchCounter() as counter:
+        plugin = make_plugin(server.port, **(config_options or dict()))
+        rss_before = peak_rss()
+        times = []
+        for _ in range(cycles):
+            start = time.time()
+            plugin.read()
+            times.append(time.time() - start)
+        requests = server.requests
+        values = counter.count
+
+    cycle_time = sum(times) / len(times)
+    return dict(vhosts=vhosts, queues=queues,
+                exchanges=exchanges * vhosts, cycles=cycles,
+                collect=(config_options or dict()).get('collect', 'detail'),
+                cycle_time=cycle_time, cycle_time_min=min(times),
+                requests_per_cycle=float(requests) / cycles,
+                values_per_cycle=float(values) / cycles,
+                values_per_second=values / sum(times),
+                peak_rss_kb=peak_rss(), rss_growth_kb=peak_rss() - rss_before)
+
+
+def run_replay(path, realtime=False, cycles=3, config_options=None):
+    """
+    Runs cycles reads against a captured archive and returns a dictionary
+    of results.
+    """
+    options = dict(config_options or dict(), replay=path,
+                   replay_realtime=realtime)
+    with DispatchCounter() as counter:
+        plugin = make_plugin(15672, **options)
+        rss_before = peak_rss()
+        times = []
+        for _ in range(cycles):
+            start = time.time()
+            plugin.read()
+            times.append(time.time() - start)
+        requests = plugin.rabbit.replayer.served
+        values = counter.count
+
+    return dict(replay=path, cycles=cycles,
+                cycle_time=sum(times) / len(times), cycle_time_min=min(times),
+                requests_per_cycle=float(requests) / cycles,
+                values_per_cycle=float(values) / cycles,
+                values_per_second=values / sum(times),
+                peak_rss_kb=peak_rss(), rss_growth_kb=peak_rss() - rss_before)
+
+
+def report(results):
+    """
+    Prints results as a human readable summary.
+    """
+    if 'replay' in results:
+        print("replay of %(replay)s, %(cycles)d cycles" % results)
+    else:
+        print("%(queues)d queues, %(exchanges)d exchanges in %(vhosts)d "
+              "vhosts, %(cycles)d cycles" % results)
+    print("  cycle time         %(cycle_time).3fs "
+          "(min %(cycle_time_min).3fs)" % results)
+    print("  requests/cycle     %(requests_per_cycle).0f" % results)
+    print("  values/cycle       %(values_per_cycle).0f" % results)
+    print("  values/second      %(values_per_second).0f" % results)
+    print("  peak RSS           %(peak_rss_kb)d kB "
+          "(+%(rss_growth_kb)d kB while reading)" % results)
+
+
+def main(argv=None):
+    """
+    Parses arguments and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--vhosts', type=int, default=1)
+    parser.add_argument('--queues', type=int, default=100,
+                        help='total number of queues')
+    parser.add_argument('--exchanges', type=int, default=10,
+                        help='exchanges per vhost')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    parser.add_argument('--padding', type=int, default=0,
+                        help='bytes of padding added to every object')
+    parser.add_argument('--distribution', default='uniform',
+                        choices=['uniform', 'skewed'],
+                        help='spread of the queues over the vhosts')
+    parser.add_argument('--idle', type=float, default=0.5,
+                        help='fraction of idle queues')
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help='fraction of queues created, deleted and '
+                             'toggled idle between cycles')
+    parser.add_argument('--collect', default='detail',
+                        choices=['detail', 'list'],
+                        help='collection strategy of the plugin')
+    parser.add_argument('--local-rates', action='store_true',
+                        help='compute rates from counters in the plugin')
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--capture', metavar='FILE',
+                        help='capture the first cycle to FILE')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay a captured archive instead of serving '
+                             'synthetic data')
+    parser.add_argument('--realtime', action='store_true',
+                        help='wait for the recorded latencies on replay')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    config_options = dict(collect=args.collect,
+                          local_rates=args.local_rates)
+    if args.replay:
+        results = run_replay(args.replay, args.realtime, args.cycles,
+                             config_options)
+    else:
+        if args.capture:
+            config_options['capture'] = args.capture
+        results = run(args.vhosts, args.queues, args.exchanges, args.latency,
+                      args.padding, args.cycles, config_options,
+                      distribution=args.distribution, idle=args.idle,
+                      churn=args.churn)
+    if args.json:
+        print(json.dumps(results, sort_keys=True))
+    else:
+        report(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Generates synthetic management API payloads for arbitrarily large clusters.
+
+Queues get realistic names, depths, counters and rates, and the cluster can
+be advanced in time with churn: queues are created, deleted and go idle.
+
+    python -m benchmarks.fixtures --vhosts 4 --queues 100000 --output out
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import urllib
+
+QUEUE_STATS = ['publish', 'ack', 'deliver', 'deliver_get', 'get',
+               'redeliver']
+
+# Queue name patterns and their share of the inventory.
+NAME_PATTERNS = [
+    ('tenant-{tenant}-{worker}', 0.6),
+    ('service.{service}.{index}', 0.3),
+    ('amq.gen-{token}', 0.1),
+]
+SERVICES = ['billing', 'search', 'email', 'images', 'audit', 'ingest']
+
+
+def message_stats(counters, rates):
+    """
+    Returns message_stats with a *_details rate for every counter.
+    """
+    stats = dict()
+    for name, value in counters.items():
+        stats[name] = int(value)
+        stats["%s_details" % name] = dict(rate=round(rates.get(name, 0.0),
+                                                     1))
+    return stats
+
+
+def details(value):
+    """
+    Returns a *_details dictionary.
+    """
+    return dict(rate=round(value, 1))
+
+
+def node(name):
+    """
+    Returns a node as listed by /api/nodes.
+    """
+    return dict(name=name, type='disc', running=True, disk_free=20234559488,
+                disk_free_details=details(0.0), disk_free_limit=50000000,
+                fd_total=150000, fd_used=113, fd_used_details=details(0.0),
+                mem_limit=2030287257, mem_used=108663688,
+                mem_used_details=details(0.0), proc_total=1048576,
+                proc_used=1626, proc_used_details=details(0.0),
+                processors=2, run_queue=0, sockets_total=134908,
+                sockets_used=94, sockets_used_details=details(0.0))
+
+
+class Queue(object):
+    """
+    State of a synthetic queue.
+    """
+
+    def __init__(self, vhost, name, rng, idle=False):
+        self.vhost = vhost
+        self.name = name
+        self.idle = idle
+        self.base_rate = 0.0 if idle else rng.expovariate(1 / 20.0)
+        self.consumers = 0 if idle else rng.choice([0, 1, 1, 2, 4])
+        self.messages_ready = 0
+        self.messages_unacknowledged = 0
+        self.counters = dict((name, 0) for name in QUEUE_STATS)
+        self.rates = dict((name, 0.0) for name in QUEUE_STATS)
+
+    def step(self, seconds, rng):
+        """
+        Advances the queue by seconds.
+        """
+        if self.idle:
+            self.rates = dict((name, 0.0) for name in QUEUE_STATS)
+            return
+        publish = max(0.0, rng.gauss(self.base_rate, self.base_rate / 4))
+        deliver = publish * rng.uniform(0.8, 1.1) if self.consumers else 0.0
+        self.rates = dict(publish=publish, ack=deliver, deliver=deliver,
+                          deliver_get=deliver, get=0.0,
+                          redeliver=deliver * 0.01)
+        for name, rate in self.rates.items():
+            self.counters[name] += rate * seconds
+        self.messages_ready = max(
+            0, int(self.messages_ready + (publish - deliver) * seconds))
+        self.messages_unacknowledged = min(self.messages_ready,
+                                           self.consumers * 10)
+
+    def payload(self, padding=0):
+        """
+        Returns the queue as listed by /api/queues/<vhost>.
+        """
+        messages = self.messages_ready + self.messages_unacknowledged
+        payload = dict(
+            name=self.name, vhost=self.vhost, durable=True,
+            auto_delete=False, exclusive=False, arguments=dict(),
+            node='rabbit@bench0', state='running', policy=None,
+            consumers=self.consumers,
+            consumer_utilisation=1.0 if self.consumers else None,
+            memory=14088 + 100 * messages,
+            messages=messages, messages_details=details(0.0),
+            messages_ready=self.messages_ready,
+            messages_ready_details=details(0.0),
+            messages_unacknowledged=self.messages_unacknowledged,
+            messages_unacknowledged_details=details(0.0),
+            idle_since=None if not self.idle else '2016-01-01 00:00:00')
+        if any(self.counters.values()):
+            payload['message_stats'] = message_stats(self.counters,
+                                                     self.rates)
+        if padding:
+            payload['padding'] = 'x' * padding
+        return payload
+
+
+class ClusterGenerator(object):
+    """
+    Generates and evolves a synthetic cluster.
+
+    :param vhosts: number of vhosts.
+    :param queues: total number of queues.
+    :param exchanges: number of exchanges per vhost.
+    :param nodes: number of nodes.
+    :param distribution: `uniform` or `skewed` spread of queues over vhosts.
+    :param idle: fraction of queues that are idle.
+    :param padding: bytes of padding added to every queue and exchange.
+    :param seed: seed of the random generator.
+    """
+
+    def __init__(self, vhosts=1, queues=100, exchanges=10, nodes=1,
+                 distribution='uniform', idle=0.5, padding=0, seed=0):
+        self.rng = random.Random(seed)
+        self.padding = padding
+        self.idle = idle
+        self.names = set()
+        # Roughly four workers per tenant.
+        self.tenants = max(1, queues // 4)
+        self.vhosts = ['/'] + ['vhost%d' % index
+                               for index in range(1, vhosts)]
+        self.nodes = ['rabbit@bench%d' % index for index in range(nodes)]
+        if distribution == 'skewed':
+            self.weights = [1.0 / (index + 1)
+                            for index in range(len(self.vhosts))]
+        elif distribution == 'uniform':
+            self.weights = [1.0] * len(self.vhosts)
+        else:
+            raise ValueError("Unsupported distribution {0}".format(
+                distribution))
+
+        self.queues = dict((vhost, dict()) for vhost in self.vhosts)
+        self.exchanges = dict(
+            (vhost, ['amq.direct', 'amq.topic'] +
+             ['exchange%d' % index for index in range(max(0, exchanges - 2))])
+            for vhost in self.vhosts)
+        for _ in range(queues):
+            self.create_queue()
+        self.step(60)
+
+    def pick_vhost(self):
+        """
+        Returns a vhost according to the distribution.
+        """
+        point = self.rng.uniform(0, sum(self.weights))
+        for vhost, weight in zip(self.vhosts, self.weights):
+            point -= weight
+            if point <= 0:
+                return vhost
+        return self.vhosts[-1]
+
+    def queue_name(self):
+        """
+        Returns a new unique queue name following one of the name patterns.
+        """
+        while True:
+            point = self.rng.random()
+            for pattern, share in NAME_PATTERNS:
+                point -= share
+                if point <= 0:
+                    break
+            name = pattern.format(
+                tenant=self.rng.randint(1, self.tenants),
+                worker=self.rng.randint(1, 8),
+                service=self.rng.choice(SERVICES),
+                index=self.rng.randint(1, 100000),
+                token='%016x' % self.rng.getrandbits(64))
+            if name not in self.names:
+                self.names.add(name)
+                return name
+
+    def create_queue(self):
+        """
+        Adds a new queue to the cluster.
+        """
+        vhost = self.pick_vhost()
+        name = self.queue_name()
+        self.queues[vhost][name] = Queue(vhost, name, self.rng,
+                                         self.rng.random() < self.idle)
+
+    def delete_queue(self):
+        """
+        Removes a random queue from the cluster.
+        """
+        vhosts = [vhost for vhost in self.vhosts if self.queues[vhost]]
+        if not vhosts:
+            return
+        vhost = self.rng.choice(vhosts)
+        name = self.rng.choice(list(self.queues[vhost]))
+        del self.queues[vhost][name]
+        self.names.discard(name)
+
+    def step(self, seconds=60, created=0.0, deleted=0.0, toggled=0.0):
+        """
+        Advances the cluster by seconds. created, deleted and toggled are
+        the fractions of queues created, deleted and switched between idle
+        and busy.
+        """
+        total = sum(len(queues) for queues in self.queues.values())
+        for _ in range(int(round(total * deleted))):
+            self.delete_queue()
+        for _ in range(int(round(total * created))):
+            self.create_queue()
+        for queues in self.queues.values():
+            for queue in queues.values():
+                if toggled and self.rng.random() < toggled:
+                    queue.idle = not queue.idle
+                    if not queue.idle and not queue.base_rate:
+                        queue.base_rate = self.rng.expovariate(1 / 20.0)
+                        queue.consumers = 1
+                queue.step(seconds, self.rng)
+
+    def queue_payloads(self, vhost):
+        """
+        Returns /api/queues/<vhost>.
+        """
+        return [queue.payload(self.padding)
+                for queue in self.queues[vhost].values()]
+
+    def exchange_payloads(self, vhost):
+        """
+        Returns /api/exchanges/<vhost>, with publish rates spread over the
+        queues of the vhost.
+        """
+        rate = sum(queue.rates['publish']
+                   for queue in self.queues[vhost].values())
+        count = sum(queue.counters['publish']
+                    for queue in self.queues[vhost].values())
+        exchanges = self.exchanges[vhost]
+        payloads = []
+        for name in exchanges:
+            share = 1.0 / len(exchanges)
+            payload = dict(
+                name=name, vhost=vhost, type='topic', durable=True,
+                auto_delete=False, internal=False, arguments=dict(),
+                message_stats=message_stats(
+                    dict(publish_in=count * share,
+                         publish_out=count * share),
+                    dict(publish_in=rate * share,
+                         publish_out=rate * share)))
+            if self.padding:
+                payload['padding'] = 'x' * self.padding
+            payloads.append(payload)
+        return payloads
+
+    def totals(self, queues):
+        """
+        Returns the message totals and message_stats of queues.
+        """
+        counters = dict((name, 0) for name in QUEUE_STATS)
+        rates = dict((name, 0.0) for name in QUEUE_STATS)
+        ready = unacknowledged = 0
+        for queue in queues:
+            ready += queue.messages_ready
+            unacknowledged += queue.messages_unacknowledged
+            for name in QUEUE_STATS:
+                counters[name] += queue.counters[name]
+                rates[name] += queue.rates[name]
+        return dict(messages=ready + unacknowledged,
+                    messages_details=details(0.0),
+                    messages_ready=ready,
+                    messages_ready_details=details(0.0),
+                    messages_unacknowledged=unacknowledged,
+                    messages_unacknowledged_details=details(0.0),
+                    message_stats=message_stats(counters, rates))
+
+    def vhost_payloads(self):
+        """
+        Returns /api/vhosts.
+        """
+        payloads = []
+        for vhost in self.vhosts:
+            payload = self.totals(self.queues[vhost].values())
+            payload.update(name=vhost, tracing=False)
+            payloads.append(payload)
+        return payloads
+
+    def overview_payload(self):
+        """
+        Returns /api/overview.
+        """
+        queues = [queue for vhost in self.vhosts
+                  for queue in self.queues[vhost].values()]
+        totals = self.totals(queues)
+        stats = totals.pop('message_stats')
+        return dict(cluster_name='rabbit@bench0', node='rabbit@bench0',
+                    object_totals=dict(
+                        consumers=sum(queue.consumers for queue in queues),
+                        queues=len(queues),
+                        exchanges=sum(len(names) for names in
+                                      self.exchanges.values()),
+                        connections=len(self.vhosts), channels=len(queues)),
+                    message_stats=stats, queue_totals=totals)
+
+    def payloads(self):
+        """
+        Returns a dictionary of API path to payload for the whole cluster.
+        Vhost names in paths are not quoted.
+        """
+        payloads = {
+            'nodes': [node(name) for name in self.nodes],
+            'overview': self.overview_payload(),
+            'vhosts': self.vhost_payloads(),
+        }
+        for vhost in self.vhosts:
+            payloads['queues/%s' % vhost] = self.queue_payloads(vhost)
+            payloads['exchanges/%s' % vhost] = self.exchange_payloads(vhost)
+        return payloads
+
+
+def cluster(**options):
+    """
+    Returns a dictionary of API path to payload for a generated cluster.
+    """
+    return ClusterGenerator(**options).payloads()
+
+
+def write(payloads, directory):
+    """
+    Writes every payload to <directory>/api/<resource>[/<vhost>].json, with
+    the vhost name quoted.
+    """
+    for path, payload in payloads.items():
+        parts = path.split('/', 1)
+        if len(parts) > 1:
+            parts[1] = urllib.quote(parts[1], '')
+        filename = os.path.join(directory, 'api', *parts) + '.json'
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as payload_file:
+            json.dump(payload, payload_file)
+
+
+def main(argv=None):
+    """
+    Parses arguments and writes generated payloads.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--vhosts', type=int, default=1)
+    parser.add_argument('--queues', type=int, default=100,
+                        help='total number of queues')
+    parser.add_argument('--exchanges', type=int, default=10,
+                        help='exchanges per vhost')
+    parser.add_argument('--nodes', type=int, default=1)
+    parser.add_argument('--distribution', default='uniform',
+                        choices=['uniform', 'skewed'])
+    parser.add_argument('--idle', type=float, default=0.5,
+                        help='fraction of idle queues')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--steps', type=int, default=1,
+                        help='snapshots to write, one per step')
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help='fraction of queues created and deleted per '
+                             'step')
+    parser.add_argument('--output', required=True,
+                        help='directory to write the payloads to')
+    args = parser.parse_args(argv)
+
+    generator = ClusterGenerator(args.vhosts, args.queues, args.exchanges,
+                                 args.nodes, args.distribution, args.idle,
+                                 seed=args.seed)
+    for step in range(args.steps):
+        directory = args.output
+        if args.steps > 1:
+            directory = os.path.join(args.output, 'step%d' % step)
+        write(generator.payloads(), directory)
+        generator.step(60, created=args.churn, deleted=args.churn,
+                       toggled=args.churn)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the standard read cycle scenarios and fails when one of them regresses
+beyond the tolerance of its committed baseline.
+
+Requests per cycle, peak RSS, the cycle time normalized by a fixed
+calibration loop timed in the same run, and the list/detail ratios between
+scenarios of the same run are always gated. The raw cycle time is only
+compared with --absolute, against baselines of the machine that stored them.
+
+    python -m benchmarks.gate
+    python -m benchmarks.gate --absolute --tolerance cycle_time=1.0
+    python -m benchmarks.gate --scenarios 1k-list --update
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'baselines.json')
+METRICS = ('cycle_time', 'normalized_time', 'requests_per_cycle',
+           'peak_rss_kb')
+ABSOLUTE = ('cycle_time',)
+
+
+def load(path=BASELINES):
+    """
+    Returns the baselines file as a dictionary.
+    """
+    with open(path) as baselines:
+        return json.load(baselines)
+
+
+def save(baselines, path=BASELINES):
+    """
+    Writes the baselines file.
+    """
+    with open(path, 'w') as output:
+        json.dump(baselines, output, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        output.write('\n')
+
+
+def run_scenario(options):
+    """
+    Runs bench_read for a scenario in a fresh interpreter, so that peak RSS
+    only covers that scenario, and returns its results.
+    """
+    command = [sys.executable, '-m', 'benchmarks.bench_read', '--json']
+    for option, value in sorted(options.items()):
+        command.extend(['--%s' % option, str(value)])
+    output = subprocess.check_output(command)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def calibrate(rounds=5, size=20000):
+    """
+    Returns the best time of a fixed loop of JSON and dictionary work, that
+    does not use the plugin, so that cycle times can be compared across
+    machines and loads as multiples of it.
+    """
+    listing = [dict(name='queue%d' % index, messages=index,
+                    message_stats=dict(publish=index,
+                                       publish_details=dict(rate=1.0)))
+               for index in range(size)]
+    best = None
+    for _ in range(rounds):
+        start = time.time()
+        total = 0
+        for item in json.loads(json.dumps(listing)):
+            total += item['messages'] + item['message_stats']['publish']
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(results, baseline, tolerance, metrics=METRICS):
+    """
+    Returns a list of regressions of results against baseline. A metric
+    regresses when it exceeds its baseline by more than its tolerance,
+    given as a fraction of the baseline.
+    """
+    regressions = list()
+    for metric in metrics:
+        if metric not in baseline:
+            continue
+        limit = baseline[metric] * (1 + tolerance.get(metric, 0.0))
+        if results[metric] > limit:
+            regressions.append("%s %.3f exceeds %.3f (baseline %.3f)" %
+                               (metric, results[metric], limit,
+                                baseline[metric]))
+    return regressions
+
+
+def measure_ratios(ratios, measured):
+    """
+    Returns the value of each ratio whose scenarios were both measured, as
+    the metric of its first scenario over the one of its second.
+    """
+    values = dict()
+    for name, ratio in ratios.items():
+        numerator, denominator = ratio['scenarios']
+        if numerator not in measured or denominator not in measured:
+            continue
+        divisor = measured[denominator][ratio['metric']]
+        if divisor:
+            values[name] = measured[numerator][ratio['metric']] / divisor
+    return values
+
+
+def compare_ratios(values, ratios, tolerance):
+    """
+    Returns a list of regressions of the measured ratio values, see
+    measure_ratios, beyond the ratio tolerance of their baselines.
+    """
+    regressions = list()
+    for name, value in sorted(values.items()):
+        baseline = ratios[name]['baseline']
+        limit = baseline * (1 + tolerance.get('ratio', 0.0))
+        if value > limit:
+            regressions.append("%s %.3f exceeds %.3f (baseline %.3f)" %
+                               (name, value, limit, baseline))
+    return regressions
+
+
+def parse_tolerance(value):
+    """
+    Parses a METRIC=FRACTION tolerance argument.
+    """
+    metric, _, fraction = value.partition('=')
+    if metric not in METRICS + ('ratio',):
+        raise argparse.ArgumentTypeError("unknown metric %s" % metric)
+    try:
+        return metric, float(fraction)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid fraction %s" % fraction)
+
+
+def main(argv=None):
+    """
+    Parses arguments, runs the scenarios and returns 1 on regression.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--baselines', default=BASELINES,
+                        help='baselines file')
+    parser.add_argument('--scenarios', nargs='+',
+                        help='scenarios to run, defaults to all')
+    parser.add_argument('--update', action='store_true',
+                        help='store the results as the new baselines')
+    parser.add_argument('--absolute', action='store_true',
+                        help='also compare cycle time and peak RSS with '
+                        'the baselines, only meaningful on the machine '
+                        'that stored them')
+    parser.add_argument('--tolerance', action='append', default=list(),
+                        type=parse_tolerance, metavar='METRIC=FRACTION',
+                        help='overrides a tolerance of the baselines file')
+    args = parser.parse_args(argv)
+
+    baselines = load(args.baselines)
+    tolerance = dict(baselines['tolerance'])
+    tolerance.update(args.tolerance)
+    metrics = tuple(metric for metric in METRICS
+                    if args.absolute or metric not in ABSOLUTE)
+    ratios = baselines.get('ratios', dict())
+    names = args.scenarios or sorted(baselines['scenarios'])
+
+    calibration = calibrate()
+    print("%-16s %.4fs" % ('calibration', calibration))
+
+    failed = False
+    measured = dict()
+    for name in names:
+        scenario = baselines['scenarios'][name]
+        results = run_scenario(scenario['options'])
+        results['normalized_time'] = results['cycle_time'] / calibration
+        measured[name] = dict((metric, results[metric])
+                              for metric in METRICS)
+        if args.update:
+            scenario['baseline'] = measured[name]
+            print("%-16s updated" % name)
+            continue
+
+        regressions = compare(measured[name], scenario['baseline'],
+                              tolerance, metrics)
+        summary = '  '.join("%s=%.3f" % item
+                            for item in sorted(measured[name].items()))
+        print("%-16s %s  %s" % (name, 'FAIL' if regressions else 'ok',
+                                summary))
+        for regression in regressions:
+            print("    %s" % regression)
+        failed = failed or bool(regressions)
+
+    values = measure_ratios(ratios, measured)
+    if args.update:
+        for name, value in values.items():
+            ratios[name]['baseline'] = value
+            print("%-16s updated" % name)
+        save(baselines, args.baselines)
+        return 0
+
+    for name, value in sorted(values.items()):
+        regressions = compare_ratios({name: value}, ratios, tolerance)
+        print("%-16s %s  ratio=%.3f" % (name, 'FAIL' if regressions else 'ok',
+                                        value))
+        for regression in regressions:
+            print("    %s" % regression)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A local stand-in for the RabbitMQ management API.
+
+The server runs in a child process, so that neither its payloads nor its
+request handling count towards the memory and CPU of the benchmarked plugin.
+"""
+
+import BaseHTTPServer
+import json
+import multiprocessing
+import SocketServer
+import time
+import urllib
+import urlparse
+
+from benchmarks import fixtures
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves the payloads of the server, and single objects out of listings.
+    """
+
+    def do_GET(self):  # pylint: disable=C0103
+        """
+        Responds with the JSON payload for the requested path.
+        """
+        with self.server.requests.get_lock():
+            self.server.requests.value += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        path, _, query = self.path.partition('?')
+        columns = urlparse.parse_qs(query).get('columns')
+        body = self.server.get_body(path, columns[0] if columns else None)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        """
+        Keeps the benchmark output quiet.
+        """
+        pass
+
+
+def select_columns(payload, columns):
+    """
+    Returns the payload with only the fields of columns. A dotted column
+    selects a field of a nested object.
+    """
+    if isinstance(payload, list):
+        return [select_columns(item, columns) for item in payload]
+    selected = dict()
+    for column in columns:
+        key, _, nested = column.partition('.')
+        if key not in payload:
+            continue
+        if nested and isinstance(payload[key], dict):
+            selected.setdefault(key, dict()).update(
+                select_columns(payload[key], [nested]))
+        else:
+            selected[key] = payload[key]
+    return selected
+
+
+class APIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server that answers management API requests from a
+    dictionary of API path to payload.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, generator, requests, latency=0.0,
+                 churn=0.0):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.generator = generator
+        self.payloads = generator.payloads()
+        self.requests = requests
+        self.latency = latency
+        self.churn = churn
+        self.cycles = 0
+        self.bodies = dict()
+        self.objects = dict()
+
+    def next_cycle(self):
+        """
+        Advances the cluster by a minute of churn. The plugin requests
+        /api/nodes first in each cycle, so that request starts a new one.
+        """
+        self.cycles += 1
+        if self.cycles == 1 or not self.churn:
+            return
+        self.generator.step(60, created=self.churn, deleted=self.churn,
+                            toggled=self.churn)
+        self.payloads = self.generator.payloads()
+        self.bodies = dict()
+        self.objects = dict()
+
+    def get_body(self, path, columns=None):
+        """
+        Returns the encoded payload for path, or None if there is none.
+        Like the management API, columns is a comma separated list of the
+        fields to return.
+        """
+        parts = [urllib.unquote(part) for part in path.split('/')
+                 if part][1:]
+        key = '/'.join(parts)
+        if key == 'nodes':
+            self.next_cycle()
+        if (key, columns) in self.bodies:
+            return self.bodies[(key, columns)]
+
+        if key in self.payloads:
+            payload = self.payloads[key]
+        elif len(parts) == 3 and '/'.join(parts[:2]) in self.payloads:
+            listing = '/'.join(parts[:2])
+            if listing not in self.objects:
+                self.objects[listing] = dict(
+                    (item['name'], item) for item in self.payloads[listing])
+            payload = self.objects[listing].get(parts[2])
+            if payload is None:
+                return None
+        else:
+            return None
+
+        if columns:
+            payload = select_columns(payload, columns.split(','))
+        body = json.dumps(payload)
+        self.bodies[(key, columns)] = body
+        return body
+
+
+def serve(pipe, requests, latency, churn, cluster_options):
+    """
+    Generates the cluster and serves it until the process is terminated.
+    """
+    generator = fixtures.ClusterGenerator(**cluster_options)
+    server = APIServer(('127.0.0.1', 0), generator, requests, latency,
+                       churn)
+    pipe.send(server.server_address[1])
+    server.serve_forever()
+
+
+class StandInServer(object):
+    """
+    Starts and stops a stand-in management API in a child process. The
+    cluster options are those of fixtures.ClusterGenerator; with churn, the
+    cluster is advanced between read cycles.
+    """
+
+    def __init__(self, latency=0.0, churn=0.0, **cluster_options):
+        self.latency = latency
+        self.churn = churn
+        self.cluster_options = cluster_options
+        self.process = None
+        self.port = None
+        self._requests = multiprocessing.Value('l', 0)
+
+    @property
+    def requests(self):
+        """
+        Returns the number of requests served so far.
+        """
+        return self._requests.value
+
+    def start(self):
+        """
+        Starts the server and waits until it accepts requests.
+        """
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve, args=(child, self._requests, self.latency,
+                                self.churn, self.cluster_options))
+        self.process.daemon = True
+        self.process.start()
+        self.port = parent.recv()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self.process:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
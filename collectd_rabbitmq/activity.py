@@ -0,0 +1,110 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that requests idle queues less often than busy ones.
+"""
+
+from collectd_rabbitmq.records import MISSING, QUEUE_STATS, as_record
+
+MESSAGES = QUEUE_STATS.index('messages')
+
+
+def get_depth(record):
+    """
+    Returns the number of messages of a queue record, or None.
+    """
+    if record is None or record.queue_stats is None:
+        return None
+    depth = record.queue_stats[MESSAGES]
+    return None if depth is MISSING else depth
+
+
+def is_idle(record):
+    """
+    Returns true if a queue record has no messages and no message rates.
+    """
+    if record is None or get_depth(record):
+        return False
+    for rate in record.message_rates or ():
+        if rate is not MISSING and rate:
+            return False
+    return True
+
+
+class Backoff(object):
+    """
+    Keeps the polling interval of each queue, in cycles, with the cycle it
+    is next due and its depth when it was last requested. The interval of a
+    queue doubles each time it is found idle, up to max_interval, and goes
+    back to one cycle as soon as it is busy, or as soon as the name listing
+    shows that its depth changed.
+    """
+
+    def __init__(self, max_interval):
+        self.max_interval = max_interval
+        self.queues = dict()
+        self.cycle = 0
+
+    def __len__(self):
+        return len(self.queues)
+
+    def select(self, vhost_name, names, listed=None):
+        """
+        Returns the names of the queues of vhost_name that are due in this
+        cycle. listed is a dictionary of name to the record of the queue in
+        the listing, with its number of messages.
+        """
+        selected = list()
+        for name in names:
+            state = self.queues.get((vhost_name, name))
+            if state is None or state[1] <= self.cycle:
+                selected.append(name)
+                continue
+            record = listed.get(name) if listed is not None else None
+            if record is not None and get_depth(record) != state[2]:
+                state[0] = 1
+                selected.append(name)
+        return selected
+
+    def observe(self, vhost_name, stats):
+        """
+        Updates the intervals of the queues of vhost_name from their
+        records.
+        """
+        for name, record in stats.iteritems():
+            record = as_record(record)
+            key = (vhost_name, name)
+            interval = 1
+            if is_idle(record):
+                state = self.queues.get(key)
+                if state is not None:
+                    interval = min(state[0] * 2, self.max_interval)
+            self.queues[key] = [interval, self.cycle + interval,
+                                get_depth(record)]
+
+    def evict(self, keys):
+        """
+        Removes the queues of keys, vhost and name tuples, which are gone.
+        """
+        for key in keys:
+            self.queues.pop(key, None)
+
+    def end_cycle(self):
+        """
+        Starts the next cycle.
+        """
+        self.cycle += 1
@@ -0,0 +1,152 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that records management API responses and replays them.
+
+An archive is a gzip file with one JSON object per response::
+
+    {"cycle": 0, "path": "queues/%2F", "latency": 0.012, "body": "[...]"}
+
+Only the API path is stored, never the host or the Authorization header,
+and the values of credential fields found in a body are masked.
+"""
+
+import collectd
+import gzip
+import json
+import time
+
+MASK = '********'
+CREDENTIAL_FIELDS = ('password', 'password_hash', 'authorization')
+
+
+def mask(data):
+    """
+    Returns data with the values of credential fields masked, in every
+    nested object.
+    """
+    if isinstance(data, dict):
+        return dict((key, MASK if key in CREDENTIAL_FIELDS else mask(value))
+                    for key, value in data.iteritems())
+    if isinstance(data, list):
+        return [mask(value) for value in data]
+    return data
+
+
+class Recorder(object):
+    """
+    Writes responses of the first cycles to an archive.
+    """
+
+    def __init__(self, path, cycles=1):
+        self.path = path
+        self.cycles = cycles
+        self.cycle = 0
+        self.archive = None
+
+    @property
+    def active(self):
+        """
+        Returns true while cycles remain to be captured.
+        """
+        return self.cycle < self.cycles
+
+    def scrub(self, body):
+        """
+        Returns body with the values of its credential fields masked. Other
+        text, such as names that happen to contain the username, is kept,
+        and a body without credential fields is returned as it was.
+        """
+        if not any('"%s"' % field in body for field in CREDENTIAL_FIELDS):
+            return body
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return body
+        return json.dumps(mask(data))
+
+    def record(self, path, latency, body):
+        """
+        Writes a response to the archive. A body of None records an error.
+        """
+        if not self.active:
+            return
+        if self.archive is None:
+            collectd.info("Capturing API responses to %s" % self.path)
+            self.archive = gzip.open(self.path, 'wb')
+        if body is not None:
+            body = self.scrub(body)
+        self.archive.write(json.dumps(dict(cycle=self.cycle, path=path,
+                                           latency=latency, body=body)))
+        self.archive.write('\n')
+
+    def end_cycle(self):
+        """
+        Closes the archive once enough cycles have been captured.
+        """
+        if not self.active:
+            return
+        self.cycle += 1
+        if not self.active and self.archive is not None:
+            self.archive.close()
+            self.archive = None
+            collectd.info("Captured %d cycles to %s" %
+                          (self.cycles, self.path))
+
+
+class Replayer(object):
+    """
+    Serves the responses of an archive. Each path cycles through its
+    recorded responses in order.
+    """
+
+    def __init__(self, path, realtime=True):
+        self.path = path
+        self.realtime = realtime
+        self.responses = dict()
+        self.positions = dict()
+        self.served = 0
+
+        archive = gzip.open(path, 'rb')
+        try:
+            for line in archive:
+                response = json.loads(line)
+                body = response['body']
+                if body is not None:
+                    body = body.encode('utf-8')
+                self.responses.setdefault(response['path'], list()).append(
+                    (response['latency'], body))
+        finally:
+            archive.close()
+
+    def fetch(self, path):
+        """
+        Returns the next recorded body for path, or None if it was not
+        recorded or was recorded as an error.
+        """
+        responses = self.responses.get(path)
+        if not responses:
+            collectd.error("No captured response for %s" % path)
+            return None
+        position = self.positions.get(path, 0)
+        self.positions[path] = (position + 1) % len(responses)
+        self.served += 1
+
+        latency, body = responses[position]
+        if self.realtime and latency:
+            time.sleep(latency)
+        return body
@@ -0,0 +1,113 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that limits the number of distinct queue and exchange series a
+plugin instance dispatches.
+"""
+
+from collections import OrderedDict
+
+from collectd_rabbitmq import grouping
+
+OVERFLOWS = ('other', 'drop')
+OTHER = 'other'
+# Name of the series the overflowed records are folded into, reserved like
+# grouping.GROUP_PREFIX so that it never takes the series of a queue or
+# exchange called other.
+OTHER_NAME = 'overflow+' + OTHER
+
+
+class SeriesLimit(object):
+    """
+    Keeps the active series, least recently seen first, with the cycle they
+    were last seen in. Once max_series are active, a new series only takes
+    the place of one that was not seen in the last max_age cycles;
+    otherwise it overflows.
+    """
+
+    def __init__(self, max_series, overflow=OTHER, other_name=OTHER_NAME,
+                 max_age=1):
+        self.max_series = max_series
+        self.overflow = overflow
+        self.other_name = other_name
+        self.max_age = max_age
+        self.series = OrderedDict()
+        self.cycle = 0
+
+    def __len__(self):
+        return len(self.series)
+
+    def admit(self, keys):
+        """
+        Marks keys as seen in this cycle and returns the set of keys that
+        overflow the limit. Known keys are refreshed before new ones are
+        admitted, so that they cannot be pushed out by them.
+        """
+        new = list()
+        for key in keys:
+            if key in self.series:
+                del self.series[key]
+                self.series[key] = self.cycle
+            else:
+                new.append(key)
+
+        overflowed = set()
+        for key in new:
+            if len(self.series) >= self.max_series:
+                oldest = next(iter(self.series))
+                if self.series[oldest] >= self.cycle - self.max_age:
+                    overflowed.add(key)
+                    continue
+                del self.series[oldest]
+            self.series[key] = self.cycle
+        return overflowed
+
+    def limit(self, vhost, plugin, stats):
+        """
+        Takes a dictionary of name to records.StatsRecord and returns it
+        without the series over the limit, folded into an other_name record
+        unless they are dropped, and the number of series over the limit.
+        """
+        overflowed = self.admit((vhost, plugin, name) for name in stats)
+        if not overflowed:
+            return stats, 0
+
+        limited = dict()
+        folded = list()
+        for name, record in stats.iteritems():
+            if (vhost, plugin, name) in overflowed:
+                if record is not None:
+                    folded.append(record)
+            else:
+                limited[name] = record
+        if self.overflow == OTHER and folded:
+            limited[self.other_name] = grouping.aggregate_records(folded,
+                                                                  sum)
+        return limited, len(overflowed)
+
+    def evict(self, keys):
+        """
+        Removes the series of keys, which are gone, making room for new ones.
+        """
+        for key in keys:
+            self.series.pop(key, None)
+
+    def end_cycle(self):
+        """
+        Starts the next cycle.
+        """
+        self.cycle += 1
@@ -0,0 +1,88 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module run in the worker process, see worker. It requests and parses the
+API for the plugin, and sends back the results, projected to the names and
+records the plugin keeps when it asks for it.
+
+Frames are pickled tuples. The plugin sends the config, then one request
+per fetch, and the worker answers each request with its log messages and a
+result.
+"""
+
+import cPickle
+import sys
+import types
+
+LEVELS = ('debug', 'info', 'warning', 'error')
+
+
+def send(stream, frame):
+    """
+    Writes a frame to stream.
+    """
+    cPickle.dump(frame, stream, cPickle.HIGHEST_PROTOCOL)
+    stream.flush()
+
+
+def install_collectd(stream):
+    """
+    Installs a collectd module whose log functions send their messages to
+    the plugin, which logs them with the real one.
+    """
+    module = types.ModuleType('collectd')
+
+    def logger(level):
+        """
+        Returns the log function of level.
+        """
+        return lambda message: send(stream, ('log', level, message))
+
+    for level in LEVELS:
+        setattr(module, level, logger(level))
+    sys.modules['collectd'] = module
+
+
+def serve(stdin, stdout):
+    """
+    Answers the requests from stdin until it is closed.
+    """
+    install_collectd(stdout)
+    # rabbit imports collectd, so it is imported once the module is there.
+    from collectd_rabbitmq import rabbit
+    stats = rabbit.RabbitMQStats(cPickle.load(stdin))
+    while True:
+        try:
+            args, columns, keep_body, project = cPickle.load(stdin)
+        except EOFError:
+            return
+        send(stdout, ('result', stats.fetch_info(args, columns, keep_body,
+                                                 project)))
+
+
+def main():
+    """
+    Serves the plugin on the standard streams.
+    """
+    stdin, stdout = sys.stdin, sys.stdout
+    # Stray prints must not corrupt the frames.
+    sys.stdout = sys.stderr
+    serve(stdin, stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,11 +19,30 @@ This module controls the interactions with collectd
 """
 
 import collectd
+import math
 import re
+import socket
+import threading
+import time
 import urllib
 
+from collectd_rabbitmq import activity
+from collectd_rabbitmq import capture
+from collectd_rabbitmq import cardinality
+from collectd_rabbitmq import derived
+from collectd_rabbitmq import dispatching
+from collectd_rabbitmq import grouping
+from collectd_rabbitmq import inventory
+from collectd_rabbitmq import pipeline
+from collectd_rabbitmq import profiling
 from collectd_rabbitmq import rabbit
+from collectd_rabbitmq import rates
+from collectd_rabbitmq import records
+from collectd_rabbitmq import scanning
+from collectd_rabbitmq import summaries
 from collectd_rabbitmq import utils
+from collectd_rabbitmq import watching
+from collectd_rabbitmq import worker
 
 CONFIGS = []
 INSTANCES = []
@@ -39,6 +58,35 @@ def configure(config_values):
     scheme = 'http'
     validate_certs = True
     vhost_prefix = None
+    timeout = 30
+    interval = None
+    self_metrics = False
+    derived_metrics = False
+    local_rates = False
+    vhost_totals = False
+    totals_only = list()
+    groups = dict()
+    queue_series = True
+    queue_summaries = False
+    max_series = None
+    series_overflow = 'other'
+    deleted_series = 'none'
+    shard_index = 0
+    shard_count = 1
+    designated_poller = False
+    node_name = None
+    scan_slices = 1
+    scan_priority = list()
+    scan_deadline = None
+    idle_backoff = 1
+    watches = list()
+    pipelined = False
+    pipeline_size = 64
+    use_worker = False
+    worker_python = None
+    collect = 'detail'
+    profile_options = dict()
+    capture_options = dict()
 
     for config_value in config_values.children:
         collectd.debug("%s = %s" % (config_value.key, config_value.values))
@@ -52,6 +100,8 @@ def configure(config_values):
             elif config_value.key == 'Port':
                 port = config_value.values[0]
             elif config_value.key == 'Realm':
+                collectd.warning('Realm is ignored, the credentials are sent '
+                                 'with every request')
                 realm = config_value.values[0]
             elif config_value.key == 'Scheme':
                 scheme = config_value.values[0]
@@ -59,6 +109,101 @@ def configure(config_values):
                 vhost_prefix = config_value.values[0]
             elif config_value.key == 'ValidateCerts':
                 validate_certs = config_value.values[0]
+            elif config_value.key == 'Timeout':
+                timeout = float(config_value.values[0])
+            elif config_value.key == 'Interval':
+                interval = float(config_value.values[0])
+            elif config_value.key == 'Collect':
+                collect = config_value.values[0].lower()
+            elif config_value.key == 'VHostTotals':
+                vhost_totals = config_value.values[0]
+            elif config_value.key == 'VHostTotalsOnly':
+                totals_only.append(config_value.values[0])
+            elif config_value.key == 'QueueSeries':
+                queue_series = config_value.values[0]
+            elif config_value.key == 'QueueSummaries':
+                queue_summaries = config_value.values[0]
+            elif config_value.key == 'MaxSeries':
+                max_series = int(config_value.values[0])
+            elif config_value.key == 'SeriesOverflow':
+                series_overflow = config_value.values[0].lower()
+            elif config_value.key == 'DesignatedPoller':
+                designated_poller = config_value.values[0]
+            elif config_value.key == 'NodeName':
+                node_name = config_value.values[0]
+            elif config_value.key == 'Worker':
+                use_worker = config_value.values[0]
+            elif config_value.key == 'WorkerPython':
+                worker_python = config_value.values[0]
+            elif config_value.key == 'Pipeline':
+                pipelined = config_value.values[0]
+            elif config_value.key == 'PipelineSize':
+                pipeline_size = int(config_value.values[0])
+            elif config_value.key == 'IdleBackoff':
+                idle_backoff = int(config_value.values[0])
+            elif config_value.key == 'ScanSlices':
+                scan_slices = int(config_value.values[0])
+            elif config_value.key == 'ScanDeadline':
+                scan_deadline = float(config_value.values[0])
+            elif config_value.key == 'ScanPriority':
+                scan_priority.append(config_value.values[0])
+            elif config_value.key == 'ShardIndex':
+                shard_index = int(config_value.values[0])
+            elif config_value.key == 'ShardCount':
+                shard_count = int(config_value.values[0])
+            elif config_value.key == 'DeletedSeries':
+                deleted_series = config_value.values[0].lower()
+            elif config_value.key == 'LocalRates':
+                local_rates = config_value.values[0]
+            elif config_value.key == 'DerivedMetrics':
+                derived_metrics = config_value.values[0]
+            elif config_value.key == 'SelfMetrics':
+                self_metrics = config_value.values[0]
+            elif config_value.key == 'ProfileDirectory':
+                profile_options['directory'] = config_value.values[0]
+            elif config_value.key == 'ProfileEvery':
+                profile_options['every'] = int(config_value.values[0])
+            elif config_value.key == 'ProfileMode':
+                profile_options['mode'] = config_value.values[0].lower()
+            elif config_value.key == 'ProfileKeep':
+                profile_options['keep'] = int(config_value.values[0])
+            elif config_value.key == 'ProfileTrigger':
+                profile_options['trigger'] = config_value.values[0]
+            elif config_value.key == 'CaptureFile':
+                capture_options['capture'] = config_value.values[0]
+            elif config_value.key == 'CaptureCycles':
+                capture_options['capture_cycles'] = int(
+                    config_value.values[0])
+            elif config_value.key == 'ReplayFile':
+                capture_options['replay'] = config_value.values[0]
+            elif config_value.key == 'ReplayRealtime':
+                capture_options['replay_realtime'] = config_value.values[0]
+            elif config_value.key == 'Group':
+                type_rmq = config_value.values[0]
+                options = dict(regexes=list(), prefixes=list())
+                for option in config_value.children:
+                    if option.key == 'Regex':
+                        options['regexes'].append(option.values[0])
+                    elif option.key == 'Prefix':
+                        options['prefixes'].append(option.values[0])
+                    elif option.key == 'Aggregate':
+                        options['aggregate'] = option.values[0].lower()
+                if options.get('aggregate', 'sum') not in grouping.AGGREGATES:
+                    raise ValueError("Unsupported group aggregate {0}".format(
+                        options['aggregate']))
+                groups.setdefault(type_rmq, list()).append(
+                    grouping.Grouping(**options))
+            elif config_value.key == 'Watch':
+                watch = utils.WatchInfo(config_value.values[0])
+                for option in config_value.children:
+                    if option.key == 'Interval':
+                        watch.interval = float(option.values[0])
+                    elif option.key == 'Queue':
+                        if len(option.values) != 2:
+                            raise ValueError(
+                                "Watched queues need a vhost and a name")
+                        watch.queues.append(tuple(option.values))
+                watches.append(watch)
             elif config_value.key == 'Ignore':
                 type_rmq = config_value.values[0]
                 data_to_ignore[type_rmq] = list()
@@ -67,43 +212,107 @@ def configure(config_values):
 
     global CONFIGS  # pylint: disable=W0603
 
+    profile = None
+    if 'directory' in profile_options:
+        profile = utils.ProfileInfo(**profile_options)
+        if profile.mode not in profiling.MODES:
+            raise ValueError("Unsupported profile mode {0}".format(
+                profile.mode))
+        if profile.keep < 1:
+            raise ValueError("Profile keep must be at least 1")
+
+    if collect not in rabbit.COLLECT_STRATEGIES:
+        raise ValueError("Unsupported collect strategy {0}".format(collect))
+
+    if series_overflow not in cardinality.OVERFLOWS:
+        raise ValueError("Unsupported series overflow {0}".format(
+            series_overflow))
+
+    if not 0 <= shard_index < shard_count:
+        raise ValueError("Shard index {0} is not below shard count {1}".format(
+            shard_index, shard_count))
+
+    if scan_slices < 1:
+        raise ValueError("Scan slices must be at least 1")
+
+    if idle_backoff < 1:
+        raise ValueError("Idle backoff must be at least 1")
+
+    if pipeline_size < 1:
+        raise ValueError("Pipeline size must be at least 1")
+
+    if deleted_series not in inventory.DELETED_SERIES:
+        raise ValueError("Unsupported deleted series {0}".format(
+            deleted_series))
+
     auth = utils.Auth(username, password, realm)
     conn = utils.ConnectionInfo(host, port, scheme,
-                                validate_certs=validate_certs)
-    config = utils.Config(auth, conn, data_to_ignore, vhost_prefix)
+                                validate_certs=validate_certs,
+                                timeout=timeout)
+    config = utils.Config(auth, conn, data_to_ignore, vhost_prefix,
+                          interval=interval, self_metrics=self_metrics,
+                          derived_metrics=derived_metrics,
+                          local_rates=local_rates,
+                          vhost_totals=vhost_totals, totals_only=totals_only,
+                          groups=groups, queue_series=queue_series,
+                          queue_summaries=queue_summaries,
+                          max_series=max_series,
+                          series_overflow=series_overflow,
+                          deleted_series=deleted_series,
+                          shard_index=shard_index, shard_count=shard_count,
+                          designated_poller=designated_poller,
+                          node_name=node_name, scan_slices=scan_slices,
+                          scan_priority=scan_priority,
+                          scan_deadline=scan_deadline,
+                          idle_backoff=idle_backoff, watches=watches,
+                          pipeline=pipelined, pipeline_size=pipeline_size,
+                          worker=use_worker, worker_python=worker_python,
+                          profile=profile, collect=collect,
+                          **capture_options)
     CONFIGS.append(config)
 
 
 def init():
     """
-    Creates the logs stash plugin object.
+    Creates a plugin object for each configured cluster and registers a
+    named read callback for it.
+
+    Each instance gets its own callback, so collectd's read threads collect
+    the clusters concurrently and a slow or unreachable cluster only delays
+    its own callback.
     """
     for config in CONFIGS:
-        INSTANCES.append(CollectdPlugin(config))
+        name = "rabbitmq-{0}-{1}".format(len(INSTANCES),
+                                         config.connection.url)
+        instance = CollectdPlugin(config, name)
+        INSTANCES.append(instance)
+        if config.interval:
+            collectd.register_read(instance.read, config.interval,
+                                   name=name)
+        else:
+            collectd.register_read(instance.read, name=name)
+        for watcher in instance.watchers:
+            collectd.register_read(watcher.read, watcher.watch.interval,
+                                   name="{0}-watch-{1}".format(
+                                       name, watcher.watch.name))
 
 
-def read():
+def shutdown():
     """
-    Reads and dispatches data.
+    Stops the worker process of every instance that has one.
     """
-    collectd.debug("Reading data from rabbit and dispatching")
-    if not INSTANCES:
-        collectd.warning('Plugin not ready')
-        return
     for instance in INSTANCES:
-        instance.read()
+        if isinstance(instance.rabbit, worker.WorkerRabbitMQStats):
+            instance.rabbit.worker.stop()
 
 
-class CollectdPlugin(object):
+class CollectdPlugin(dispatching.Dispatcher):
     """
     Controls interaction between rabbitmq stats and collectd.
     """
-    message_stats = ['ack', 'publish', 'publish_in', 'publish_out', 'confirm',
-                     'deliver', 'deliver_noack', 'get', 'get_noack',
-                     'deliver_get', 'redeliver', 'return']
+    message_stats = records.MESSAGE_STATS
     message_details = ['rate']
-    queue_stats = ['consumers', 'consumer_utilisation', 'messages',
-                   'messages_ready', 'messages_unacknowledged']
+    queue_stats = records.QUEUE_STATS
     node_stats = ['disk_free', 'disk_free_limit', 'fd_total',
                   'fd_used', 'mem_limit', 'mem_used',
                   'proc_total', 'proc_used', 'processors', 'run_queue',
@@ -116,73 +325,315 @@ class CollectdPlugin(object):
                       'queue_totals': ['messages', 'messages_ready',
                                        'messages_unacknowledged']}
     overview_details = ['rate']
-
-    def __init__(self, config):
-        self.config = config
-        self.rabbit = rabbit.RabbitMQStats(self.config)
+    self_plugin = 'collectd_rabbitmq'
+    latency_percentiles = [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]
+
+    def __init__(self, config, name=None):
+        # The name of the read callback of the instance, see init.
+        self.name = name or "rabbitmq-{0}".format(config.connection.url)
+        if config.replay:
+            self.rabbit = rabbit.ReplayRabbitMQStats(config)
+        elif config.worker:
+            self.rabbit = worker.WorkerRabbitMQStats(config)
+        else:
+            self.rabbit = rabbit.RabbitMQStats(config)
+        if config.capture:
+            self.rabbit.recorder = capture.Recorder(
+                config.capture, config.capture_cycles)
+        dispatching.Dispatcher.__init__(self, config,
+                                        self.rabbit.instrumentation)
+        # Series that are not per object get the shard in their name, so
+        # that the instances of a sharded cluster do not overwrite them.
+        self.shard_suffix = ''
+        if self.config.shard_count > 1:
+            self.shard_suffix = '_shard%s' % self.config.shard_index
+            self.self_plugin += self.shard_suffix
+        self.rabbit.inventory.listeners.append(self.evict)
+        # Held while dispatching or evicting queues when the Pipeline
+        # producer thread can evict them at the same time, see
+        # stream_queues.
+        self.lock = threading.Lock()
+        self.scan = None
+        if self.config.scan_slices > 1 or self.config.scan_deadline:
+            self.scan = scanning.Scan(self.config.scan_slices,
+                                      self.config.scan_priority,
+                                      self.config.scan_deadline)
+        self.backoff = None
+        if self.config.idle_backoff > 1:
+            self.backoff = activity.Backoff(self.config.idle_backoff)
+            self.rabbit.listed_fields['queue'] = ['messages']
+        max_age = 1
+        if self.scan is not None or self.backoff is not None:
+            self.rabbit.select = self.select
+            # Objects are only seen every so many cycles, leave room for
+            # cycles cut off by the deadline.
+            max_age = 2 * max(self.config.scan_slices,
+                              self.config.idle_backoff)
+        if self.config.local_rates:
+            self.rates = rates.RateStore(max_age)
+        # The last dispatched record of each queue and exchange series, so
+        # that only the stats it had are zeroed once it is deleted.
+        self.last_records = None
+        if self.config.deleted_series == 'zero':
+            self.last_records = dict()
+        self.series = None
+        if self.config.max_series:
+            self.series = cardinality.SeriesLimit(
+                self.config.max_series, self.config.series_overflow,
+                cardinality.OTHER_NAME + self.shard_suffix, max_age)
+        if self.config.derived_metrics and derived.load_numpy() is None:
+            collectd.info("NumPy is not available, derived metrics are "
+                          "computed in Python")
+        # The name of the local node, and whether it was the designated
+        # poller in the last cycle, see is_poller.
+        self.node_name = self.config.node_name
+        if self.config.designated_poller and not self.node_name:
+            self.node_name = "rabbit@%s" % socket.gethostname().split('.')[0]
+        self.poller = None
+        # Watched queues are left out of the collection cycles, and only
+        # polled by the first shard, see watching. A replay has no cluster
+        # to poll them from.
+        self.watchers = list()
+        if not self.config.replay:
+            for watch in self.config.watches:
+                self.rabbit.watched.update(
+                    watching.quote_queues(watch.queues))
+            if self.is_first_shard():
+                self.watchers = [watching.Watcher(self, watch)
+                                 for watch in self.config.watches]
+        self.profiler = None
+        if self.config.profile:
+            # Named after the callback, so that two instances polling the
+            # same cluster do not rotate each other's profiles.
+            self.profiler = profiling.Profiler(
+                self.config.profile, re.sub(r'[^\w.-]+', '_', self.name))
 
     def read(self):
         """
-        Dispatches values to collectd.
-        """
-        self.dispatch_nodes()
-        self.dispatch_overview()
-        for vhost_name in self.rabbit.vhost_names:
-            self.dispatch_exchanges(vhost_name)
-            self.dispatch_queues(vhost_name)
+        Dispatches values to collectd, profiling the cycle when it is due.
 
-    def generate_vhost_name(self, name):
+        A failing cycle is logged with the URL of its cluster, so that it is
+        told apart from the callbacks of the other clusters.
         """
-        Generate a "normalized" vhost name without / (or escaped /).
+        try:
+            if self.profiler:
+                return self.profiler.run(self.collect)
+            return self.collect()
+        except Exception as ex:  # pylint: disable=W0703
+            collectd.error("Failed to read %s: %s" %
+                           (self.config.connection.url, ex))
+
+    def collect(self):
         """
-        if name:
-            name = urllib.unquote(name)
-
-        if not name or name == '/':
-            name = 'default'
-        else:
-            name = re.sub(r'^/', 'slash_', name)
-            name = re.sub(r'/$', '_slash', name)
-            name = re.sub(r'/', '_slash_', name)
-
-        vhost_prefix = ''
-        if self.config.vhost_prefix:
-            vhost_prefix = '%s_' % self.config.vhost_prefix
-        return 'rabbitmq_%s%s' % (vhost_prefix, name)
-
-    def dispatch_message_stats(self, data, vhost, plugin, plugin_instance):
+        Collects and dispatches a single cycle.
+        """
+        self.instrumentation.reset()
+        start = time.time()
+        if self.scan is not None:
+            self.scan.start_cycle()
+        poller = self.is_poller()
+        # With a designated poller, each node dispatches its own stats, the
+        # poller included, so that every node is dispatched once.
+        if self.config.designated_poller:
+            with self.instrumentation.phase('nodes'):
+                self.dispatch_local_node()
+        if poller:
+            self.collect_cluster()
+        self.instrumentation.phases['total'] = time.time() - start
+        self.rabbit.end_cycle()
+        if self.rates is not None:
+            self.rates.end_cycle()
+        if self.series is not None:
+            self.series.end_cycle()
+        if self.backoff is not None:
+            self.backoff.end_cycle()
+
+        if self.config.self_metrics:
+            self.dispatch_instrumentation()
+
+    def collect_cluster(self):
         """
-        Sends message stats to collectd.
+        Collects and dispatches the stats of the cluster, its nodes, vhosts,
+        exchanges and queues.
         """
-        if not data:
-            collectd.debug("No data for %s in vhost %s" % (plugin, vhost))
+        # Cluster wide stats are only collected by the first shard.
+        if self.is_first_shard():
+            if not self.config.designated_poller:
+                with self.instrumentation.phase('nodes'):
+                    self.dispatch_nodes()
+            with self.instrumentation.phase('overview'):
+                self.dispatch_overview()
+        with self.instrumentation.phase('vhosts'):
+            vhosts = self.rabbit.get_vhosts(columns=self.vhost_columns())
+        # Without a listing, no vhost is known to be gone.
+        if vhosts is None:
             return
+        vhosts = [vhost for vhost in vhosts if vhost.get('name')]
+        self.retain_vhosts([urllib.quote(vhost['name'], '')
+                            for vhost in vhosts])
+        for vhost in vhosts:
+            vhost_name = urllib.quote(vhost['name'], '')
+            host = self.generate_vhost_name(vhost_name)
+            totals_only = self.config.is_totals_only(vhost['name'])
+            if ((self.config.vhost_totals or totals_only) and
+                    self.is_first_shard()):
+                with self.instrumentation.phase('totals_%s' % host):
+                    self.dispatch_vhost_totals(vhost, vhost_name)
+            if totals_only:
+                continue
+            with self.instrumentation.phase('exchanges_%s' % host):
+                self.dispatch_exchanges(vhost_name)
+            with self.instrumentation.phase('queues_%s' % host):
+                self.dispatch_queues(vhost_name)
 
-        vhost = self.generate_vhost_name(vhost)
+    def is_poller(self):
+        """
+        Returns true if this instance polls the whole cluster. With
+        DesignatedPoller, only the running node with the lowest name does,
+        so the role moves to the next node when it leaves the cluster.
+        """
+        if not self.config.designated_poller:
+            return True
+        with self.instrumentation.phase('election'):
+            nodes = self.rabbit.get_nodes(columns=['name', 'running'])
+        running = sorted(node['name'] for node in nodes
+                         if node.get('name') and node.get('running', True))
+        if self.node_name not in running:
+            collectd.warning("Node %s is not a running node of the cluster"
+                             % self.node_name)
+        poller = bool(running) and running[0] == self.node_name
+        if poller != self.poller:
+            collectd.info("Node %s is %s the designated poller" % (
+                self.node_name, "now" if poller else "not"))
+            self.poller = poller
+        return poller
+
+    def is_first_shard(self):
+        """
+        Returns true if this instance is the only or the first shard.
+        """
+        return self.config.shard_index == 0
+
+    def vhost_columns(self):
+        """
+        Returns the fields to request from the vhost listing, only the
+        names unless totals are dispatched.
+        """
+        if not ((self.config.vhost_totals or self.config.totals_only) and
+                self.is_first_shard()):
+            return ['name']
+        if self.config.local_rates:
+            return records.COUNTER_COLUMNS['vhost']
+        return records.COLUMNS['vhost']
+
+    def retain_vhosts(self, vhost_names):
+        """
+        Forgets everything about the vhosts that are no longer listed.
+        """
+        self.rabbit.inventory.retain_vhosts(vhost_names)
+        if self.scan is not None:
+            self.scan.retain_vhosts(vhost_names)
+        vhost_names = set(vhost_names)
+        for key in [key for key in self.hosts
+                    if key[1] and key[1] not in vhost_names]:
+            del self.hosts[key]
+
+    def evict(self, stat_type, vhost_name, names):
+        """
+        Evicts deleted queues or exchanges from the per series caches, and
+        expires their series when DeletedSeries is set. Called by the
+        inventory of the RabbitMQ stats, from the Pipeline producer thread
+        too.
+        """
+        with self.lock:
+            self.evict_series(stat_type, vhost_name, names)
 
-        for name in self.message_stats:
-            if 'message_stats' not in data:
-                return
-            collectd.debug("Dispatching stat %s for %s in %s" %
-                           (name, plugin_instance, vhost))
+    def evict_series(self, stat_type, vhost_name, names):
+        """
+        Evicts deleted queues or exchanges, see evict.
+        """
+        plugin = '%ss' % stat_type
+        keys = [(vhost_name, plugin, name) for name in names]
+        if self.config.deleted_series != 'none':
+            self.expire_series(stat_type, vhost_name, [
+                name for name, key in zip(names, keys)
+                if self.has_series(stat_type, key)])
+        if self.rates is not None:
+            self.rates.evict(keys)
+        if self.series is not None:
+            self.series.evict(keys)
+        if self.backoff is not None and stat_type == 'queue':
+            self.backoff.evict([(vhost_name, name) for name in names])
+        if self.last_records is not None:
+            for key in keys:
+                self.last_records.pop(key, None)
+
+    def select(self, stat_type, vhost_name, names, listed):
+        """
+        Returns the names of the queues or exchanges of vhost_name to
+        request in this cycle, see activity.Backoff and scanning.Scan.
+        Called by the RabbitMQ stats.
+        """
+        if self.backoff is not None and stat_type == 'queue':
+            names = self.backoff.select(vhost_name, names, listed)
+        if self.scan is not None:
+            return self.scan.select(stat_type, vhost_name, names)
+        return names
 
-            try:
-                value = data['message_stats'][name]
-            except KeyError:
+    def has_series(self, stat_type, key):
+        """
+        Returns true if the queue or exchange of key, a vhost, plugin and
+        name tuple, had series of its own.
+        """
+        if stat_type == 'queue' and not self.config.queue_series:
+            return False
+        if grouping.find_group(self.config.groups.get(stat_type, list()),
+                               key[2]):
+            return False
+        if self.series is not None and key not in self.series.series:
+            return False
+        return True
+
+    def expire_series(self, stat_type, vhost_name, names):
+        """
+        Dispatches a notification, or zero for the gauges and rates its
+        last record had, for each deleted queue or exchange of names, so
+        that their series do not keep their last value.
+        """
+        host = self.generate_vhost_name(vhost_name)
+        plugin = '%ss' % stat_type
+        for name in names:
+            if self.config.deleted_series == 'notify':
+                self.dispatch_notification(
+                    host, plugin, name, "%s %s of vhost %s was deleted" % (
+                        stat_type.capitalize(), urllib.unquote(name),
+                        urllib.unquote(vhost_name)))
                 continue
-            self.dispatch_values(value, vhost, plugin, plugin_instance, name)
-
-            details = data['message_stats'].get("%s_details" % name, None)
-            if not details:
+            record = self.last_records.get((vhost_name, plugin, name))
+            if record is None:
                 continue
-            for detail in self.message_details:
-                try:
-                    value = details[detail]
-                except KeyError:
-                    continue
-                self.dispatch_values(
-                    value, vhost, plugin, plugin_instance,
-                    "%s_details" % name, detail)
+            for stat_name, _ in record.queue_values():
+                self.dispatch_values(0, host, plugin, name, stat_name)
+            for stat_name, _, rate in record.message_stats():
+                if rate is not records.MISSING:
+                    self.dispatch_values(0, host, plugin, name,
+                                         "%s_details" % stat_name, 'rate')
+
+    def dispatch_notification(self, host, plugin, plugin_instance, message):
+        """
+        Dispatches an informational notification to collectd.
+        """
+        try:
+            notification = collectd.Notification()
+            notification.host = host
+            notification.plugin = plugin
+            notification.plugin_instance = plugin_instance
+            notification.severity = collectd.NOTIF_OKAY
+            notification.message = message
+            notification.dispatch()
+        except Exception as ex:
+            collectd.warning("Failed to dispatch notification %s. "
+                             "Exception %s" % (message, ex))
 
     def dispatch_nodes(self):
         """
@@ -199,23 +650,39 @@ class CollectdPlugin(object):
                 node_name = '%s%s' % (node_name, len(node_names))
             node_names.append(node_name)
             collectd.debug("Getting stats for %s node" % node_names)
-            for stat_name in self.node_stats:
+            self.dispatch_node(name, node_name, node)
+
+    def dispatch_local_node(self):
+        """
+        Dispatches the stats of the local node only.
+        """
+        node = self.rabbit.get_node(self.node_name)
+        if not node:
+            return
+        self.dispatch_node(self.generate_vhost_name(''),
+                           node['name'].split('@')[1], node)
+
+    def dispatch_node(self, name, node_name, node):
+        """
+        Dispatches the stats of a node.
+        """
+        for stat_name in self.node_stats:
+            try:
+                value = node[stat_name]
+            except KeyError:
+                continue
+            self.dispatch_values(value, name, node_name, None, stat_name)
+
+            details = node.get("%s_details" % stat_name, None)
+            if not details:
+                continue
+            for detail in self.message_details:
                 try:
-                    value = node[stat_name]
+                    value = details[detail]
                 except KeyError:
                     continue
-                self.dispatch_values(value, name, node_name, None, stat_name)
-
-                details = node.get("%s_details" % stat_name, None)
-                if not details:
-                    continue
-                for detail in self.message_details:
-                    try:
-                        value = details[detail]
-                    except KeyError:
-                        continue
-                    self.dispatch_values(value, name, node_name, None,
-                                         "%s_details" % stat_name, detail)
+                self.dispatch_values(value, name, node_name, None,
+                                     "%s_details" % stat_name, detail)
 
     def dispatch_overview(self):
         """
@@ -263,105 +730,230 @@ class CollectdPlugin(object):
                                      'overview', subtree_name,
                                      "rabbitmq_details", stat_name)
 
-    def dispatch_queue_stats(self, data, vhost, plugin, plugin_instance):
+    def dispatch_vhost_totals(self, data, vhost_name):
         """
-        Sends queue stats to collectd.
+        Dispatches the message totals and rates of all queues in a vhost,
+        from its entry in the vhost listing.
         """
-        if not data:
-            collectd.debug("No data for %s in vhost %s" % (plugin, vhost))
-            return
+        record = records.as_record(data)
+        self.dispatch_message_stats(record, vhost_name, 'vhost', None)
+        self.dispatch_queue_stats(record, vhost_name, 'vhost', None)
 
-        vhost = self.generate_vhost_name(vhost)
-        for name in self.queue_stats:
-            if name not in data:
-                collectd.debug("Stat ({}) not found in data.".format(name))
-                continue
-            collectd.debug("Dispatching stat %s for %s in %s" %
-                           (name, plugin_instance, vhost))
-            try:
-                value = data[name]
-            except KeyError:
-                continue
-            if name is 'consumer_utilisation':
-                if value is None:
-                    value = 0
-            self.dispatch_values(value, vhost, plugin, plugin_instance, name)
+    def rollup(self, stat_type, stats):
+        """
+        Returns stats with the records of grouped objects of stat_type
+        replaced by one record per group.
+        """
+        stats, grouped = grouping.rollup(stats,
+                                         self.config.groups.get(stat_type))
+        self.instrumentation.grouped += grouped
+        return stats
+
+    def limit_series(self, vhost_name, plugin, stats):
+        """
+        Returns stats without the series over MaxSeries, see cardinality.
+        """
+        if self.series is None:
+            return stats
+        stats, overflowed = self.series.limit(vhost_name, plugin, stats)
+        if overflowed:
+            collectd.debug("%s %s of vhost %s over the series limit" %
+                           (overflowed, plugin, vhost_name))
+        self.instrumentation.overflowed += overflowed
+        return stats
 
     def dispatch_exchanges(self, vhost_name):
         """
         Dispatches exchange data for vhost_name.
         """
         collectd.debug("Dispatching exchange data for {0}".format(vhost_name))
-        stats = self.rabbit.get_exchange_stats(vhost_name=vhost_name)
+        stats = self.rollup('exchange', self.rabbit.get_exchange_stats(
+            vhost_name=vhost_name))
+        stats = self.limit_series(vhost_name, 'exchanges', stats)
         for exchange_name, value in stats.iteritems():
             self.dispatch_message_stats(value, vhost_name, 'exchanges',
                                         exchange_name)
+            self.remember(vhost_name, 'exchanges', exchange_name, value)
 
     def dispatch_queues(self, vhost_name):
         """
         Dispatches queue data for vhost_name.
         """
         collectd.debug("Dispatching queue data for {0}".format(vhost_name))
-        stats = self.rabbit.get_queue_stats(vhost_name=vhost_name)
-        for queue_name, value in stats.iteritems():
-            self.dispatch_message_stats(value, vhost_name, 'queues',
-                                        queue_name)
-            self.dispatch_queue_stats(value, vhost_name, 'queues',
-                                      queue_name)
-
-    # pylint: disable=R0913
-    @staticmethod
-    def dispatch_values(values, host, plugin, plugin_instance,
-                        metric_type, type_instance=None):
+        if self.config.pipeline:
+            stats, dispatched = self.stream_queues(vhost_name)
+        else:
+            stats = self.rabbit.get_queue_stats(vhost_name=vhost_name)
+            dispatched = set()
+        if self.backoff is not None:
+            self.backoff.observe(vhost_name, stats)
+        # Summaries describe the queues themselves, not their groups.
+        if self.config.queue_summaries:
+            self.dispatch_summaries(vhost_name, stats)
+        stats = self.rollup('queue', stats)
+        series = self.limit_series(vhost_name, 'queues', stats)
+        for queue_name, value in series.iteritems():
+            if queue_name not in dispatched:
+                self.dispatch_queue(vhost_name, queue_name, value)
+        if self.config.derived_metrics:
+            self.dispatch_derived(vhost_name, series)
+
+    def stream_queues(self, vhost_name):
         """
-        Dispatch metrics to collectd.
-
-        :param values (tuple or list): The values to dispatch. It will be
-                                       coerced into a list.
-        :param host: (str): The name of the vhost.
-        :param plugin (str): The name of the plugin. Should be
-                             queue/exchange.
-        :param plugin_instance (str): The queue/exchange name.
-        :param metric_type: (str): The name of metric.
-        :param type_instance: Optional.
-
+        Returns the stats of the queues of vhost_name and the names of those
+        already dispatched. The queues are requested by a producer thread,
+        see pipeline, and those that are neither grouped nor subject to
+        MaxSeries are dispatched as they arrive, while the next ones are
+        requested. The producer can evict deleted queues meanwhile, so both
+        hold the lock of the plugin.
         """
-        path = "{0}.{1}.{2}.{3}.{4}".format(host, plugin,
-                                            plugin_instance,
-                                            metric_type, type_instance)
-
-        collectd.debug("Dispatching %s values: %s" % (path, values))
-
-        try:
-            metric = collectd.Values()
-            metric.host = host
-
-            metric.plugin = plugin
-
-            if plugin_instance:
-                metric.plugin_instance = plugin_instance
+        groups = self.config.groups.get('queue', list())
+        stats = dict()
+        dispatched = set()
+        for queue_name, value in pipeline.pipelined(
+                self.rabbit.iter_stats('queue', vhost_name),
+                self.config.pipeline_size):
+            stats[queue_name] = value
+            if (self.series is None and
+                    grouping.find_group(groups, queue_name) is None):
+                with self.lock:
+                    self.dispatch_queue(vhost_name, queue_name, value)
+                dispatched.add(queue_name)
+        return stats, dispatched
+
+    def dispatch_queue(self, vhost_name, queue_name, value):
+        """
+        Dispatches the series of a single queue, or only updates its local
+        rates without QueueSeries.
+        """
+        if not self.config.queue_series:
+            self.update_rates(value, vhost_name, 'queues', queue_name)
+            return
+        self.dispatch_message_stats(value, vhost_name, 'queues', queue_name)
+        self.dispatch_queue_stats(value, vhost_name, 'queues', queue_name)
+        self.remember(vhost_name, 'queues', queue_name, value)
 
-            metric.type = metric_type
+    def remember(self, vhost_name, plugin, name, value):
+        """
+        Keeps the last record dispatched for a series, see expire_series.
+        """
+        if self.last_records is not None and value is not None:
+            self.last_records[(vhost_name, plugin, name)] = (
+                records.as_record(value))
 
-            if type_instance:
-                metric.type_instance = type_instance
+    def dispatch_summaries(self, vhost_name, stats):
+        """
+        Dispatches summaries of the distribution of queue stats across the
+        queues of vhost_name, see summaries.
+        """
+        vhost = self.generate_vhost_name(vhost_name)
+        for field, sketch in summaries.summarize(stats).items():
+            for name, value in sketch.summary():
+                self.dispatch_values(value, vhost,
+                                     'queue_summary' + self.shard_suffix,
+                                     field, 'rabbitmq_summary', name)
+
+    def dispatch_derived(self, vhost_name, stats):
+        """
+        Dispatches the metrics derived from the stats of all queues of
+        vhost_name, see derived.
+        """
+        names, columns = derived.load_columns(stats)
+        if not names:
+            return
+        vhost = self.generate_vhost_name(vhost_name)
+        for metric, values in derived.compute(columns).items():
+            for name, value in zip(names, values):
+                if math.isnan(value):
+                    continue
+                self.dispatch_values(float(value), vhost, 'queues', name,
+                                     metric)
 
-            if utils.is_sequence(values):
-                metric.values = values
+    def dispatch_instrumentation(self):
+        """
+        Dispatches the plugin's own timings and volumes for the last cycle.
+        """
+        host = self.generate_vhost_name('')
+        stats = self.instrumentation
+        values_dispatched = stats.values_dispatched
+
+        for phase, duration in stats.phases.items():
+            self.dispatch_values(duration, host, self.self_plugin, 'cycle',
+                                 'rabbitmq_plugin_duration', phase)
+        self.dispatch_values(values_dispatched, host, self.self_plugin,
+                             'cycle', 'rabbitmq_plugin_values')
+        self.dispatch_values(stats.ignored, host, self.self_plugin,
+                             'cycle', 'rabbitmq_plugin_objects', 'ignored')
+        self.dispatch_values(stats.grouped, host, self.self_plugin,
+                             'cycle', 'rabbitmq_plugin_objects', 'grouped')
+        self.dispatch_values(stats.created, host, self.self_plugin,
+                             'cycle', 'rabbitmq_plugin_objects', 'created')
+        self.dispatch_values(stats.deleted, host, self.self_plugin,
+                             'cycle', 'rabbitmq_plugin_objects', 'deleted')
+        if self.scan is not None:
+            self.dispatch_values(stats.skipped, host, self.self_plugin,
+                                 'cycle', 'rabbitmq_plugin_objects',
+                                 'skipped')
+        if self.config.shard_count > 1:
+            self.dispatch_values(stats.other_shards, host, self.self_plugin,
+                                 'cycle', 'rabbitmq_plugin_objects',
+                                 'other_shards')
+        if self.series is not None:
+            self.dispatch_values(stats.overflowed, host, self.self_plugin,
+                                 'cycle', 'rabbitmq_plugin_objects',
+                                 'overflowed')
+            self.dispatch_values(len(self.series), host, self.self_plugin,
+                                 'cycle', 'rabbitmq_plugin_objects',
+                                 'series')
+
+        for endpoint, endpoint_stats in stats.endpoints.items():
+            self.dispatch_values(endpoint_stats.requests, host,
+                                 self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_requests')
+            self.dispatch_values(endpoint_stats.errors, host,
+                                 self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_requests', 'errors')
+            self.dispatch_values(endpoint_stats.latency, host,
+                                 self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_duration', 'latency')
+            self.dispatch_values(endpoint_stats.latency_max, host,
+                                 self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_duration', 'latency_max')
+            self.dispatch_values(endpoint_stats.parse_time, host,
+                                 self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_duration', 'parse')
+            self.dispatch_values(endpoint_stats.bytes, host,
+                                 self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_bytes')
+
+        for endpoint, histogram in stats.histograms.items():
+            self.dispatch_histogram(host, endpoint, histogram)
+
+    def dispatch_histogram(self, host, endpoint, histogram):
+        """
+        Dispatches the cumulative buckets of a latency histogram, and the
+        percentiles of the latencies seen since the last dispatch.
+        """
+        cumulative = 0
+        for index, count in enumerate(histogram.counts):
+            cumulative += count
+            if index < len(histogram.bounds):
+                bucket = 'le_%gms' % (histogram.bounds[index] * 1000)
             else:
-                metric.values = [values]
-            # Tiny hack to fix bug with write_http plugin in Collectd
-            # versions < 5.5.
-            # See https://github.com/phobos182/collectd-elasticsearch/issues/15
-            # for details
-            metric.meta = {'0': True}
-            metric.dispatch()
-        except Exception as ex:
-            collectd.warning("Failed to dispatch %s. Exception %s" %
-                             (path, ex))
+                bucket = 'le_inf'
+            self.dispatch_values(cumulative, host, self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_latency_bucket', bucket)
+
+        delta = histogram.delta()
+        for name, fraction in self.latency_percentiles:
+            value = histogram.percentile(delta, fraction)
+            if value is None:
+                continue
+            self.dispatch_values(value, host, self.self_plugin, endpoint,
+                                 'rabbitmq_plugin_duration', name)
 
 
-# Register callbacks
+# Register callbacks. Read callbacks are registered per instance by init.
 collectd.register_config(configure)
 collectd.register_init(init)
-collectd.register_read(read)
+collectd.register_shutdown(shutdown)
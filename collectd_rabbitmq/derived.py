@@ -0,0 +1,142 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that derives metrics for all queues of a vhost at once.
+
+The stats of the queues are loaded into one column per field, and each
+metric is computed over whole columns: with NumPy when it is installed,
+otherwise with plain Python. Undefined values, such as the drain time of a
+growing queue, are NaN and are not dispatched.
+"""
+
+from collectd_rabbitmq.records import MESSAGE_STATS, MISSING, QUEUE_STATS
+
+# NumPy is only imported once derived metrics are computed, see load_numpy,
+# as it takes more memory than the rest of the plugin. None when it is not
+# installed.
+numpy = False
+
+NAN = float('nan')
+
+# Field, source, index into the source of a records.StatsRecord, and the
+# value used when the stat is missing. Queues without traffic have no
+# message rates at all, which means their rates are zero.
+FIELDS = (('messages', 'queue_stats', QUEUE_STATS.index('messages'), NAN),
+          ('messages_ready', 'queue_stats',
+           QUEUE_STATS.index('messages_ready'), NAN),
+          ('consumers', 'queue_stats', QUEUE_STATS.index('consumers'), NAN),
+          ('publish_rate', 'message_rates', MESSAGE_STATS.index('publish'),
+           0.0),
+          ('deliver_rate', 'message_rates',
+           MESSAGE_STATS.index('deliver_get'), 0.0))
+
+METRICS = ('rabbitmq_backlog_growth', 'rabbitmq_drain_time',
+           'rabbitmq_publish_deliver_ratio', 'rabbitmq_consumer_starved')
+
+
+def load_numpy():
+    """
+    Returns the NumPy module, importing it on first use, or None if it is
+    not installed.
+    """
+    global numpy  # pylint: disable=W0603
+    if numpy is False:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+def load_columns(stats):
+    """
+    Takes a dictionary of queue name to records.StatsRecord and returns the
+    names and a dictionary of field to column of values, in the same order.
+    """
+    names = list()
+    columns = dict((field, list()) for field, _, _, _ in FIELDS)
+    for name, record in stats.iteritems():
+        if record is None:
+            continue
+        names.append(name)
+        for field, source, index, default in FIELDS:
+            values = getattr(record, source)
+            value = values[index] if values is not None else MISSING
+            if value is MISSING or value is None:
+                value = default
+            columns[field].append(float(value))
+    return names, columns
+
+
+def compute_numpy(columns):
+    """
+    Returns a dictionary of metric to array of values, computed with NumPy.
+    """
+    messages = numpy.array(columns['messages'], dtype=float)
+    ready = numpy.array(columns['messages_ready'], dtype=float)
+    consumers = numpy.array(columns['consumers'], dtype=float)
+    publish = numpy.array(columns['publish_rate'], dtype=float)
+    deliver = numpy.array(columns['deliver_rate'], dtype=float)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        growth = publish - deliver
+        drain = numpy.where(-growth > 0, messages / -growth, NAN)
+        drain = numpy.where(messages == 0, 0.0, drain)
+        ratio = numpy.where(publish > 0, deliver / publish, NAN)
+        starved = ((ready > 0) & (consumers == 0)).astype(float)
+
+    return dict(rabbitmq_backlog_growth=growth, rabbitmq_drain_time=drain,
+                rabbitmq_publish_deliver_ratio=ratio,
+                rabbitmq_consumer_starved=starved)
+
+
+def compute_python(columns):
+    """
+    Returns a dictionary of metric to list of values, computed in Python.
+    """
+    growth = list()
+    drain = list()
+    ratio = list()
+    starved = list()
+    for messages, ready, consumers, publish, deliver in zip(
+            columns['messages'], columns['messages_ready'],
+            columns['consumers'], columns['publish_rate'],
+            columns['deliver_rate']):
+        growth.append(publish - deliver)
+        if messages == 0:
+            drain.append(0.0)
+        elif deliver - publish > 0:
+            drain.append(messages / (deliver - publish))
+        else:
+            drain.append(NAN)
+        ratio.append(deliver / publish if publish > 0 else NAN)
+        starved.append(1.0 if ready > 0 and consumers == 0 else 0.0)
+
+    return dict(rabbitmq_backlog_growth=growth, rabbitmq_drain_time=drain,
+                rabbitmq_publish_deliver_ratio=ratio,
+                rabbitmq_consumer_starved=starved)
+
+
+def compute(columns):
+    """
+    Returns a dictionary of metric to values, one per queue, with NumPy if
+    it is available.
+    """
+    if load_numpy() is not None:
+        return compute_numpy(columns)
+    return compute_python(columns)
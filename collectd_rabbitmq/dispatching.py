@@ -0,0 +1,176 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that dispatches the stats of queues and exchanges to collectd, for
+the plugin and for the watchers of watched queues.
+"""
+
+import collectd
+import re
+import time
+import urllib
+
+from collectd_rabbitmq import records
+from collectd_rabbitmq import utils
+
+
+class Dispatcher(object):
+    """
+    Dispatches values to collectd, with the state it needs: the host name
+    of each vhost, the local rates if they are enabled, and the
+    instrumentation that counts the dispatched values.
+    """
+
+    def __init__(self, config, instrumentation, rates=None):
+        self.config = config
+        self.instrumentation = instrumentation
+        self.rates = rates
+        # Host names by vhost prefix and vhost, see generate_vhost_name.
+        self.hosts = dict()
+
+    def generate_vhost_name(self, name):
+        """
+        Generate a "normalized" vhost name without / (or escaped /).
+        Host names are computed once per vhost.
+        """
+        key = (self.config.vhost_prefix, name)
+        host = self.hosts.get(key)
+        if host is None:
+            host = self.hosts[key] = self.normalize_vhost_name(name)
+        return host
+
+    def normalize_vhost_name(self, name):
+        """
+        Returns the host name of vhost name, see generate_vhost_name.
+        """
+        if name:
+            name = urllib.unquote(name)
+
+        if not name or name == '/':
+            name = 'default'
+        else:
+            name = re.sub(r'^/', 'slash_', name)
+            name = re.sub(r'/$', '_slash', name)
+            name = re.sub(r'/', '_slash_', name)
+
+        vhost_prefix = ''
+        if self.config.vhost_prefix:
+            vhost_prefix = '%s_' % self.config.vhost_prefix
+        return 'rabbitmq_%s%s' % (vhost_prefix, name)
+
+    def dispatch_message_stats(self, data, vhost, plugin, plugin_instance):
+        """
+        Sends message stats to collectd. data is a records.StatsRecord or
+        an API object.
+        """
+        data = records.as_record(data)
+        if not data:
+            collectd.debug("No data for %s in vhost %s" % (plugin, vhost))
+            return
+
+        self.update_rates(data, vhost, plugin, plugin_instance)
+        vhost = self.generate_vhost_name(vhost)
+
+        for name, value, rate in data.message_stats():
+            collectd.debug("Dispatching stat %s for %s in %s" %
+                           (name, plugin_instance, vhost))
+            self.dispatch_values(value, vhost, plugin, plugin_instance, name)
+            if rate is records.MISSING:
+                continue
+            self.dispatch_values(rate, vhost, plugin, plugin_instance,
+                                 "%s_details" % name, 'rate')
+
+    def update_rates(self, data, vhost, plugin, plugin_instance):
+        """
+        Replaces the rates of the broker in a record with local rates, when
+        they are enabled. Derived metrics and summaries then use them too.
+        """
+        if self.rates is None or data is None:
+            return
+        data.message_rates = self.rates.rates(
+            (vhost, plugin, plugin_instance), data.message_counts,
+            time.time())
+
+    def dispatch_queue_stats(self, data, vhost, plugin, plugin_instance):
+        """
+        Sends queue stats to collectd. data is a records.StatsRecord or an
+        API object.
+        """
+        data = records.as_record(data)
+        if not data:
+            collectd.debug("No data for %s in vhost %s" % (plugin, vhost))
+            return
+
+        vhost = self.generate_vhost_name(vhost)
+        for name, value in data.queue_values():
+            collectd.debug("Dispatching stat %s for %s in %s" %
+                           (name, plugin_instance, vhost))
+            if name == 'consumer_utilisation':
+                if value is None:
+                    value = 0
+            self.dispatch_values(value, vhost, plugin, plugin_instance, name)
+
+    # pylint: disable=R0913
+    def dispatch_values(self, values, host, plugin, plugin_instance,
+                        metric_type, type_instance=None):
+        """
+        Dispatch metrics to collectd.
+
+        :param values (tuple or list): The values to dispatch. It will be
+                                       coerced into a list.
+        :param host: (str): The name of the vhost.
+        :param plugin (str): The name of the plugin. Should be
+                             queue/exchange.
+        :param plugin_instance (str): The queue/exchange name.
+        :param metric_type: (str): The name of metric.
+        :param type_instance: Optional.
+
+        """
+        path = "{0}.{1}.{2}.{3}.{4}".format(host, plugin,
+                                            plugin_instance,
+                                            metric_type, type_instance)
+
+        collectd.debug("Dispatching %s values: %s" % (path, values))
+
+        try:
+            metric = collectd.Values()
+            metric.host = host
+
+            metric.plugin = plugin
+
+            if plugin_instance:
+                metric.plugin_instance = plugin_instance
+
+            metric.type = metric_type
+
+            if type_instance:
+                metric.type_instance = type_instance
+
+            if utils.is_sequence(values):
+                metric.values = values
+            else:
+                metric.values = [values]
+            # Tiny hack to fix bug with write_http plugin in Collectd
+            # versions < 5.5.
+            # See https://github.com/phobos182/collectd-elasticsearch/issues/15
+            # for details
+            metric.meta = {'0': True}
+            metric.dispatch()
+            self.instrumentation.values_dispatched += 1
+        except Exception as ex:
+            collectd.warning("Failed to dispatch %s. Exception %s" %
+                             (path, ex))
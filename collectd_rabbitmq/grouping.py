@@ -0,0 +1,145 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that rolls the stats of queues or exchanges up into groups, so that
+one series is dispatched per group instead of one per object.
+"""
+
+import itertools
+import re
+
+from collectd_rabbitmq.records import (MISSING, QUEUE_STATS, RATIO_STATS,
+                                       StatsRecord)
+
+AGGREGATES = dict(sum=sum, max=max)
+# Prepended to group names, so that a group never takes the series of a
+# queue or exchange: their URL encoded names cannot hold a '+'.
+GROUP_PREFIX = 'group+'
+
+
+def mean(values):
+    """
+    Returns the mean of values.
+    """
+    return float(sum(values)) / len(values)
+
+
+class Grouping(object):
+    """
+    A grouping rule. A name belongs to the group of the first regex that
+    matches it, named after the first capture group of the regex or the
+    whole match, or else to the group of the longest prefix it starts with.
+    """
+
+    def __init__(self, regexes=None, prefixes=None, aggregate='sum'):
+        self.regexes = [re.compile(regex) for regex in regexes or list()]
+        self.aggregate = aggregate
+        self.function = AGGREGATES[aggregate]
+        # Prefixes by length, longest first, so a lookup costs one set
+        # membership test per distinct length instead of one per prefix.
+        self.prefixes = dict()
+        for prefix in prefixes or list():
+            self.prefixes.setdefault(len(prefix), set()).add(prefix)
+        self.lengths = sorted(self.prefixes, reverse=True)
+
+    def group(self, name):
+        """
+        Returns the group of name, or None if it is not grouped.
+        """
+        for regex in self.regexes:
+            match = regex.match(name)
+            if match:
+                return match.group(1) if regex.groups else match.group(0)
+        for length in self.lengths:
+            if name[:length] in self.prefixes[length]:
+                return name[:length]
+        return None
+
+
+def find_group(groupings, name):
+    """
+    Returns the group name and grouping of the first of groupings that
+    groups name, or None.
+    """
+    for grouping in groupings:
+        group = grouping.group(name)
+        if group is not None:
+            return group, grouping
+    return None
+
+
+def aggregate(rows, function):
+    """
+    Returns a tuple aggregating the aligned tuples in rows with function,
+    or a list of one function per column, ignoring missing and None values,
+    or None if there are no tuples.
+    """
+    rows = [row for row in rows if row is not None]
+    if not rows:
+        return None
+    functions = function
+    if not isinstance(function, list):
+        functions = itertools.repeat(function)
+    aggregated = list()
+    for column, column_function in itertools.izip(zip(*rows), functions):
+        values = [value for value in column
+                  if value is not MISSING and value is not None]
+        aggregated.append(column_function(values) if values else MISSING)
+    return tuple(aggregated)
+
+
+def aggregate_records(records, function):
+    """
+    Returns a StatsRecord aggregating records with function. Ratio queue
+    stats are averaged instead of summed, so they stay ratios.
+    """
+    queue_functions = function
+    if function is sum:
+        queue_functions = [mean if name in RATIO_STATS else sum
+                           for name in QUEUE_STATS]
+    return StatsRecord(
+        aggregate([record.message_counts for record in records], function),
+        aggregate([record.message_rates for record in records], function),
+        aggregate([record.queue_stats for record in records],
+                  queue_functions))
+
+
+def rollup(stats, groupings):
+    """
+    Takes a dictionary of name to records.StatsRecord and returns a
+    dictionary holding the ungrouped records and one record per group,
+    under GROUP_PREFIX and the group name, and the number of records that
+    were grouped.
+    """
+    if not groupings:
+        return stats, 0
+
+    rolled = dict()
+    members = dict()
+    for name, record in stats.iteritems():
+        found = find_group(groupings, name)
+        if found is None:
+            rolled[name] = record
+        elif record is not None:
+            members.setdefault(found, list()).append(record)
+
+    grouped = 0
+    for (group, grouping), records in members.iteritems():
+        grouped += len(records)
+        rolled[GROUP_PREFIX + group] = aggregate_records(records,
+                                                         grouping.function)
+    return rolled, grouped
@@ -0,0 +1,159 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Module that measures the cost of the plugin itself """
+
+import bisect
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the request latency buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class Histogram(object):
+    """
+    Fixed bucket histogram. The last bucket counts values above all bounds.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.last_counts = list(self.counts)
+
+    def add(self, value):
+        """
+        Counts value in the first bucket whose bound is not below it.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def delta(self):
+        """
+        Returns the counts added since the last call.
+        """
+        counts = self.counts[:]
+        delta = [now - last for now, last in zip(counts, self.last_counts)]
+        self.last_counts = counts
+        return delta
+
+    def percentile(self, counts, fraction):
+        """
+        Returns the estimated value below which fraction of counts lie,
+        interpolating linearly within the bucket. Returns None without counts.
+        """
+        total = sum(counts)
+        if not total:
+            return None
+        rank = fraction * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class EndpointStats(object):
+    """
+    Stores request counters for one management API endpoint.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.latency_max = 0.0
+        self.parse_time = 0.0
+        self.bytes = 0
+
+    def record(self, latency, size, parse_time, error=False):
+        """
+        Adds a single request to the counters.
+        """
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.latency += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.parse_time += parse_time
+        self.bytes += size
+
+
+class Instrumentation(object):
+    """
+    Collects per cycle timings and volumes of the plugin.
+    """
+
+    def __init__(self):
+        self.phases = dict()
+        self.endpoints = dict()
+        self.values_dispatched = 0
+        self.ignored = 0
+        self.grouped = 0
+        self.overflowed = 0
+        self.created = 0
+        self.deleted = 0
+        self.other_shards = 0
+        self.skipped = 0
+        # Latency histograms live across cycles, see Histogram.delta.
+        self.histograms = dict()
+
+    def reset(self):
+        """
+        Starts a new collection cycle.
+        """
+        self.phases = dict()
+        self.endpoints = dict()
+        self.values_dispatched = 0
+        self.ignored = 0
+        self.grouped = 0
+        self.overflowed = 0
+        self.created = 0
+        self.deleted = 0
+        self.other_shards = 0
+        self.skipped = 0
+
+    def record_request(self, endpoint, latency, size, parse_time,
+                       error=False):
+        """
+        Records a request made to endpoint.
+        """
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        stats.record(latency, size, parse_time, error)
+
+        histogram = self.histograms.get(endpoint)
+        if histogram is None:
+            histogram = self.histograms[endpoint] = Histogram()
+        histogram.add(latency)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Adds the wall time spent in the with block to phase name.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = (self.phases.get(name, 0.0) +
+                                 time.time() - start)
@@ -0,0 +1,100 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that keeps the queues and exchanges of each vhost from one listing to
+the next, so that the work done per object only happens for new objects.
+"""
+
+# What to dispatch for the series of deleted objects: nothing, a
+# notification, or zero for their gauges and rates.
+DELETED_SERIES = ('none', 'notify', 'zero')
+
+
+class Inventory(object):
+    """
+    Index of the objects of each stat type and vhost, by name in the API,
+    holding the entry resolve returned when the object was first listed.
+    A false entry stands for an object that is not collected, None for an
+    ignored object and False for an object of another shard.
+
+    Listeners are called with the stat type, vhost and entries of the
+    objects that were deleted, to evict them from their caches.
+    """
+
+    def __init__(self, resolve):
+        self.resolve = resolve
+        self.objects = dict()
+        self.listeners = list()
+
+    def __len__(self):
+        return sum(len(objects) for objects in self.objects.itervalues())
+
+    def update(self, stat_type, vhost_name, names):
+        """
+        Replaces the objects of stat_type in vhost_name with names and
+        returns a dictionary of name to entry, and the entries of the
+        objects created and deleted since the last update, objects that are
+        not collected left out.
+        """
+        key = (stat_type, vhost_name)
+        known = self.objects.get(key, dict())
+        current = dict()
+        created = list()
+        kept = 0
+        for name in names:
+            try:
+                current[name] = known[name]
+                kept += 1
+            except KeyError:
+                entry = current[name] = self.resolve(stat_type, vhost_name,
+                                                     name)
+                if entry:
+                    created.append(entry)
+
+        # Only look for deleted objects when the counts say there are some.
+        deleted = list()
+        if len(known) > kept:
+            deleted = [gone for name, gone in known.iteritems()
+                       if name not in current and gone]
+        self.objects[key] = current
+        self.evict(stat_type, vhost_name, deleted)
+        return current, created, deleted
+
+    def retain_vhosts(self, vhost_names):
+        """
+        Forgets the objects of the vhosts that are not in vhost_names, and
+        returns the names of the vhosts that were forgotten.
+        """
+        vhost_names = set(vhost_names)
+        removed = set()
+        for stat_type, vhost_name in self.objects.keys():
+            if vhost_name in vhost_names:
+                continue
+            removed.add(vhost_name)
+            deleted = self.objects.pop((stat_type, vhost_name))
+            self.evict(stat_type, vhost_name, deleted.values())
+        return removed
+
+    def evict(self, stat_type, vhost_name, entries):
+        """
+        Calls the listeners with the entries of deleted objects.
+        """
+        entries = [entry for entry in entries if entry]
+        if not entries:
+            return
+        for listener in self.listeners:
+            listener(stat_type, vhost_name, entries)
@@ -0,0 +1,81 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that overlaps the requests for objects with their dispatch, by
+producing them from another thread.
+"""
+
+import Queue
+import sys
+import threading
+
+# Put by the producer after the last item, with the exception info of the
+# error that stopped it, if any.
+DONE = object()
+
+
+def pipelined(items, size):
+    """
+    Yields items, which are produced by a thread of their own while the
+    caller consumes them, at most size items ahead. An exception raised
+    while producing items is raised again to the caller, and the producer
+    stops when the caller stops consuming them.
+    """
+    queue = Queue.Queue(size)
+    stopped = threading.Event()
+
+    def put(item):
+        """
+        Puts item in the queue once there is room, and returns true, or
+        returns false if the consumer stopped first.
+        """
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                continue
+        return False
+
+    def produce():
+        """
+        Puts each of items in the queue until they run out or the consumer
+        stops.
+        """
+        error = None
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception:  # pylint: disable=W0703
+            error = sys.exc_info()
+        put((DONE, error))
+
+    producer = threading.Thread(target=produce, name='rabbitmq-producer')
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            item = queue.get()
+            if isinstance(item, tuple) and item[0] is DONE:
+                if item[1] is not None:
+                    raise item[1][0], item[1][1], item[1][2]
+                return
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
@@ -0,0 +1,119 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Module that profiles read cycles on demand """
+
+import collectd
+import cProfile
+import os
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+MODES = ('cprofile', 'tracemalloc', 'both')
+
+
+class Profiler(object):
+    """
+    Profiles every Nth call, or the next call after the trigger file has
+    been created, and writes the results to a directory.
+    """
+
+    def __init__(self, profile_info, name):
+        self.info = profile_info
+        self.name = name
+        self.calls = 0
+        self.cprofile = self.info.mode in ('cprofile', 'both')
+        self.tracemalloc = self.info.mode in ('tracemalloc', 'both')
+        if self.tracemalloc and tracemalloc is None:
+            collectd.warning("tracemalloc is not available, only cProfile "
+                             "results will be written")
+            self.tracemalloc = False
+            self.cprofile = True
+
+    @property
+    def trigger(self):
+        """
+        Returns the path of the one shot trigger file.
+        """
+        return self.info.trigger or os.path.join(self.info.directory,
+                                                 'trigger')
+
+    def should_profile(self):
+        """
+        Returns true if the current call should be profiled. A trigger file
+        is removed so that it only captures a single call.
+        """
+        if os.path.exists(self.trigger):
+            try:
+                os.remove(self.trigger)
+            except OSError as err:
+                collectd.warning("Unable to remove profile trigger %s: %s" %
+                                 (self.trigger, err))
+            return True
+        return bool(self.info.every) and self.calls % self.info.every == 0
+
+    def run(self, func):
+        """
+        Calls func, profiling it when it is due.
+        """
+        self.calls += 1
+        if not self.should_profile():
+            return func()
+
+        if not os.path.isdir(self.info.directory):
+            os.makedirs(self.info.directory)
+        prefix = os.path.join(self.info.directory, "{0}-{1}-{2:06d}".format(
+            self.name, time.strftime('%Y%m%dT%H%M%S'), self.calls))
+        collectd.info("Profiling read into %s" % prefix)
+
+        started_tracemalloc = False
+        if self.tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+        profile = cProfile.Profile() if self.cprofile else None
+
+        try:
+            if profile:
+                return profile.runcall(func)
+            return func()
+        finally:
+            if profile:
+                profile.dump_stats("%s.prof" % prefix)
+            if self.tracemalloc:
+                tracemalloc.take_snapshot().dump("%s.tracemalloc" % prefix)
+                if started_tracemalloc:
+                    tracemalloc.stop()
+            self.rotate()
+
+    def rotate(self):
+        """
+        Removes all but the latest results of this profiler.
+        """
+        results = sorted(
+            name for name in os.listdir(self.info.directory)
+            if name.startswith("%s-" % self.name))
+        keep = 2 * self.info.keep if self.cprofile and self.tracemalloc \
+            else self.info.keep
+        for name in results[:-keep]:
+            try:
+                os.remove(os.path.join(self.info.directory, name))
+            except OSError as err:
+                collectd.warning("Unable to remove profile %s: %s" %
+                                 (name, err))
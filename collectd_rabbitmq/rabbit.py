@@ -18,12 +18,76 @@
 python plugin for collectd to obtain rabbitmq stats
 """
 
+import base64
 import collectd
 import json
+import socket
 import ssl
+import time
 import urllib
 import urllib2
 
+from collectd_rabbitmq import capture
+from collectd_rabbitmq import grouping
+from collectd_rabbitmq import instrumentation
+from collectd_rabbitmq import inventory
+from collectd_rabbitmq import records
+from collectd_rabbitmq import sharding
+
+# 'detail' requests every queue and exchange on its own, 'list' takes the
+# stats from the listing of each vhost.
+COLLECT_STRATEGIES = ('detail', 'list')
+
+
+def get_path(args, columns=None):
+    """
+    Returns the API path made from args, limited to a list of columns.
+    """
+    path = '/'.join(args)
+    if columns:
+        path = "{0}?columns={1}".format(path, ','.join(columns))
+    return path
+
+
+def project_info(args, columns, value):
+    """
+    Returns the API value of args projected to what the plugin keeps: a
+    records.StatsRecord for a single queue or exchange, and names and
+    records for their listings, see project_listing.
+    """
+    if value is None or not args or args[0] not in ('queues', 'exchanges'):
+        return value
+    if len(args) > 2:
+        return records.as_record(value)
+    return project_listing(value, columns)
+
+
+def project_listing(items, columns):
+    """
+    Returns the names of the objects of a listing and their
+    records.StatsRecord, or None for the records when only names were
+    listed. A listing that is already projected is returned as it is.
+    """
+    if items is None or isinstance(items, tuple):
+        return items
+    names = [item['name'] for item in items if item.get('name')]
+    if columns == ['name']:
+        return names, None
+    return names, [records.as_record(item) for item in items
+                   if item.get('name')]
+
+
+def get_endpoint(args):
+    """
+    Returns the endpoint family of the API path made from args.
+    """
+    resource = args[0] if args else None
+    if resource in ('queues', 'exchanges') and len(args) > 2:
+        return resource[:-1]
+    if resource in ('nodes', 'overview', 'vhosts', 'queues', 'exchanges'):
+        return resource
+    return 'other'
+
 
 class RabbitMQStats(object):
     """
@@ -32,6 +96,28 @@ class RabbitMQStats(object):
     def __init__(self, config):
         self.config = config
         self.api = "{0}/api".format(self.config.connection.url)
+        self.authorization = "Basic {0}".format(base64.b64encode(
+            "{0}:{1}".format(self.config.auth.username,
+                             self.config.auth.password)))
+        self.context = None
+        if self.config.connection.validate_certs is False:
+            self.context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            self.context.options |= ssl.OP_NO_SSLv2
+            self.context.options |= ssl.OP_NO_SSLv3
+            self.context.verify_mode = ssl.CERT_NONE
+            self.context.check_hostname = False
+        self.instrumentation = instrumentation.Instrumentation()
+        self.inventory = inventory.Inventory(self.resolve_name)
+        # Set by the plugin to capture responses, see capture.Recorder.
+        self.recorder = None
+        # Set by the plugin to request only some of the objects of each
+        # vhost, see CollectdPlugin.select, with the fields of the name
+        # listing it needs by stat type.
+        self.select = None
+        self.listed_fields = dict()
+        # URL encoded vhost and name pairs of the queues polled by a
+        # watcher instead, see watching.Watcher.
+        self.watched = set()
 
     @staticmethod
     def get_names(items):
@@ -47,94 +133,174 @@ class RabbitMQStats(object):
                 names.append(name)
         return names
 
-    def get_info(self, *args):
+    def resolve_name(self, stat_type, vhost_name, name):
         """
-        return JSON object from URL.
+        Returns the URL encoded and interned name of a newly listed object,
+        None if it is ignored, or False if it belongs to another shard.
         """
-        handlers = []
-        if self.config.connection.validate_certs is False:
-            ctx = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
-            ctx.options |= ssl.OP_NO_SSLv2
-            ctx.options |= ssl.OP_NO_SSLv3
-            ctx.verify_mode = ssl.CERT_NONE
-            ctx.check_hostname = False
-            handlers.append(urllib2.HTTPSHandler(context=ctx))
-
-        url = "{0}/{1}".format(self.api, '/'.join(args))
-        collectd.debug("Getting info for %s" % url)
+        name = urllib.quote(name, '')
+        if self.config.is_ignored(stat_type, name):
+            return None
+        if stat_type == 'queue' and (vhost_name, name) in self.watched:
+            return None
+        if not self.is_own_shard(stat_type, vhost_name, name):
+            return False
+        return records.intern_name(name)
+
+    def is_own_shard(self, stat_type, vhost_name, name):
+        """
+        Returns true if the object name of vhost_name belongs to the shard
+        of this instance. Grouped objects are sharded by group, so that
+        each group is rolled up by a single instance.
+        """
+        if self.config.shard_count <= 1:
+            return True
+        found = grouping.find_group(self.config.groups.get(stat_type, list()),
+                                    name)
+        if found is not None:
+            name = found[0]
+        return (sharding.shard_of(vhost_name, name, self.config.shard_count)
+                == self.config.shard_index)
 
-        auth_handler = urllib2.HTTPBasicAuthHandler()
-        auth_handler.add_password(realm=self.config.auth.realm,
-                                  uri=self.api,
-                                  user=self.config.auth.username,
-                                  passwd=self.config.auth.password)
+    def update_inventory(self, stat_type, vhost_name, names):
+        """
+        Updates the inventory of stat_type in vhost_name from the names of
+        a listing, and returns a dictionary of name to inventory entry.
+        """
+        entries, created, deleted = self.inventory.update(
+            stat_type, vhost_name, names)
+        self.instrumentation.created += len(created)
+        self.instrumentation.deleted += len(deleted)
+        return entries
 
-        handlers.append(auth_handler)
+    def get_info(self, *args, **kwargs):
+        """
+        return JSON object from URL. A list of columns limits the fields of
+        the returned objects.
+        """
+        value, latency, size, parse_time, body = self.fetch_info(
+            args, kwargs.get('columns'), keep_body=bool(self.recorder),
+            project=kwargs.get('project', False))
+        if self.recorder:
+            self.recorder.record(get_path(args, kwargs.get('columns')),
+                                 latency, body)
+        self.instrumentation.record_request(get_endpoint(args), latency,
+                                            size, parse_time,
+                                            error=value is None)
+        return value
 
-        opener = urllib2.build_opener(*handlers)
-        urllib2.install_opener(opener)
+    def fetch_info(self, args, columns=None, keep_body=False, project=False):
+        """
+        Requests and parses the API path made from args and columns, and
+        returns the parsed value, projected when project is true, see
+        project_info, or None on error, with the latency, size and parse
+        time of the response, and its body when keep_body is true.
+        """
+        path = get_path(args, columns)
+        start = time.time()
+        body = self.fetch(path)
+        latency = time.time() - start
+        if body is None:
+            return None, latency, 0, 0.0, None
 
+        start = time.time()
         try:
-            info = urllib2.urlopen(url)
+            return_value = json.loads(body)
+        except ValueError as err:
+            collectd.error("ValueError parsing JSON from %s: %s" %
+                           (path, err))
+            return_value = None
+        except TypeError as err:
+            collectd.error("TypeError parsing JSON from %s: %s" %
+                           (path, err))
+            return_value = None
+        if project:
+            return_value = project_info(args, columns, return_value)
+        return (return_value, latency, len(body), time.time() - start,
+                body if keep_body else None)
+
+    def fetch(self, path):
+        """
+        Returns the raw response body of an API path, or None on error.
+        """
+        url = "{0}/{1}".format(self.api, path)
+        collectd.debug("Getting info for %s" % url)
+
+        # The credentials are sent with every request instead of being
+        # installed as a global opener, so that several instances can
+        # query different clusters from concurrent read threads.
+        request = urllib2.Request(url)
+        request.add_header('Authorization', self.authorization)
+
+        try:
+            info = urllib2.urlopen(request,
+                                   timeout=self.config.connection.timeout,
+                                   context=self.context)
+            return info.read()
         except urllib2.HTTPError as http_error:
             collectd.error("HTTP Error: %s" % http_error)
-            return None
         except urllib2.URLError as url_error:
             collectd.error("URL Error: %s" % url_error)
-            return None
         except ValueError as value_error:
             collectd.error("Value Error: %s" % value_error)
-            return None
+        except socket.error as socket_error:
+            collectd.error("Socket Error: %s" % socket_error)
+        return None
 
-        try:
-            return_value = json.load(info)
-        except ValueError as err:
-            collectd.error("ValueError parsing JSON from %s: %s" % (url, err))
-            return_value = None
-        except TypeError as err:
-            collectd.error("TypeError parsing JSON from %s: %s" % (url, err))
-            return_value = None
-        return return_value
+    def end_cycle(self):
+        """
+        Called by the plugin after each collection cycle.
+        """
+        if self.recorder:
+            self.recorder.end_cycle()
 
-    def get_nodes(self):
+    def get_nodes(self, columns=None):
         """
         Return a list of nodes.
         """
-        return self.get_info("nodes") or list()
+        return self.get_info("nodes", columns=columns) or list()
     nodes = property(get_nodes)
 
+    def get_node(self, node_name):
+        """
+        Returns the stats of a single node, or None.
+        """
+        return self.get_info("nodes", urllib.quote(node_name, ''))
+
     # Vhosts
-    def get_vhosts(self):
+    def get_vhosts(self, columns=None):
         """
-        Returns a list of vhosts.
+        Returns a list of vhosts, or None if the request failed.
         """
         collectd.debug("Getting a list of vhosts")
-        return self.get_info("vhosts") or list()
+        return self.get_info("vhosts", columns=columns)
 
     def get_vhost_names(self):
         """
         Returns a list of vhost names.
         """
         collectd.debug("Getting vhost names")
-        all_vhosts = self.get_vhosts()
-        return self.get_names(all_vhosts) or list()
+        all_vhosts = self.get_vhosts(columns=['name'])
+        return self.get_names(all_vhosts or list())
     vhost_names = property(get_vhost_names)
 
     # Exchanges
-    def get_exchanges(self, vhost_name=None):
+    def get_exchanges(self, vhost_name=None, columns=None, project=False):
         """
-        Returns raw exchange data.
+        Returns raw exchange data, projected when project is true, or None
+        if the request failed.
         """
         collectd.debug("Getting exchanges for %s" % vhost_name)
-        return self.get_info("exchanges", vhost_name) or list()
+        return self.get_info("exchanges", vhost_name, columns=columns,
+                             project=project)
 
     def get_exchange_names(self, vhost_name=None):
         """
         Returns a list of all exchange names.
         """
         collectd.debug("Getting exchange names for %s" % vhost_name)
-        all_exchanges = self.get_exchanges(vhost_name)
-        return self.get_names(all_exchanges)
+        all_exchanges = self.get_exchanges(vhost_name, columns=['name'])
+        return self.get_names(all_exchanges or list())
 
     def get_exchange_stats(self, exchange_name=None, vhost_name=None):
         """
@@ -146,20 +312,22 @@ class RabbitMQStats(object):
         return self.get_stats('exchange', exchange_name, vhost_name)
 
     # Queues
-    def get_queues(self, vhost_name=None):
+    def get_queues(self, vhost_name=None, columns=None, project=False):
         """
-        Returns raw queue data.
+        Returns raw queue data, projected when project is true, or None if
+        the request failed.
         """
         collectd.debug("Getting queues for %s" % vhost_name)
-        return self.get_info("queues", vhost_name) or list()
+        return self.get_info("queues", vhost_name, columns=columns,
+                             project=project)
 
     def get_queue_names(self, vhost_name=None):
         """
         Returns a list of all queue names.
         """
         collectd.debug("Getting queue names for %s" % vhost_name)
-        all_queues = self.get_queues(vhost_name)
-        return self.get_names(all_queues)
+        all_queues = self.get_queues(vhost_name, columns=['name'])
+        return self.get_names(all_queues or list())
 
     def get_queue_stats(self, queue_name=None, vhost_name=None):
         """
@@ -175,7 +343,7 @@ class RabbitMQStats(object):
 
     def get_stats(self, stat_type, stat_name, vhost_name):
         """
-        Returns a dictionary of stats.
+        Returns a dictionary of object name to records.StatsRecord.
         """
         collectd.debug("Getting stats for %s %s%s in %s" %
                        (stat_name or 'all',
@@ -185,7 +353,6 @@ class RabbitMQStats(object):
 
         if stat_type not in('exchange', 'queue'):
             raise ValueError("Unsupported stat type {0}".format(stat_type))
-        stat_name_func = getattr(self, 'get_{0}_names'.format(stat_type))
         if not vhost_name:
             vhosts = self.get_vhost_names()
         else:
@@ -193,13 +360,117 @@ class RabbitMQStats(object):
 
         stats = dict()
         for vhost in vhosts:
-            if not stat_name:
-                names = stat_name_func(vhost)
+            stats.update(self.iter_stats(stat_type, vhost, stat_name))
+        return stats
+
+    def iter_stats(self, stat_type, vhost_name, stat_name=None):
+        """
+        Yields the name and records.StatsRecord of each object of stat_type
+        in vhost_name, or of stat_name only, requesting each object as it is
+        consumed.
+        """
+        if not stat_name and self.config.collect == 'list':
+            for item in self.get_listed_stats(stat_type,
+                                              vhost_name).iteritems():
+                yield item
+            return
+        if stat_name:
+            if self.config.is_ignored(stat_type, stat_name):
+                self.instrumentation.ignored += 1
+                return
+            names = [records.intern_name(stat_name)]
+            listed = None
+        else:
+            names, listed = self.get_inventory_names(stat_type, vhost_name)
+        # The selection is consumed as objects are requested, so that it
+        # can stop at a deadline.
+        selected = names
+        if self.select is not None and not stat_name:
+            selected = self.select(stat_type, vhost_name, names, listed)
+        requested = 0
+        for name in selected:
+            yield name, records.as_record(
+                self.get_info("{0}s".format(stat_type), vhost_name, name,
+                              project=True))
+            requested += 1
+        self.instrumentation.skipped += len(names) - requested
+
+    def get_listing(self, stat_type, vhost_name, columns):
+        """
+        Returns the names and records of the objects of stat_type in
+        vhost_name, see project_listing, or None if the request failed.
+        """
+        list_func = getattr(self, 'get_{0}s'.format(stat_type))
+        return project_listing(
+            list_func(vhost_name, columns=columns, project=True), columns)
+
+    def get_inventory_names(self, stat_type, vhost_name):
+        """
+        Returns the URL encoded names of the objects of stat_type in
+        vhost_name that are not ignored, resolving only new objects, and a
+        dictionary of name to listed record when listed_fields asks for
+        more than their names, or None. When the listing fails, no object
+        is returned and the inventory is left as it was, as a failed
+        request says nothing about deleted objects.
+        """
+        fields = self.listed_fields.get(stat_type, list())
+        listing = self.get_listing(stat_type, vhost_name, ['name'] + fields)
+        if listing is None:
+            return list(), None
+        listed_names, listed_records = listing
+        entries = self.update_inventory(stat_type, vhost_name, listed_names)
+        listed = None
+        if listed_records is not None:
+            listed = dict((entries[name], record) for name, record
+                          in zip(listed_names, listed_records)
+                          if entries[name])
+        names = list()
+        for entry in entries.itervalues():
+            if entry:
+                names.append(entry)
+            elif entry is None:
+                self.instrumentation.ignored += 1
+            else:
+                self.instrumentation.other_shards += 1
+        return names, listed
+
+    def get_listed_stats(self, stat_type, vhost_name):
+        """
+        Returns a dictionary of records taken from the listing of
+        vhost_name, with a single request instead of one per object.
+        """
+        stats = dict()
+        columns = records.COLUMNS
+        if self.config.local_rates:
+            columns = records.COUNTER_COLUMNS
+        listing = self.get_listing(stat_type, vhost_name, columns[stat_type])
+        if listing is None:
+            return stats
+        listed_names, listed_records = listing
+        entries = self.update_inventory(stat_type, vhost_name, listed_names)
+        for listed_name, record in zip(listed_names, listed_records):
+            name = entries[listed_name]
+            if name is None:
+                self.instrumentation.ignored += 1
+            elif name is False:
+                self.instrumentation.other_shards += 1
             else:
-                names = [stat_name]
-            for name in names:
-                if not self.config.is_ignored(stat_type, name):
-                    stats[name] = self.get_info("{0}s".format(stat_type),
-                                                vhost,
-                                                name)
+                stats[name] = record
         return stats
+
+
+class ReplayRabbitMQStats(RabbitMQStats):
+    """
+    Serves responses captured by capture.Recorder instead of querying the
+    API, waiting for the recorded latency unless realtime is False.
+    """
+    def __init__(self, config):
+        RabbitMQStats.__init__(self, config)
+        self.replayer = capture.Replayer(self.config.replay,
+                                         self.config.replay_realtime)
+
+    def fetch(self, path):
+        """
+        Returns the next captured response body for path.
+        """
+        return self.replayer.fetch(path)
@@ -0,0 +1,85 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that computes message rates from the counters of consecutive cycles,
+instead of relying on the rates the broker computes from its samples.
+"""
+
+from collectd_rabbitmq.records import MISSING, NO_RATES
+
+
+class RateStore(object):
+    """
+    Keeps the last message counters of every series, as the cycle, time and
+    counts tuple of its last records.StatsRecord, and returns rates aligned
+    with records.MESSAGE_STATS.
+
+    A counter that went down was reset, for instance because its queue was
+    deleted and declared again, and gets no rate until the next cycle.
+    Series that were not seen for max_age whole cycles are removed.
+    """
+
+    def __init__(self, max_age=1):
+        self.series = dict()
+        self.cycle = 0
+        self.max_age = max_age
+
+    def __len__(self):
+        return len(self.series)
+
+    def rates(self, key, counts, now):
+        """
+        Stores counts of series key at time now and returns the rates since
+        the previous counts, or NO_RATES if there are none.
+        """
+        previous = self.series.get(key)
+        self.series[key] = (self.cycle, now, counts)
+        if previous is None or counts is None or previous[2] is None:
+            return NO_RATES
+
+        _, then, previous_counts = previous
+        elapsed = now - then
+        if elapsed <= 0:
+            return NO_RATES
+
+        rates = list()
+        for count, previous_count in zip(counts, previous_counts):
+            if (count is MISSING or previous_count is MISSING or
+                    count < previous_count):
+                rates.append(MISSING)
+            else:
+                rates.append((count - previous_count) / elapsed)
+        return tuple(rates)
+
+    def evict(self, keys):
+        """
+        Removes the series of keys, which are gone.
+        """
+        for key in keys:
+            self.series.pop(key, None)
+
+    def end_cycle(self):
+        """
+        Removes the series that were not seen in the last max_age cycles,
+        and returns how many were removed.
+        """
+        stale = [key for key, (cycle, _, _) in self.series.iteritems()
+                 if cycle <= self.cycle - self.max_age]
+        for key in stale:
+            del self.series[key]
+        self.cycle += 1
+        return len(stale)
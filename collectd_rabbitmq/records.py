@@ -0,0 +1,154 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that holds compact records of the queue and exchange stats that are
+dispatched, instead of the full API objects.
+"""
+
+MESSAGE_STATS = ['ack', 'publish', 'publish_in', 'publish_out', 'confirm',
+                 'deliver', 'deliver_noack', 'get', 'get_noack',
+                 'deliver_get', 'redeliver', 'return']
+QUEUE_STATS = ['consumers', 'consumer_utilisation', 'messages',
+               'messages_ready', 'messages_unacknowledged']
+VHOST_STATS = ['messages', 'messages_ready', 'messages_unacknowledged']
+# Queue stats that are ratios, which are averaged across queues instead of
+# summed.
+RATIO_STATS = ['consumer_utilisation']
+# Fields requested from listings, so that the API only sends what is kept.
+COLUMNS = dict(queue=['name', 'message_stats'] + QUEUE_STATS,
+               exchange=['name', 'message_stats'],
+               vhost=['name', 'message_stats'] + VHOST_STATS)
+# Fields requested when rates are computed locally, without the rates.
+COUNTERS = ['message_stats.%s' % name for name in MESSAGE_STATS]
+COUNTER_COLUMNS = dict(queue=['name'] + COUNTERS + QUEUE_STATS,
+                       exchange=['name'] + COUNTERS,
+                       vhost=['name'] + COUNTERS + VHOST_STATS)
+
+
+class Missing(object):
+    """
+    Type of MISSING, which marks a stat that the API did not return, since
+    None is a valid value of some stats.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __nonzero__(self):
+        return False
+
+    def __reduce__(self):
+        # Unpickles as the MISSING of the receiving process.
+        return 'MISSING'
+
+
+MISSING = Missing()
+
+NO_RATES = (MISSING,) * len(MESSAGE_STATS)
+
+
+def intern_name(name):
+    """
+    Returns the interned name, so that the names of objects seen in every
+    cycle are only stored once.
+    """
+    try:
+        return intern(str(name))
+    except (TypeError, UnicodeError):
+        return name
+
+
+def project(values, names):
+    """
+    Returns a tuple of the values of names, in order, with MISSING for the
+    absent ones, or None if all of them are absent.
+    """
+    projected = tuple(values.get(name, MISSING) for name in names)
+    for value in projected:
+        if value is not MISSING:
+            return projected
+    return None
+
+
+class StatsRecord(object):
+    """
+    The dispatched stats of a queue or exchange. Message counters and rates
+    are aligned with MESSAGE_STATS and queue stats with QUEUE_STATS. Each of
+    them is None when the object has none of its stats.
+    """
+    __slots__ = ('message_counts', 'message_rates', 'queue_stats')
+
+    def __init__(self, message_counts=None, message_rates=None,
+                 queue_stats=None):
+        self.message_counts = message_counts
+        self.message_rates = message_rates
+        self.queue_stats = queue_stats
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Returns a record of the stats in an API object, or None for no
+        object.
+        """
+        if data is None:
+            return None
+
+        message_counts = message_rates = None
+        message_stats = data.get('message_stats')
+        if message_stats:
+            message_counts = project(message_stats, MESSAGE_STATS)
+            rates = dict()
+            for name in MESSAGE_STATS:
+                details = message_stats.get("%s_details" % name)
+                if details and 'rate' in details:
+                    rates[name] = details['rate']
+            message_rates = project(rates, MESSAGE_STATS)
+        return cls(message_counts, message_rates,
+                   project(data, QUEUE_STATS))
+
+    def message_stats(self):
+        """
+        Yields name, count and rate of every message stat present. The rate
+        is MISSING when the API did not return it.
+        """
+        if self.message_counts is None:
+            return
+        rates = self.message_rates or NO_RATES
+        for name, count, rate in zip(MESSAGE_STATS, self.message_counts,
+                                     rates):
+            if count is not MISSING:
+                yield name, count, rate
+
+    def queue_values(self):
+        """
+        Yields name and value of every queue stat present.
+        """
+        if self.queue_stats is None:
+            return
+        for name, value in zip(QUEUE_STATS, self.queue_stats):
+            if value is not MISSING:
+                yield name, value
+
+
+def as_record(data):
+    """
+    Returns data as a StatsRecord, projecting API objects.
+    """
+    if data is None or isinstance(data, StatsRecord):
+        return data
+    return StatsRecord.from_dict(data)
@@ -0,0 +1,102 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that spreads the requests for each queue and exchange over several
+cycles, when a cluster has too many of them to request all in one.
+"""
+
+import bisect
+import math
+import re
+import time
+
+
+class Scan(object):
+    """
+    Selects the objects to request in a cycle: all objects matching a
+    priority regex, and the next slice of the others, in name order from a
+    cursor kept per stat type and vhost. With slices slices, every object is
+    requested every slices cycles.
+
+    Once deadline seconds have passed since the start of the cycle, no more
+    objects are selected besides the priority ones, and the next cycle
+    resumes from the cursor.
+    """
+
+    def __init__(self, slices=1, priority=None, deadline=None):
+        self.slices = slices
+        self.priority = [re.compile(regex) for regex in priority or list()]
+        self.deadline = deadline
+        self.cursors = dict()
+        self.started = None
+
+    def start_cycle(self):
+        """
+        Starts the deadline of a cycle.
+        """
+        self.started = time.time()
+
+    def is_priority(self, name):
+        """
+        Returns true if name is requested every cycle.
+        """
+        for regex in self.priority:
+            if regex.match(name):
+                return True
+        return False
+
+    def is_past_deadline(self):
+        """
+        Returns true if the deadline of the cycle has passed.
+        """
+        return (self.deadline is not None and self.started is not None and
+                time.time() - self.started > self.deadline)
+
+    def select(self, stat_type, vhost_name, names):
+        """
+        Yields the names of the objects of stat_type in vhost_name to
+        request in this cycle, moving the cursor past each rotating name as
+        it is yielded.
+        """
+        rotating = list()
+        for name in names:
+            if self.is_priority(name):
+                yield name
+            else:
+                rotating.append(name)
+        if not rotating:
+            return
+
+        rotating.sort()
+        key = (stat_type, vhost_name)
+        start = bisect.bisect_right(rotating, self.cursors.get(key, ''))
+        size = int(math.ceil(len(rotating) / float(self.slices)))
+        for offset in xrange(size):
+            if self.is_past_deadline():
+                return
+            name = rotating[(start + offset) % len(rotating)]
+            self.cursors[key] = name
+            yield name
+
+    def retain_vhosts(self, vhost_names):
+        """
+        Forgets the cursors of the vhosts that are not in vhost_names.
+        """
+        vhost_names = set(vhost_names)
+        for key in [key for key in self.cursors
+                    if key[1] not in vhost_names]:
+            del self.cursors[key]
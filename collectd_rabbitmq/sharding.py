@@ -0,0 +1,53 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that splits the queues and exchanges of a cluster between several
+plugin instances, so that each collects a shard of them.
+
+The shard of an object comes from a jump consistent hash of the MD5 digest
+of its vhost and name, which is the same on every host and Python version.
+Changing the number of shards only moves the objects of the shards that are
+added or removed.
+"""
+
+import hashlib
+import struct
+
+MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key, buckets):
+    """
+    Returns the bucket of a 64 bit key among buckets, see "A Fast, Minimal
+    Memory, Consistent Hash Algorithm" by Lamping and Veach.
+    """
+    bucket = -1
+    jump = 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & MASK
+        jump = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(vhost_name, name, count):
+    """
+    Returns the shard, among count, of the object name of vhost_name. Both
+    names are URL encoded, so that they cannot run into each other.
+    """
+    digest = hashlib.md5("{0}/{1}".format(vhost_name, name)).digest()
+    return jump_hash(struct.unpack('<Q', digest[:8])[0], count)
@@ -0,0 +1,141 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that summarizes the distribution of queue stats across the queues
+of a vhost, with a constant number of values whatever the number of queues.
+"""
+
+import math
+
+from collectd_rabbitmq.records import MESSAGE_STATS, MISSING, QUEUE_STATS
+
+# Field, source, index into the source of a records.StatsRecord, and the
+# value used when the stat is missing, None to leave the queue out.
+FIELDS = (('messages', 'queue_stats', QUEUE_STATS.index('messages'), None),
+          ('messages_unacknowledged', 'queue_stats',
+           QUEUE_STATS.index('messages_unacknowledged'), None),
+          ('consumers', 'queue_stats', QUEUE_STATS.index('consumers'), None),
+          ('publish_rate', 'message_rates', MESSAGE_STATS.index('publish'),
+           0.0))
+
+QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+
+class Sketch(object):
+    """
+    A mergeable sketch of a distribution of non negative values. Values are
+    counted in logarithmic buckets, so that quantiles are within accuracy of
+    the true value, relative to it. Zero and negative values share a bucket
+    and are reported as zero. Count, min, max and mean are exact.
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = dict()
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """
+        Adds a value.
+        """
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = int(math.ceil(math.log(value) / self.log_gamma))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        """
+        Adds the values of another sketch of the same accuracy.
+        """
+        if other.accuracy != self.accuracy:
+            raise ValueError("Unable to merge sketches of accuracy %s and %s"
+                             % (self.accuracy, other.accuracy))
+        for index, count in other.buckets.iteritems():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is None:
+                continue
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def quantile(self, fraction):
+        """
+        Returns the value below which fraction of the values fall, or None
+        without values.
+        """
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        if rank < self.zeros:
+            return max(self.min, 0.0)
+        seen = self.zeros
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Returns a list of statistic name and value pairs.
+        """
+        if not self.count:
+            return [('count', 0)]
+        summary = [('count', self.count), ('min', self.min),
+                   ('max', self.max), ('mean', self.total / self.count)]
+        for name, fraction in QUANTILES:
+            summary.append((name, self.quantile(fraction)))
+        return summary
+
+
+def summarize(stats, accuracy=0.01):
+    """
+    Takes a dictionary of queue name to records.StatsRecord and returns a
+    dictionary of field to Sketch of its values.
+    """
+    sketches = dict((field, Sketch(accuracy)) for field, _, _, _ in FIELDS)
+    for record in stats.itervalues():
+        if record is None:
+            continue
+        for field, source, index, default in FIELDS:
+            values = getattr(record, source)
+            value = values[index] if values is not None else MISSING
+            if value is MISSING or value is None:
+                if default is None:
+                    continue
+                value = default
+            sketches[field].add(value)
+    return sketches
@@ -37,11 +37,12 @@ class ConnectionInfo(object):
     """
 
     def __init__(self, host='localhost', port=15672, scheme='http',
-                 validate_certs=True):
+                 validate_certs=True, timeout=30):
         self.host = host
         self.port = port
         self.scheme = scheme
         self.validate_certs = validate_certs
+        self.timeout = timeout
 
     @property
     def url(self):
@@ -61,17 +62,86 @@ class ConnectionInfo(object):
         self.scheme = parsed_url.scheme
 
 
+class ProfileInfo(object):
+    """
+    Stores profiling options.
+    """
+
+    def __init__(self, directory, every=0, mode='cprofile', keep=10,
+                 trigger=None):
+        self.directory = directory
+        self.every = every
+        self.mode = mode
+        self.keep = keep
+        self.trigger = trigger
+
+
+class WatchInfo(object):
+    """
+    Stores a watch: vhost and queue name pairs polled every interval
+    seconds.
+    """
+
+    def __init__(self, name, interval=1.0, queues=None):
+        self.name = name
+        self.interval = interval
+        self.queues = queues or list()
+
+
 class Config(object):
     """
     Class that contains configuration data.
     """
 
     def __init__(self, auth, connection, data_to_ignore=None,
-                 vhost_prefix=None):
+                 vhost_prefix=None, interval=None, self_metrics=False,
+                 derived_metrics=False, local_rates=False,
+                 vhost_totals=False, totals_only=None, groups=None,
+                 queue_series=True, queue_summaries=False,
+                 max_series=None, series_overflow='other',
+                 deleted_series='none', shard_index=0, shard_count=1,
+                 designated_poller=False, node_name=None, scan_slices=1,
+                 scan_priority=None, scan_deadline=None, idle_backoff=1,
+                 watches=None, pipeline=False, pipeline_size=64,
+                 worker=False, worker_python=None,
+                 profile=None, capture=None, capture_cycles=1, replay=None,
+                 replay_realtime=True, collect='detail'):
         self.auth = auth
         self.connection = connection
         self.data_to_ignore = dict()
         self.vhost_prefix = vhost_prefix
+        self.interval = interval
+        self.self_metrics = self_metrics
+        self.derived_metrics = derived_metrics
+        self.local_rates = local_rates
+        self.vhost_totals = vhost_totals
+        self.totals_only = [re.compile(regex) for regex in
+                            totals_only or list()]
+        self.groups = groups or dict()
+        self.queue_series = queue_series
+        self.queue_summaries = queue_summaries
+        self.max_series = max_series
+        self.series_overflow = series_overflow
+        self.deleted_series = deleted_series
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.designated_poller = designated_poller
+        self.node_name = node_name
+        self.scan_slices = scan_slices
+        self.scan_priority = scan_priority or list()
+        self.scan_deadline = scan_deadline
+        self.idle_backoff = idle_backoff
+        self.watches = watches or list()
+        self.pipeline = pipeline
+        self.pipeline_size = pipeline_size
+        self.worker = worker
+        self.worker_python = worker_python
+        self.profile = profile
+        self.capture = capture
+        self.capture_cycles = capture_cycles
+        self.replay = replay
+        self.replay_realtime = replay_realtime
+        self.collect = collect
 
         if data_to_ignore:
             for key, values in data_to_ignore.items():
@@ -90,6 +160,15 @@ class Config(object):
                     return True
         return False
 
+    def is_totals_only(self, vhost_name):
+        """
+        Return true if only the totals of vhost_name should be collected.
+        """
+        for regex in self.totals_only:
+            if regex.match(vhost_name):
+                return True
+        return False
+
 
 def filter_dictionary(dictionary, keys):
     """
@@ -0,0 +1,83 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that polls a few watched queues at their own, shorter interval,
+between the collection cycles of the plugin.
+"""
+
+import urllib
+
+from collectd_rabbitmq import dispatching
+from collectd_rabbitmq import rabbit
+from collectd_rabbitmq import rates
+from collectd_rabbitmq import records
+
+
+def quote_queues(queues):
+    """
+    Returns the URL encoded vhost and name of each vhost and queue pair.
+    """
+    return [(urllib.quote(vhost, ''), urllib.quote(name, ''))
+            for vhost, name in queues]
+
+
+class Watcher(object):
+    """
+    Requests the queues of a watch, with only the dispatched fields, and
+    dispatches them like the plugin does. read is registered as a read
+    callback of its own, with the interval of the watch, so it runs in
+    another thread than the collection cycles.
+
+    A watcher has its own RabbitMQStats, and dispatches through a
+    dispatching.Dispatcher of its own, with its own host names, local rates
+    and instrumentation, so that it shares no state with the collection
+    cycles and does not count in their self metrics.
+    """
+
+    def __init__(self, plugin, watch):
+        self.plugin = plugin
+        self.watch = watch
+        self.rabbit = rabbit.RabbitMQStats(plugin.config)
+        self.queues = quote_queues(watch.queues)
+        self.columns = records.COLUMNS['queue']
+        store = None
+        if plugin.config.local_rates:
+            self.columns = records.COUNTER_COLUMNS['queue']
+            store = rates.RateStore()
+        self.dispatcher = dispatching.Dispatcher(
+            plugin.config, self.rabbit.instrumentation, store)
+
+    def read(self):
+        """
+        Dispatches the stats of the watched queues.
+        """
+        # With a designated poller, only the node elected in the last cycle
+        # dispatches queues, none before the first election.
+        if (self.plugin.config.designated_poller and
+                self.plugin.poller is not True):
+            return
+        self.rabbit.instrumentation.reset()
+        for vhost_name, name in self.queues:
+            record = records.as_record(self.rabbit.get_info(
+                'queues', vhost_name, name, columns=self.columns,
+                project=True))
+            if record is None:
+                continue
+            self.dispatcher.dispatch_message_stats(record, vhost_name,
+                                                   'queues', name)
+            self.dispatcher.dispatch_queue_stats(record, vhost_name,
+                                                 'queues', name)
@@ -0,0 +1,155 @@
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module that moves the requests to the API, and the parsing of their
+responses, to a child process, so that they do not hold the interpreter
+that collectd shares between its Python plugins. See child for the other
+end.
+"""
+
+import collectd
+import cPickle
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from collectd_rabbitmq import rabbit
+from collectd_rabbitmq.child import LEVELS, send
+
+# Seconds to wait before starting a worker again after it failed, doubled
+# after every consecutive failure up to MAX_RESTART_DELAY.
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 300.0
+
+
+def get_python():
+    """
+    Returns the interpreter to run the worker with. The executable of an
+    embedded interpreter is collectd itself, so it is only used if it is a
+    Python.
+    """
+    if os.path.basename(sys.executable or '').startswith('python'):
+        return sys.executable
+    return 'python'
+
+
+class Worker(object):
+    """
+    Supervises the worker process: starts it on the first request, and
+    again on the next request after it died, waiting longer after each
+    consecutive failure so that a worker that keeps failing is not started
+    for every request.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.python = config.worker_python or get_python()
+        self.process = None
+        self.starts = 0
+        self.failures = 0
+        self.restart_at = 0.0
+        # The pipeline producer and the plugin can share a worker.
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the worker process and sends it the config.
+        """
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+        self.process = subprocess.Popen(
+            [self.python, '-m', 'collectd_rabbitmq.child'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+            close_fds=True)
+        self.starts += 1
+        send(self.process.stdin, self.config)
+
+    def stop(self):
+        """
+        Stops the worker process.
+        """
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+        except (IOError, OSError):
+            pass
+        self.process = None
+
+    def fail(self):
+        """
+        Stops the worker after a failure and delays its next start.
+        """
+        self.stop()
+        self.failures += 1
+        self.restart_at = time.time() + min(
+            RESTART_DELAY * 2 ** (self.failures - 1), MAX_RESTART_DELAY)
+
+    def call(self, request):
+        """
+        Sends request to the worker and returns its result, logging its
+        messages, or returns None if the worker failed or is waiting to be
+        started again.
+        """
+        with self.lock:
+            try:
+                if self.process is None or self.process.poll() is not None:
+                    if time.time() < self.restart_at:
+                        return None
+                    if self.starts:
+                        collectd.warning("Restarting the RabbitMQ worker")
+                    self.stop()
+                    self.start()
+                send(self.process.stdin, request)
+                while True:
+                    frame = cPickle.load(self.process.stdout)
+                    if frame[0] != 'log':
+                        self.failures = 0
+                        return frame[1]
+                    if frame[1] in LEVELS:
+                        getattr(collectd, frame[1])(frame[2])
+            except (EOFError, IOError, OSError,
+                    cPickle.UnpicklingError) as err:
+                collectd.error("RabbitMQ worker failed: %s" % err)
+                self.fail()
+                return None
+
+
+class WorkerRabbitMQStats(rabbit.RabbitMQStats):
+    """
+    Requests and parses the API in a worker process. Queues and exchanges,
+    single or listed, are projected there, see rabbit.project_info, so
+    only their names and records.StatsRecord come back.
+    """
+
+    def __init__(self, config):
+        rabbit.RabbitMQStats.__init__(self, config)
+        self.worker = Worker(config)
+
+    def fetch_info(self, args, columns=None, keep_body=False, project=False):
+        """
+        Returns what fetch_info returns in the worker process.
+        """
+        result = self.worker.call((args, columns, keep_body, project))
+        if result is None:
+            return None, 0.0, 0, 0.0, None
+        return result
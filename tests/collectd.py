@@ -91,6 +91,37 @@ class Values(object):
         pass
 
 
+NOTIF_FAILURE = 1
+NOTIF_WARNING = 2
+NOTIF_OKAY = 4
+
+
+class Notification(object):
+    """
+    Fake notification object build for testing.
+    """
+
+    def __init__(self, host='', plugin='', plugin_instance='', type='',
+                 type_instance='', severity=0, message='', time=0):
+        # pylint: disable=W0622
+        self.host = host
+        self.plugin = plugin
+        self.plugin_instance = plugin_instance
+        self.type = type
+        self.type_instance = type_instance
+        self.severity = severity
+        self.message = message
+        self.time = time
+
+    def dispatch(self, type=None, values=None, plugin_instance=None,
+                 type_instance=None, plugin=None, host=None, time=None,
+                 severity=None, message=None):
+        """
+        Fake dispatch method, does nothing.
+        """
+        pass
+
+
 def register_write(func, data):
     """
     Fake write function.
@@ -112,7 +143,7 @@ def register_init(func):
     pass
 
 
-def register_read(func):
+def register_read(func, interval=None, data=None, name=None):
     """
     Fake read function.
     """
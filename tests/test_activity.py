@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the backoff of idle queues """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import activity  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import utils  # noqa
+
+IDLE = dict(messages=0, message_stats=dict(publish=5,
+                                           publish_details=dict(rate=0.0)))
+BUSY = dict(messages=0, message_stats=dict(publish=5,
+                                           publish_details=dict(rate=2.0)))
+
+
+class TestBackoff(unittest.TestCase):
+    """
+    Test class for the backoff of idle queues.
+    """
+
+    def poll(self, backoff, stats, cycles, listed=None):
+        """
+        Returns, for each of cycles cycles, the names selected by backoff
+        and observed with stats.
+        """
+        selected = list()
+        for _ in range(cycles):
+            names = backoff.select('vhost', sorted(stats), listed)
+            backoff.observe('vhost', dict((name, stats[name])
+                                          for name in names))
+            backoff.end_cycle()
+            selected.append(names)
+        return selected
+
+    def test_is_idle(self):
+        """
+        Asserts that queues with messages or rates are not idle.
+        """
+        self.assertTrue(activity.is_idle(activity.as_record(IDLE)))
+        self.assertTrue(activity.is_idle(activity.as_record(dict())))
+        self.assertFalse(activity.is_idle(activity.as_record(BUSY)))
+        self.assertFalse(activity.is_idle(activity.as_record(
+            dict(messages=3))))
+
+    def test_backoff(self):
+        """
+        Asserts that idle queues are requested exponentially less often, up
+        to the maximum interval, and busy queues every cycle.
+        """
+        backoff = activity.Backoff(4)
+        selected = self.poll(backoff, dict(idle=IDLE, busy=BUSY), 12)
+        idle = [index for index, names in enumerate(selected)
+                if 'idle' in names]
+        self.assertEqual(idle, [0, 1, 3, 7, 11])
+        self.assertTrue(all('busy' in names for names in selected))
+
+    def test_promotion(self):
+        """
+        Asserts that a queue whose listed depth changed is requested at
+        once and back to every cycle.
+        """
+        backoff = activity.Backoff(8)
+        stats = dict(queue=IDLE)
+        self.poll(backoff, stats, 4)
+        self.assertEqual(backoff.queues[('vhost', 'queue')][0], 4)
+        listed = dict(queue=activity.as_record(dict(messages=0)))
+        self.assertEqual(self.poll(backoff, stats, 1, listed), [[]])
+
+        stats = dict(queue=dict(messages=2))
+        listed = dict(queue=activity.as_record(dict(messages=2)))
+        self.assertEqual(self.poll(backoff, stats, 2, listed),
+                         [['queue'], ['queue']])
+        self.assertEqual(backoff.queues[('vhost', 'queue')][0], 1)
+
+    def test_evict(self):
+        """
+        Asserts that deleted queues are forgotten.
+        """
+        backoff = activity.Backoff(4)
+        self.poll(backoff, dict(a=IDLE, b=IDLE), 1)
+        backoff.evict([('vhost', 'a')])
+        self.assertEqual(len(backoff), 1)
+
+
+class TestPluginBackoff(unittest.TestCase):
+    """
+    Test the backoff of idle queues in the plugin.
+    """
+
+    def test_config(self):
+        """
+        Asserts that IdleBackoff is read and checked.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('IdleBackoff', ('16',))])
+        collectd_plugin.configure(config)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].idle_backoff, 16)
+
+        config.children[-1] = collectd.Config('IdleBackoff', ('0',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    def test_get_queue_stats(self):
+        """
+        Asserts that idle queues are skipped once observed, and that the
+        queues are listed with their depth.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              idle_backoff=4)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        stats = plugin.rabbit
+        stats.get_queues = MagicMock(return_value=[
+            dict(name='idle', messages=0), dict(name='busy', messages=0)])
+        stats.get_info = MagicMock(
+            side_effect=lambda *args, **kwargs: (
+                IDLE if args[-1] == 'idle' else BUSY))
+        plugin.dispatch_values = MagicMock()
+
+        for _ in range(2):
+            plugin.dispatch_queues('vhost')
+            plugin.backoff.end_cycle()
+        stats.get_queues.assert_called_with(
+            'vhost', columns=['name', 'messages'], project=True)
+        self.assertEqual(stats.instrumentation.skipped, 0)
+        plugin.dispatch_queues('vhost')
+        self.assertEqual(stats.instrumentation.skipped, 1)
+
+    def test_rates_kept(self):
+        """
+        Asserts that local rates outlive the cycles between two requests of
+        an idle queue.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              local_rates=True, idle_backoff=4)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        self.assertEqual(plugin.rates.max_age, 8)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for capture and replay """
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from mock import patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+from collectd_rabbitmq import capture  # noqa
+from collectd_rabbitmq.rabbit import RabbitMQStats, ReplayRabbitMQStats  # noqa
+from collectd_rabbitmq.utils import Auth, Config, ConnectionInfo  # noqa
+from tests.utils import MockURLResponse  # noqa
+
+
+class TestCapture(unittest.TestCase):
+    """
+    Test class for Recorder and Replayer.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_archive(self):
+        """
+        Returns the responses written to the archive.
+        """
+        archive = gzip.open(self.path, 'rb')
+        try:
+            return [json.loads(line) for line in archive]
+        finally:
+            archive.close()
+
+    def test_record(self):
+        """
+        Asserts that only the configured cycles are recorded, with
+        credential fields masked.
+        """
+        recorder = capture.Recorder(self.path, cycles=1)
+        recorder.record('nodes', 0.5, '[{"password": "s3cret"}]')
+        recorder.record('overview', 0.1, None)
+        recorder.end_cycle()
+        recorder.record('nodes', 0.5, '[]')
+        recorder.end_cycle()
+
+        responses = self.read_archive()
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(responses[0]['path'], 'nodes')
+        self.assertEqual(responses[0]['latency'], 0.5)
+        self.assertNotIn('s3cret', responses[0]['body'])
+        self.assertIsNone(responses[1]['body'])
+
+    def test_scrub(self):
+        """
+        Asserts that only credential fields are masked, and that other
+        bodies are kept as they were.
+        """
+        recorder = capture.Recorder(self.path)
+        body = '[{"name": "guest-orders", "user": "guest"}]'
+        self.assertEqual(recorder.scrub(body), body)
+        scrubbed = json.loads(recorder.scrub(
+            '{"users": [{"name": "guest", "password_hash": "abc"}]}'))
+        self.assertEqual(scrubbed['users'], [dict(name='guest',
+                                                  password_hash=capture.MASK)])
+
+    def test_replay(self):
+        """
+        Asserts that each path cycles through its recorded responses.
+        """
+        recorder = capture.Recorder(self.path, cycles=2)
+        recorder.record('nodes', 0.5, '[1]')
+        recorder.end_cycle()
+        recorder.record('nodes', 0.5, '[2]')
+        recorder.end_cycle()
+
+        replayer = capture.Replayer(self.path, realtime=False)
+        self.assertEqual(replayer.fetch('nodes'), '[1]')
+        self.assertEqual(replayer.fetch('nodes'), '[2]')
+        self.assertEqual(replayer.fetch('nodes'), '[1]')
+        self.assertIsNone(replayer.fetch('overview'))
+        self.assertEqual(replayer.served, 3)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_capture_and_replay_stats(self, mock_urlopen):
+        """
+        Asserts that get_info returns the same data when replaying a capture.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        test_value = [dict(name='rabbit@host1')]
+        mock_urlopen.return_value = MockURLResponse(json.dumps(test_value))
+        conf = Config(Auth(), ConnectionInfo(), capture=self.path,
+                      replay=self.path, replay_realtime=False)
+
+        stats = RabbitMQStats(conf)
+        stats.recorder = capture.Recorder(self.path)
+        self.assertEqual(stats.get_info('nodes'), test_value)
+        stats.end_cycle()
+
+        mock_urlopen.reset_mock()
+        replay = ReplayRabbitMQStats(conf)
+        self.assertEqual(replay.get_info('nodes'), test_value)
+        self.assertFalse(mock_urlopen.called)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
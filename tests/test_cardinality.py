@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the series limit """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import cardinality  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.records import StatsRecord  # noqa
+from tests.utils import create_queue_record  # noqa
+
+
+class TestSeriesLimit(unittest.TestCase):
+    """
+    Test class for the series limit.
+    """
+
+    def test_admit(self):
+        """
+        Asserts that new series over the limit overflow.
+        """
+        limit = cardinality.SeriesLimit(2)
+        self.assertEqual(limit.admit(['a', 'b']), set())
+        self.assertEqual(limit.admit(['c']), set(['c']))
+        self.assertEqual(len(limit), 2)
+
+    def test_known_series_first(self):
+        """
+        Asserts that known series are kept whatever the order of the keys.
+        """
+        limit = cardinality.SeriesLimit(2)
+        limit.admit(['a', 'b'])
+        limit.end_cycle()
+        limit.end_cycle()
+        self.assertEqual(limit.admit(['c', 'b', 'a']), set(['c']))
+
+    def test_replace_stale(self):
+        """
+        Asserts that a new series replaces one missing from the last cycle.
+        """
+        limit = cardinality.SeriesLimit(2)
+        limit.admit(['a', 'b'])
+        limit.end_cycle()
+        limit.admit(['b'])
+        self.assertEqual(limit.admit(['c']), set(['c']))
+        limit.end_cycle()
+        limit.admit(['b'])
+        self.assertEqual(limit.admit(['c']), set())
+        self.assertEqual(list(limit.series), ['b', 'c'])
+
+    def test_limit_other(self):
+        """
+        Asserts that series over the limit are summed into overflow+other.
+        """
+        limit = cardinality.SeriesLimit(1)
+        limit.limit('%2F', 'queues', {'a': create_queue_record(1, 1)})
+        stats, overflowed = limit.limit('%2F', 'queues', {
+            'a': create_queue_record(1, 1), 'b': create_queue_record(2, 0),
+            'c': create_queue_record(3, 1)})
+        self.assertEqual(overflowed, 2)
+        self.assertEqual(sorted(stats), ['a', 'overflow+other'])
+        self.assertEqual(dict(stats['overflow+other'].queue_values()),
+                         dict(messages=5, consumers=1))
+
+    def test_other_queue(self):
+        """
+        Asserts that a queue called other is kept apart from the overflowed
+        series.
+        """
+        limit = cardinality.SeriesLimit(1)
+        limit.limit('%2F', 'queues', {'other': create_queue_record(7, 1)})
+        stats, _ = limit.limit('%2F', 'queues', {
+            'other': create_queue_record(7, 1),
+            'b': create_queue_record(1, 0)})
+        self.assertEqual(dict(stats['other'].queue_values()),
+                         dict(messages=7, consumers=1))
+        self.assertEqual(dict(stats['overflow+other'].queue_values()),
+                         dict(messages=1, consumers=0))
+
+    def test_other_ratios(self):
+        """
+        Asserts that ratios are averaged into overflow+other.
+        """
+        limit = cardinality.SeriesLimit(1)
+        limit.limit('%2F', 'queues', {'a': create_queue_record(1, 1)})
+        stats, _ = limit.limit('%2F', 'queues', dict(
+            (name, StatsRecord.from_dict(dict(consumer_utilisation=value)))
+            for name, value in (('a', 1.0), ('b', 1.0), ('c', 0.5))))
+        self.assertEqual(dict(stats['overflow+other'].queue_values()),
+                         dict(consumer_utilisation=0.75))
+
+    def test_limit_drop(self):
+        """
+        Asserts that series over the limit can be dropped.
+        """
+        limit = cardinality.SeriesLimit(1, 'drop')
+        stats, overflowed = limit.limit('%2F', 'exchanges', {
+            'a': create_queue_record(1, 1)})
+        self.assertEqual(overflowed, 0)
+        stats, overflowed = limit.limit('other_vhost', 'exchanges', {
+            'a': create_queue_record(1, 1)})
+        self.assertEqual((stats, overflowed), (dict(), 1))
+
+
+class TestPluginSeriesLimit(unittest.TestCase):
+    """
+    Test the series limit in the plugin.
+    """
+
+    def test_config(self):
+        """
+        Asserts that MaxSeries and SeriesOverflow are read.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('MaxSeries', ('1000',)),
+            collectd.Config('SeriesOverflow', ('Drop',))])
+        collectd_plugin.configure(config)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].max_series, 1000)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].series_overflow, 'drop')
+
+        config.children[-1] = collectd.Config('SeriesOverflow', ('keep',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    def test_dispatch_queues(self):
+        """
+        Asserts that queues over the limit are dispatched as overflow+other.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              max_series=1)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.get_queue_stats = MagicMock(return_value={
+            'orders': create_queue_record(3, 2)})
+        plugin.dispatch_values = MagicMock()
+        plugin.instrumentation.reset()
+        plugin.dispatch_queues('%2F')
+
+        plugin.rabbit.get_queue_stats.return_value = {
+            'orders': create_queue_record(3, 2),
+            'amq.gen-1': create_queue_record(1, 0),
+            'amq.gen-2': create_queue_record(1, 0)}
+        plugin.dispatch_values.reset_mock()
+        plugin.dispatch_queues('%2F')
+
+        instances = set(call[0][3] for call in
+                        plugin.dispatch_values.call_args_list)
+        self.assertEqual(instances, set(['orders', 'overflow+other']))
+        plugin.dispatch_values.assert_any_call(
+            2, 'rabbitmq_default', 'queues', 'overflow+other', 'messages')
+        self.assertEqual(plugin.instrumentation.overflowed, 2)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
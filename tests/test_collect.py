@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Test module for the collection strategies """
+
+import json
+import logging
+import os
+import sys
+import unittest
+import urllib2
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import rabbit  # noqa
+from collectd_rabbitmq import utils  # noqa
+from tests.utils import get_request_url, MockURLResponse  # noqa
+
+
+class TestListCollect(unittest.TestCase):
+    """
+    Test class for reads with the list collection strategy.
+    """
+
+    def setUp(self):
+        self.config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                                   collect='list')
+        self.plugin = collectd_plugin.CollectdPlugin(self.config)
+        self.plugin.dispatch_values = MagicMock()
+        self.plugin.dispatch_notification = MagicMock()
+        self.urls = list()
+        self.queues = [dict(name='q1', messages=5, consumers=1),
+                       dict(name='q2', messages=0, consumers=0)]
+        self.exchanges = [dict(name='e1',
+                               message_stats=dict(publish_in=3))]
+
+    def urlopen(self, request, *args, **kwargs):
+        """
+        Serves a single vhost with the listings of the test, and records
+        the requested URLs.
+        """
+        url = get_request_url(request)
+        self.urls.append(url)
+        if '/api/overview' in url:
+            return MockURLResponse(json.dumps(dict()))
+        if '/api/vhosts' in url:
+            return MockURLResponse(json.dumps([dict(name='/')]))
+        if '/api/queues/%2F?' in url and self.queues is not None:
+            return MockURLResponse(json.dumps(self.queues))
+        if '/api/queues/%2F?' in url:
+            raise urllib2.HTTPError(url, 503, "Unavailable", None, None)
+        if '/api/exchanges/%2F?' in url:
+            return MockURLResponse(json.dumps(self.exchanges))
+        return MockURLResponse(json.dumps(list()))
+
+    def dispatched(self, plugin):
+        """
+        Returns the (instance, type, value) dispatched for plugin.
+        """
+        return set((call[0][3], call[0][4], call[0][0]) for call in
+                   self.plugin.dispatch_values.call_args_list
+                   if call[0][2] == plugin)
+
+    def test_strategies(self):
+        """
+        Asserts that detail stays the default strategy.
+        """
+        self.assertEqual(rabbit.COLLECT_STRATEGIES, ('detail', 'list'))
+        self.assertEqual(utils.Config(utils.Auth(),
+                                      utils.ConnectionInfo()).collect,
+                         'detail')
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_read(self, mock_urlopen):
+        """
+        Asserts that a read dispatches queues and exchanges from a single
+        listing each, without requesting any object on its own.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        mock_urlopen.side_effect = self.urlopen
+        self.plugin.read()
+        self.assertEqual(len([url for url in self.urls
+                              if '/api/queues/' in url]), 1)
+        self.assertEqual(len([url for url in self.urls
+                              if '/api/exchanges/' in url]), 1)
+        self.assertFalse([url for url in self.urls
+                          if '/api/queues/%2F/' in url or
+                          '/api/exchanges/%2F/' in url])
+        queues = self.dispatched('queues')
+        self.assertIn(('q1', 'messages', 5), queues)
+        self.assertIn(('q2', 'consumers', 0), queues)
+        self.assertIn(('e1', 'publish_in', 3), self.dispatched('exchanges'))
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_failed_listing(self, mock_urlopen):
+        """
+        Asserts that a failed listing dispatches no queue and keeps the
+        queues of the inventory.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        self.plugin.rabbit.inventory.update('queue', '%2F', ['q1'])
+        self.queues = None
+        mock_urlopen.side_effect = self.urlopen
+        self.plugin.read()
+        self.assertFalse(self.dispatched('queues'))
+        self.assertEqual(
+            self.plugin.rabbit.inventory.objects[('queue', '%2F')],
+            dict(q1='q1'))
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_deleted(self, mock_urlopen):
+        """
+        Asserts that a queue missing from a successful listing is expired.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        mock_urlopen.side_effect = self.urlopen
+        self.plugin.read()
+        self.queues = self.queues[:1]
+        self.plugin.evict_series = MagicMock()
+        self.plugin.read()
+        self.plugin.evict_series.assert_called_once_with('queue', '%2F',
+                                                         ['q2'])
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
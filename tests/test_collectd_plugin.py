@@ -30,6 +30,8 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import collectd  # noqa
 
 from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import instrumentation  # noqa
+from collectd_rabbitmq import utils  # noqa
 from tests.utils import create_mock_url_repsonse  # noqa
 from tests.utils import create_mock_node_url_repsonse, get_message_stats_data  # noqa
 
@@ -39,36 +41,13 @@ class TestCollectdPluginCallbacks(unittest.TestCase):
     Test the collectd callbacks
     """
 
-    def test_read(self):
-        """
-        Asserts that read runs when plugin is loaded
-        """
-        fake_config = MagicMock()
-        collectd_plugin.INSTANCES = [fake_config]
-        fake_config.read = MagicMock()
-        collectd_plugin.read()
-        self.assertIsNotNone(collectd_plugin.CONFIGS)
-        self.assertTrue(fake_config.read.called)
-        collectd_plugin.INSTANCES = []
-
-    @patch.object(collectd_plugin.CollectdPlugin, 'read')
-    def test_read_no_plugin(self, mock_read):
-        """
-        Asserts that read does not run when plugin is not loaded
-
-        Args:
-        :param mock_read a patched method from a :mod:`CollectdPlugin`.
-        """
-        collectd_plugin.read()
-        self.assertFalse(mock_read.called)
-
     def test_init(self):
         """
         Asserts that init creates new instances of the CollectdPlugin for each
         config.
         """
 
-        fake_config = MagicMock()
+        fake_config = utils.Config(utils.Auth(), utils.ConnectionInfo())
         collectd_plugin.CONFIGS = [fake_config]
         collectd_plugin.INSTANCES = []
         collectd_plugin.init()
@@ -76,6 +55,57 @@ class TestCollectdPluginCallbacks(unittest.TestCase):
         collectd_plugin.INSTANCES = []
         collectd_plugin.CONFIGS = []
 
+    @patch('collectd.register_read')
+    def test_init_registers_read_per_instance(self, mock_register_read):
+        """
+        Asserts that init registers a uniquely named read callback for each
+        instance, using the configured interval when there is one.
+        """
+        fast_config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                                   interval=5)
+        default_config = utils.Config(utils.Auth(), utils.ConnectionInfo())
+        collectd_plugin.CONFIGS = [fast_config, default_config]
+        collectd_plugin.INSTANCES = []
+        collectd_plugin.init()
+
+        self.assertEqual(mock_register_read.call_count, 2)
+        fast_call, default_call = mock_register_read.call_args_list
+        self.assertEqual(fast_call[0][0], collectd_plugin.INSTANCES[0].read)
+        self.assertEqual(fast_call[0][1], 5)
+        self.assertEqual(default_call[0],
+                         (collectd_plugin.INSTANCES[1].read,))
+        self.assertNotEqual(fast_call[1]['name'], default_call[1]['name'])
+        collectd_plugin.INSTANCES = []
+        collectd_plugin.CONFIGS = []
+
+    def test_read_failure_isolated(self):
+        """
+        Asserts that a failing cycle is logged with the URL of its cluster
+        instead of being raised to collectd.
+        """
+        plugin = collectd_plugin.CollectdPlugin(
+            utils.Config(utils.Auth(), utils.ConnectionInfo()))
+        plugin.collect = MagicMock(side_effect=Exception('unreachable'))
+        with patch('collectd_rabbitmq.collectd_plugin.collectd.error') \
+                as error:
+            plugin.read()
+        self.assertIn(plugin.config.connection.url, error.call_args[0][0])
+
+    @patch('collectd_rabbitmq.collectd_plugin.collectd.warning')
+    def test_realm_ignored(self, warning):
+        """
+        Asserts that setting the ignored Realm logs a warning.
+        """
+        config = collectd.Config('Module', ())
+        config.children = [collectd.Config('Username', ('admin',)),
+                           collectd.Config('Password', ('admin',)),
+                           collectd.Config('Realm', ('Other',)),
+                           collectd.Config('Host', ('localhost',)),
+                           collectd.Config('Port', ('15672',))]
+        collectd_plugin.configure(config)
+        collectd_plugin.CONFIGS = []
+        self.assertIn('Realm', warning.call_args[0][0])
+
 
 class BaseTestCollectdPlugin(unittest.TestCase):
     """
@@ -135,6 +165,30 @@ class TestCollectdPluginConfig(BaseTestCollectdPlugin):
         self.assertIsNotNone(collectd_plugin.CONFIGS[0].data_to_ignore)
         self.assertEquals(len(collectd_plugin.CONFIGS[0].data_to_ignore), 2)
 
+    def test_config_timeout_and_interval(self):
+        """
+        Asserts that the timeout and interval are read from the configuration.
+        """
+        self.test_config.children.append(collectd.Config('Timeout', (5,)))
+        self.test_config.children.append(collectd.Config('Interval', (20,)))
+        collectd_plugin.configure(self.test_config)
+        config = collectd_plugin.CONFIGS[-1]
+        self.assertEqual(config.connection.timeout, 5)
+        self.assertEqual(config.interval, 20)
+
+    def test_config_collect(self):
+        """
+        Asserts that the collect strategy is read and validated.
+        """
+        self.assertEqual(collectd_plugin.CONFIGS[-1].collect, 'detail')
+        self.test_config.children.append(collectd.Config('Collect', ('List',)))
+        collectd_plugin.configure(self.test_config)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].collect, 'list')
+
+        self.test_config.children[-1] = collectd.Config('Collect', ('all',))
+        self.assertRaises(ValueError, collectd_plugin.configure,
+                          self.test_config)
+
 
 class TestCollectdPluginExchanges(BaseTestCollectdPlugin):
     """
@@ -635,6 +689,202 @@ class TestCollectdPluginRead(BaseTestCollectdPlugin):
         self.assertFalse(dispatch_exchanges.called)
 
 
+class TestCollectdPluginVHostTotals(BaseTestCollectdPlugin):
+    """
+    Test the vhost totals are dispatched properly.
+    """
+
+    def setUp(self):
+        BaseTestCollectdPlugin.setUp(self)
+        self.vhosts = [
+            dict(name='/', messages=10, messages_ready=7,
+                 messages_unacknowledged=3,
+                 message_stats=dict(publish=100,
+                                    publish_details=dict(rate=2.0))),
+            dict(name='batch-1', messages=0, messages_ready=0,
+                 messages_unacknowledged=0)]
+        self.collectd_plugin.dispatch_nodes = MagicMock()
+        self.collectd_plugin.dispatch_overview = MagicMock()
+        self.collectd_plugin.dispatch_queues = MagicMock()
+        self.collectd_plugin.dispatch_exchanges = MagicMock()
+        self.collectd_plugin.dispatch_values = MagicMock()
+
+    def test_config(self):
+        """
+        Asserts that the totals options are read from the configuration.
+        """
+        self.test_config.children.append(
+            collectd.Config('VHostTotals', (True,)))
+        self.test_config.children.append(
+            collectd.Config('VHostTotalsOnly', ('batch-.*',)))
+        self.test_config.children.append(
+            collectd.Config('VHostTotalsOnly', ('tmp-.*',)))
+        collectd_plugin.configure(self.test_config)
+        config = collectd_plugin.CONFIGS[-1]
+        self.assertTrue(config.vhost_totals)
+        self.assertTrue(config.is_totals_only('batch-1'))
+        self.assertTrue(config.is_totals_only('tmp-1'))
+        self.assertFalse(config.is_totals_only('/'))
+
+    @patch.object(collectd_plugin.rabbit.RabbitMQStats, 'get_vhosts')
+    def test_no_totals(self, mock_vhosts):
+        """
+        Asserts that only vhost names are requested without totals.
+
+        Args:
+        :param mock_vhosts: a patched method from a :mod:`RabbitMQStats`
+        """
+        mock_vhosts.return_value = self.vhosts
+        self.collectd_plugin.read()
+        mock_vhosts.assert_called_once_with(columns=['name'])
+        self.assertFalse(self.collectd_plugin.dispatch_values.called)
+        self.assertEqual(self.collectd_plugin.dispatch_queues.call_count, 2)
+
+    @patch.object(collectd_plugin.rabbit.RabbitMQStats, 'get_vhosts')
+    def test_totals(self, mock_vhosts):
+        """
+        Asserts that totals are dispatched from the vhost listing.
+
+        Args:
+        :param mock_vhosts: a patched method from a :mod:`RabbitMQStats`
+        """
+        mock_vhosts.return_value = self.vhosts
+        self.collectd_plugin.config.vhost_totals = True
+        self.collectd_plugin.read()
+
+        dispatch = self.collectd_plugin.dispatch_values
+        dispatch.assert_any_call(7, 'rabbitmq_default', 'vhost', None,
+                                 'messages_ready')
+        dispatch.assert_any_call(2.0, 'rabbitmq_default', 'vhost', None,
+                                 'publish_details', 'rate')
+        dispatch.assert_any_call(0, 'rabbitmq_batch-1', 'vhost', None,
+                                 'messages')
+        self.assertEqual(self.collectd_plugin.dispatch_queues.call_count, 2)
+
+    @patch.object(collectd_plugin.rabbit.RabbitMQStats, 'get_vhosts')
+    def test_totals_only(self, mock_vhosts):
+        """
+        Asserts that queues and exchanges of totals only vhosts are skipped.
+
+        Args:
+        :param mock_vhosts: a patched method from a :mod:`RabbitMQStats`
+        """
+        mock_vhosts.return_value = self.vhosts
+        self.collectd_plugin.config = utils.Config(
+            utils.Auth(), utils.ConnectionInfo(), totals_only=['batch-.*'])
+        self.collectd_plugin.read()
+
+        self.collectd_plugin.dispatch_queues.assert_called_once_with('%2F')
+        self.collectd_plugin.dispatch_exchanges.assert_called_once_with(
+            '%2F')
+        dispatch = self.collectd_plugin.dispatch_values
+        dispatch.assert_any_call(0, 'rabbitmq_batch-1', 'vhost', None,
+                                 'messages')
+        hosts = set(call[0][1] for call in dispatch.call_args_list)
+        self.assertEqual(hosts, set(['rabbitmq_batch-1']))
+
+
+class TestCollectdPluginInstrumentation(BaseTestCollectdPlugin):
+    """
+    Test that the plugin dispatches its own metrics.
+    """
+
+    @patch.object(collectd_plugin.rabbit.RabbitMQStats, 'get_vhosts')
+    def test_read_phases(self, mock_vhosts):
+        """
+        Assert each phase of a read is timed.
+        Args:
+        :param mock_vhosts: a patched method from a :mod:`RabbitMQStats`
+        """
+        mock_vhosts.return_value = [dict(name='test_vhost')]
+        self.collectd_plugin.dispatch_nodes = MagicMock()
+        self.collectd_plugin.dispatch_overview = MagicMock()
+        self.collectd_plugin.dispatch_queues = MagicMock()
+        self.collectd_plugin.dispatch_exchanges = MagicMock()
+        self.collectd_plugin.dispatch_instrumentation = MagicMock()
+
+        self.collectd_plugin.read()
+
+        phases = self.collectd_plugin.instrumentation.phases
+        for phase in ['nodes', 'overview', 'vhosts', 'total',
+                      'queues_rabbitmq_test_vhost',
+                      'exchanges_rabbitmq_test_vhost']:
+            self.assertIn(phase, phases)
+        self.assertFalse(
+            self.collectd_plugin.dispatch_instrumentation.called)
+
+        self.collectd_plugin.config.self_metrics = True
+        self.collectd_plugin.read()
+        self.collectd_plugin.config.self_metrics = False
+        self.assertTrue(self.collectd_plugin.dispatch_instrumentation.called)
+
+    def test_dispatch_instrumentation(self):
+        """
+        Assert the plugin's own metrics are dispatched under its own name.
+        """
+        stats = self.collectd_plugin.instrumentation
+        stats.reset()
+        stats.phases['nodes'] = 0.5
+        stats.record_request('nodes', 0.25, 1024, 0.01)
+        stats.values_dispatched = 42
+        stats.ignored = 3
+
+        self.collectd_plugin.dispatch_values = MagicMock()
+        self.collectd_plugin.dispatch_instrumentation()
+        dispatch = self.collectd_plugin.dispatch_values
+
+        dispatch.assert_any_call(0.5, 'rabbitmq_default', 'collectd_rabbitmq',
+                                 'cycle', 'rabbitmq_plugin_duration', 'nodes')
+        dispatch.assert_any_call(42, 'rabbitmq_default', 'collectd_rabbitmq',
+                                 'cycle', 'rabbitmq_plugin_values')
+        dispatch.assert_any_call(3, 'rabbitmq_default', 'collectd_rabbitmq',
+                                 'cycle', 'rabbitmq_plugin_objects',
+                                 'ignored')
+        dispatch.assert_any_call(1, 'rabbitmq_default', 'collectd_rabbitmq',
+                                 'nodes', 'rabbitmq_plugin_requests')
+        dispatch.assert_any_call(1024, 'rabbitmq_default',
+                                 'collectd_rabbitmq', 'nodes',
+                                 'rabbitmq_plugin_bytes')
+
+    def test_dispatch_histogram(self):
+        """
+        Assert latency buckets and percentiles are dispatched per endpoint.
+        """
+        histogram = instrumentation.Histogram((0.1, 0.2))
+        histogram.add(0.15)
+        histogram.add(0.15)
+        self.collectd_plugin.dispatch_values = MagicMock()
+        self.collectd_plugin.dispatch_histogram('rabbitmq_default', 'queue',
+                                                histogram)
+        dispatch = self.collectd_plugin.dispatch_values
+
+        dispatch.assert_any_call(0, 'rabbitmq_default', 'collectd_rabbitmq',
+                                 'queue', 'rabbitmq_plugin_latency_bucket',
+                                 'le_100ms')
+        dispatch.assert_any_call(2, 'rabbitmq_default', 'collectd_rabbitmq',
+                                 'queue', 'rabbitmq_plugin_latency_bucket',
+                                 'le_inf')
+        percentiles = [call[0][5] for call in dispatch.call_args_list
+                       if call[0][4] == 'rabbitmq_plugin_duration']
+        self.assertEqual(percentiles, ['p50', 'p95', 'p99'])
+
+        # Without new requests only the buckets are dispatched again.
+        dispatch.reset_mock()
+        self.collectd_plugin.dispatch_histogram('rabbitmq_default', 'queue',
+                                                histogram)
+        self.assertEqual(dispatch.call_count, 3)
+
+    def test_dispatch_values_counted(self):
+        """
+        Assert dispatched values are counted.
+        """
+        self.collectd_plugin.instrumentation.reset()
+        self.collectd_plugin.dispatch_values(1, 'vhost', 'plugin',
+                                             'plugin_instance', 'metric_type')
+        self.assertEqual(
+            self.collectd_plugin.instrumentation.values_dispatched, 1)
+
+
 class TestCollectdPluginDispatch(BaseTestCollectdPlugin):
     """
     Test the underlying dispatch method.
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the derived queue metrics """
+
+import logging
+import math
+import os
+import sys
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import derived  # noqa
+from collectd_rabbitmq import utils  # noqa
+from tests.utils import create_queue_record  # noqa
+
+
+class TestDerived(unittest.TestCase):
+    """
+    Test class for the derived metrics.
+    """
+
+    def setUp(self):
+        self.stats = dict(
+            draining=create_queue_record(100, 2, ready=100, publish=1,
+                                         publish_rate=5, deliver_rate=15),
+            growing=create_queue_record(100, 0, ready=100, publish=1,
+                                        publish_rate=20, deliver_rate=5),
+            empty=create_queue_record(0, 1, ready=0, publish=1,
+                                      publish_rate=2, deliver_rate=2),
+            idle=create_queue_record(10, 0, ready=10),
+            failed=None)
+        self.names, self.columns = derived.load_columns(self.stats)
+
+    def results(self, compute):
+        """
+        Returns a dictionary of queue name to metric to value.
+        """
+        metrics = compute(self.columns)
+        return dict(
+            (name, dict((metric, float(values[index]))
+                        for metric, values in metrics.items()))
+            for index, name in enumerate(self.names))
+
+    def assert_results(self, results):
+        """
+        Asserts that results hold the expected metrics.
+        """
+        self.assertEqual(sorted(results), ['draining', 'empty', 'growing',
+                                           'idle'])
+        draining = results['draining']
+        self.assertEqual(draining['rabbitmq_backlog_growth'], -10.0)
+        self.assertEqual(draining['rabbitmq_drain_time'], 10.0)
+        self.assertEqual(draining['rabbitmq_publish_deliver_ratio'], 3.0)
+        self.assertEqual(draining['rabbitmq_consumer_starved'], 0.0)
+
+        growing = results['growing']
+        self.assertEqual(growing['rabbitmq_backlog_growth'], 15.0)
+        self.assertTrue(math.isnan(growing['rabbitmq_drain_time']))
+        self.assertEqual(growing['rabbitmq_consumer_starved'], 1.0)
+
+        self.assertEqual(results['empty']['rabbitmq_drain_time'], 0.0)
+
+        idle = results['idle']
+        self.assertEqual(idle['rabbitmq_backlog_growth'], 0.0)
+        self.assertTrue(math.isnan(idle['rabbitmq_drain_time']))
+        self.assertTrue(math.isnan(idle['rabbitmq_publish_deliver_ratio']))
+        self.assertEqual(idle['rabbitmq_consumer_starved'], 1.0)
+
+    def test_compute_python(self):
+        """
+        Asserts the metrics computed in Python.
+        """
+        self.assert_results(self.results(derived.compute_python))
+
+    @unittest.skipIf(derived.load_numpy() is None, "NumPy is not installed")
+    def test_compute_numpy(self):
+        """
+        Asserts the metrics computed with NumPy.
+        """
+        self.assert_results(self.results(derived.compute_numpy))
+
+    @patch('collectd_rabbitmq.derived.numpy', None)
+    def test_compute_without_numpy(self):
+        """
+        Asserts that compute falls back to Python.
+        """
+        self.assert_results(self.results(derived.compute))
+
+    def test_dispatch_derived(self):
+        """
+        Asserts that derived metrics are dispatched, except undefined ones.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              derived_metrics=True)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_values = MagicMock()
+        plugin.dispatch_derived('%2F', self.stats)
+
+        plugin.dispatch_values.assert_any_call(
+            10.0, 'rabbitmq_default', 'queues', 'draining',
+            'rabbitmq_drain_time')
+        dispatched = [call[0][3:5] for call in
+                      plugin.dispatch_values.call_args_list]
+        self.assertNotIn(('growing', 'rabbitmq_drain_time'), dispatched)
+        self.assertEqual(len(dispatched), 13)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the synthetic cluster generator """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+from benchmarks.fixtures import ClusterGenerator  # noqa
+from benchmarks.server import select_columns  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import utils  # noqa
+from tests.utils import create_generated_url_response  # noqa
+
+
+class TestClusterGenerator(unittest.TestCase):
+    """
+    Test class for the ClusterGenerator.
+    """
+
+    def setUp(self):
+        self.generator = ClusterGenerator(vhosts=3, queues=200, exchanges=5,
+                                          distribution='skewed', seed=1)
+
+    def queue_names(self):
+        """
+        Returns the names of all queues.
+        """
+        return set(name for queues in self.generator.queues.values()
+                   for name in queues)
+
+    def test_payloads(self):
+        """
+        Asserts that payloads exist for every endpoint with realistic stats.
+        """
+        payloads = self.generator.payloads()
+        self.assertEqual(len(payloads['vhosts']), 3)
+        self.assertEqual(payloads['overview']['object_totals']['queues'], 200)
+        queues = sum(len(payloads['queues/%s' % vhost])
+                     for vhost in self.generator.vhosts)
+        self.assertEqual(queues, 200)
+        self.assertEqual(len(payloads['exchanges//']), 5)
+
+        # Skewed: the first vhost holds the most queues.
+        self.assertTrue(len(payloads['queues//']) >
+                        len(payloads['queues/vhost2']))
+
+        busy = [queue for queue in payloads['queues//']
+                if 'message_stats' in queue]
+        self.assertTrue(busy)
+        self.assertIn('rate', busy[0]['message_stats']['publish_details'])
+
+    def test_deterministic(self):
+        """
+        Asserts that the same seed generates the same cluster.
+        """
+        other = ClusterGenerator(vhosts=3, queues=200, exchanges=5,
+                                 distribution='skewed', seed=1)
+        self.assertEqual(other.payloads(), self.generator.payloads())
+
+    def test_churn(self):
+        """
+        Asserts that churn creates and deletes queues.
+        """
+        before = self.queue_names()
+        self.generator.step(60, created=0.1, deleted=0.1)
+        after = self.queue_names()
+        self.assertEqual(len(after), 200)
+        self.assertEqual(len(before - after), 20)
+        self.assertEqual(len(after - before), 20)
+
+    def test_counters_grow(self):
+        """
+        Asserts that counters of busy queues only grow.
+        """
+        queue = [queue for queue in self.generator.queues['/'].values()
+                 if not queue.idle][0]
+        publish = queue.counters['publish']
+        self.generator.step(60)
+        self.assertTrue(queue.counters['publish'] >= publish)
+
+
+class TestSelectColumns(unittest.TestCase):
+    """
+    Test the columns parameter of the stand-in server.
+    """
+
+    def test_select_columns(self):
+        """
+        Asserts that listings only keep the top level fields of columns.
+        """
+        payload = [dict(name='q1', messages=1, node='rabbit@a',
+                        message_stats=dict(publish=1))]
+        self.assertEqual(
+            select_columns(payload, ['name', 'message_stats.publish']),
+            [dict(name='q1', message_stats=dict(publish=1))])
+
+    def test_select_nested_columns(self):
+        """
+        Asserts that dotted columns select nested fields.
+        """
+        payload = dict(name='q1', message_stats=dict(
+            publish=1, publish_details=dict(rate=1.0), ack=2))
+        self.assertEqual(
+            select_columns(payload, ['message_stats.publish',
+                                     'message_stats.ack']),
+            dict(message_stats=dict(publish=1, ack=2)))
+
+
+class TestGeneratedDispatch(unittest.TestCase):
+    """
+    Test the plugin against a generated cluster.
+    """
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_read(self, mock_urlopen):
+        """
+        Asserts that every queue that is not ignored is dispatched.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        generator = ClusterGenerator(vhosts=2, queues=50, seed=2)
+        mock_urlopen.side_effect = create_generated_url_response(
+            generator.payloads())
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              data_to_ignore=dict(queue=['amq.gen-.*']))
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_values = MagicMock()
+        plugin.read()
+
+        dispatched = set(call[0][3] for call in
+                         plugin.dispatch_values.call_args_list
+                         if call[0][2] == 'queues')
+        expected = set(name for queues in generator.queues.values()
+                       for name in queues if not name.startswith('amq.'))
+        self.assertEqual(dispatched, expected)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the benchmark regression gate """
+
+import logging
+import sys
+import unittest
+
+from mock import patch
+
+from benchmarks import gate
+
+
+class TestGate(unittest.TestCase):
+    """
+    Test class for the benchmark gate.
+    """
+
+    def setUp(self):
+        self.baseline = dict(cycle_time=1.0, requests_per_cycle=7.0,
+                             peak_rss_kb=1000)
+        self.tolerance = dict(cycle_time=0.5, requests_per_cycle=0.0,
+                              peak_rss_kb=0.25)
+
+    def test_compare_within_tolerance(self):
+        """
+        Asserts that results within tolerance pass.
+        """
+        results = dict(cycle_time=1.4, requests_per_cycle=7.0,
+                       peak_rss_kb=1200)
+        self.assertEqual(gate.compare(results, self.baseline,
+                                      self.tolerance), [])
+
+    def test_compare_regressions(self):
+        """
+        Asserts that every metric beyond its tolerance is reported, and
+        that a single extra request is a regression.
+        """
+        results = dict(cycle_time=1.6, requests_per_cycle=8.0,
+                       peak_rss_kb=1300)
+        regressions = gate.compare(results, self.baseline, self.tolerance)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[1].startswith('requests_per_cycle'))
+
+    def test_baselines(self):
+        """
+        Asserts that the committed baselines cover every standard scenario
+        and collection strategy.
+        """
+        baselines = gate.load()
+        for scenario in baselines['scenarios'].values():
+            for metric in gate.METRICS:
+                self.assertIn(metric, scenario['baseline'])
+        sizes = set(scenario['options']['queues'] for scenario in
+                    baselines['scenarios'].values())
+        self.assertTrue(set([1000, 10000, 50000]) <= sizes)
+        strategies = set(scenario['options']['collect'] for scenario in
+                         baselines['scenarios'].values())
+        self.assertEqual(strategies, set(['detail', 'list']))
+
+    @patch('benchmarks.gate.calibrate', return_value=1.0)
+    @patch('benchmarks.gate.run_scenario')
+    def test_main_fails_on_regression(self, mock_run, _):
+        """
+        Asserts that main returns 1 when a scenario regresses.
+
+        Args:
+        :param mock_run: A patched run_scenario
+        """
+        mock_run.return_value = dict(cycle_time=0.0, peak_rss_kb=0,
+                                     requests_per_cycle=10 ** 6)
+        self.assertEqual(gate.main(['--scenarios', '1k-list']), 1)
+        mock_run.return_value['requests_per_cycle'] = 0
+        self.assertEqual(gate.main(['--scenarios', '1k-list']), 0)
+
+    @patch('benchmarks.gate.calibrate')
+    @patch('benchmarks.gate.run_scenario')
+    def test_main_absolute(self, mock_run, mock_calibrate):
+        """
+        Asserts that the raw cycle time is only gated with absolute, with
+        the tolerance given on the command line, while a machine three times
+        slower keeps the same normalized time.
+
+        Args:
+        :param mock_run: A patched run_scenario
+        :param mock_calibrate: A patched calibrate
+        """
+        baseline = gate.load()['scenarios']['1k-list']['baseline']
+        mock_calibrate.return_value = 3 * (baseline['cycle_time'] /
+                                           baseline['normalized_time'])
+        mock_run.return_value = dict(
+            baseline, cycle_time=baseline['cycle_time'] * 3)
+        self.assertEqual(gate.main(['--scenarios', '1k-list']), 0)
+        self.assertEqual(gate.main(['--scenarios', '1k-list',
+                                    '--absolute']), 1)
+        self.assertEqual(gate.main(['--scenarios', '1k-list', '--absolute',
+                                    '--tolerance', 'cycle_time=2.5']), 0)
+
+    @patch('benchmarks.gate.calibrate')
+    @patch('benchmarks.gate.run_scenario')
+    def test_main_defaults(self, mock_run, mock_calibrate):
+        """
+        Asserts that a slower cycle on the same machine, or a larger peak
+        RSS, fails without absolute.
+
+        Args:
+        :param mock_run: A patched run_scenario
+        :param mock_calibrate: A patched calibrate
+        """
+        baseline = gate.load()['scenarios']['50k-list']['baseline']
+        mock_calibrate.return_value = (baseline['cycle_time'] /
+                                       baseline['normalized_time'])
+        mock_run.return_value = dict(baseline)
+        self.assertEqual(gate.main(['--scenarios', '50k-list']), 0)
+        mock_run.return_value = dict(
+            baseline, cycle_time=baseline['cycle_time'] * 1.3)
+        self.assertEqual(gate.main(['--scenarios', '50k-list']), 1)
+        mock_run.return_value = dict(
+            baseline, peak_rss_kb=baseline['peak_rss_kb'] * 1.13)
+        self.assertEqual(gate.main(['--scenarios', '50k-list']), 1)
+
+    def test_calibrate(self):
+        """
+        Asserts that the calibration loop takes a measurable time.
+        """
+        self.assertGreater(gate.calibrate(rounds=1, size=1000), 0)
+
+    def test_ratios(self):
+        """
+        Asserts that ratios are measured from scenarios of the same run,
+        and gated on their own tolerance.
+        """
+        ratios = {'list/detail': dict(scenarios=['list', 'detail'],
+                                      metric='cycle_time', baseline=0.2)}
+        measured = dict(list=dict(cycle_time=3.0),
+                        detail=dict(cycle_time=10.0))
+        values = gate.measure_ratios(ratios, measured)
+        self.assertEqual(values, {'list/detail': 0.3})
+        self.assertEqual(gate.compare_ratios(values, ratios,
+                                             dict(ratio=0.5)), [])
+        self.assertEqual(len(gate.compare_ratios(values, ratios,
+                                                 dict(ratio=0.25))), 1)
+        del measured['detail']
+        self.assertEqual(gate.measure_ratios(ratios, measured), dict())
+
+    def test_baseline_ratios(self):
+        """
+        Asserts that the committed ratios compare scenarios that exist.
+        """
+        baselines = gate.load()
+        for ratio in baselines['ratios'].values():
+            for name in ratio['scenarios']:
+                self.assertIn(name, baselines['scenarios'])
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for queue group rollups """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import grouping  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.records import MISSING, StatsRecord  # noqa
+from tests.utils import create_queue_record  # noqa
+
+
+class TestGrouping(unittest.TestCase):
+    """
+    Test class for grouping rules.
+    """
+
+    def test_regex(self):
+        """
+        Asserts that regexes group by capture group or whole match.
+        """
+        rule = grouping.Grouping(regexes=[r'^(tenant-\d+)-', r'^amq\.gen'])
+        self.assertEqual(rule.group('tenant-42-7'), 'tenant-42')
+        self.assertEqual(rule.group('amq.gen-abc'), 'amq.gen')
+        self.assertIsNone(rule.group('orders'))
+
+    def test_prefix(self):
+        """
+        Asserts that the longest prefix wins.
+        """
+        rule = grouping.Grouping(prefixes=['service.', 'service.billing.'])
+        self.assertEqual(rule.group('service.billing.invoices'),
+                         'service.billing.')
+        self.assertEqual(rule.group('service.mail.out'), 'service.')
+        self.assertIsNone(rule.group('servic'))
+
+    def test_rollup_sum(self):
+        """
+        Asserts that grouped records are summed, and others kept.
+        """
+        stats = {'tenant-1-1': create_queue_record(10, 1, publish=5),
+                 'tenant-1-2': create_queue_record(20, 0),
+                 'tenant-2-1': create_queue_record(1, 1, publish=1),
+                 'orders': create_queue_record(3, 2),
+                 'tenant-3-1': None}
+        rules = [grouping.Grouping(regexes=[r'^(tenant-\d+)-'])]
+        rolled, grouped = grouping.rollup(stats, rules)
+
+        self.assertEqual(grouped, 3)
+        self.assertEqual(sorted(rolled), ['group+tenant-1', 'group+tenant-2',
+                                          'orders'])
+        self.assertIs(rolled['orders'], stats['orders'])
+        tenant = rolled['group+tenant-1']
+        self.assertEqual(dict(tenant.queue_values()),
+                         dict(consumers=1, messages=30))
+        self.assertEqual([(name, count, rate) for name, count, rate in
+                          tenant.message_stats()], [('publish', 5, 1.0)])
+
+    def test_rollup_max(self):
+        """
+        Asserts that grouped records can be aggregated with max.
+        """
+        stats = {'tenant-1-1': create_queue_record(10, 1),
+                 'tenant-1-2': create_queue_record(20, 0)}
+        rules = [grouping.Grouping(prefixes=['tenant-'], aggregate='max')]
+        rolled, _ = grouping.rollup(stats, rules)
+        self.assertEqual(dict(rolled['group+tenant-'].queue_values()),
+                         dict(consumers=1, messages=20))
+
+    def test_rollup_ratios(self):
+        """
+        Asserts that ratios are averaged when the other stats are summed.
+        """
+        stats = dict((name, StatsRecord.from_dict(dict(
+            messages=1, consumer_utilisation=utilisation)))
+            for name, utilisation in (('a.1', 1.0), ('a.2', 0.5),
+                                      ('a.3', None)))
+        rolled, _ = grouping.rollup(stats, [grouping.Grouping(
+            prefixes=['a.'])])
+        self.assertEqual(dict(rolled['group+a.'].queue_values()),
+                         dict(messages=3, consumer_utilisation=0.75))
+
+    def test_rollup_namespace(self):
+        """
+        Asserts that a group does not take the series of a queue named
+        like it.
+        """
+        stats = {'tenant': create_queue_record(1, 0),
+                 'tenant-1': create_queue_record(2, 0)}
+        rolled, _ = grouping.rollup(stats, [grouping.Grouping(
+            regexes=['^(tenant)-'])])
+        self.assertIs(rolled['tenant'], stats['tenant'])
+        self.assertEqual(rolled['group+tenant'].queue_stats[2], 2)
+
+    def test_rollup_without_rules(self):
+        """
+        Asserts that stats are untouched without rules.
+        """
+        stats = {'orders': create_queue_record(3, 2)}
+        self.assertEqual(grouping.rollup(stats, None), (stats, 0))
+
+    def test_aggregate(self):
+        """
+        Asserts that missing values are ignored.
+        """
+        self.assertEqual(grouping.aggregate([(1, MISSING), (2, MISSING)],
+                                            sum), (3, MISSING))
+        self.assertIsNone(grouping.aggregate([None], sum))
+
+
+class TestPluginGroups(unittest.TestCase):
+    """
+    Test grouping in the plugin.
+    """
+
+    def test_config(self):
+        """
+        Asserts that Group blocks are read from the configuration.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('Group', ('queue',), [
+                collectd.Config('Regex', (r'^(tenant-\d+)-',)),
+                collectd.Config('Prefix', ('service.',)),
+                collectd.Config('Aggregate', ('Max',))])])
+        collectd_plugin.configure(config)
+        rules = collectd_plugin.CONFIGS[-1].groups['queue']
+        self.assertEqual(len(rules), 1)
+        self.assertEqual(rules[0].aggregate, 'max')
+        self.assertEqual(rules[0].group('service.a'), 'service.')
+
+        config.children[-1].children[-1] = collectd.Config('Aggregate',
+                                                           ('avg',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    def test_dispatch_queues(self):
+        """
+        Asserts that only groups and ungrouped queues are dispatched.
+        """
+        rules = dict(queue=[grouping.Grouping(regexes=[r'^(tenant-\d+)-'])])
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              groups=rules)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.get_queue_stats = MagicMock(return_value={
+            'tenant-1-1': create_queue_record(10, 1),
+            'tenant-1-2': create_queue_record(20, 0),
+            'orders': create_queue_record(3, 2)})
+        plugin.dispatch_values = MagicMock()
+        plugin.instrumentation.reset()
+        plugin.dispatch_queues('%2F')
+
+        instances = set(call[0][3] for call in
+                        plugin.dispatch_values.call_args_list)
+        self.assertEqual(instances, set(['group+tenant-1', 'orders']))
+        plugin.dispatch_values.assert_any_call(
+            30, 'rabbitmq_default', 'queues', 'group+tenant-1', 'messages')
+        self.assertEqual(plugin.instrumentation.grouped, 2)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
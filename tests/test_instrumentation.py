@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for instrumentation """
+
+import logging
+import sys
+import unittest
+
+from collectd_rabbitmq import instrumentation
+
+
+class TestHistogram(unittest.TestCase):
+    """
+    Test class for the fixed bucket Histogram.
+    """
+
+    def setUp(self):
+        self.histogram = instrumentation.Histogram((0.1, 0.2, 0.4))
+
+    def test_add(self):
+        """
+        Asserts that values are counted in the right bucket.
+        """
+        for value in (0.05, 0.1, 0.15, 0.3, 5):
+            self.histogram.add(value)
+        self.assertEqual(self.histogram.counts, [2, 1, 1, 1])
+
+    def test_delta(self):
+        """
+        Asserts that delta only returns counts added since the last call.
+        """
+        self.histogram.add(0.05)
+        self.assertEqual(self.histogram.delta(), [1, 0, 0, 0])
+        self.histogram.add(0.3)
+        self.assertEqual(self.histogram.delta(), [0, 0, 1, 0])
+        self.assertEqual(self.histogram.counts, [1, 0, 1, 0])
+
+    def test_percentile(self):
+        """
+        Asserts that percentiles are interpolated within buckets.
+        """
+        self.assertAlmostEqual(
+            self.histogram.percentile([0, 4, 0, 0], 0.5), 0.15)
+        self.assertEqual(self.histogram.percentile([0, 0, 0, 2], 0.99), 0.4)
+        self.assertIsNone(self.histogram.percentile([0, 0, 0, 0], 0.5))
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Test class for the Instrumentation counters.
+    """
+
+    def setUp(self):
+        self.instrumentation = instrumentation.Instrumentation()
+
+    def test_record_request(self):
+        """
+        Asserts that requests are accumulated per endpoint.
+        """
+        self.instrumentation.record_request('queues', 0.5, 100, 0.1)
+        self.instrumentation.record_request('queues', 1.5, 300, 0.2,
+                                            error=True)
+        stats = self.instrumentation.endpoints['queues']
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(stats.errors, 1)
+        self.assertEqual(stats.latency, 2.0)
+        self.assertEqual(stats.latency_max, 1.5)
+        self.assertEqual(stats.bytes, 400)
+        self.assertEqual(
+            sum(self.instrumentation.histograms['queues'].counts), 2)
+
+    def test_phase(self):
+        """
+        Asserts that phases are timed even when the block raises.
+        """
+        with self.instrumentation.phase('nodes'):
+            pass
+        try:
+            with self.instrumentation.phase('overview'):
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertIn('nodes', self.instrumentation.phases)
+        self.assertIn('overview', self.instrumentation.phases)
+
+    def test_reset(self):
+        """
+        Asserts that reset starts a new cycle.
+        """
+        self.instrumentation.record_request('nodes', 0.5, 100, 0.1)
+        self.instrumentation.values_dispatched = 10
+        self.instrumentation.ignored = 2
+        self.instrumentation.reset()
+        self.assertEqual(self.instrumentation.endpoints, dict())
+        self.assertEqual(self.instrumentation.values_dispatched, 0)
+        self.assertEqual(self.instrumentation.ignored, 0)
+        self.assertIn('nodes', self.instrumentation.histograms)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,314 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the object inventory """
+
+import json
+import logging
+import os
+import sys
+import unittest
+import urllib2
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import grouping  # noqa
+from collectd_rabbitmq import inventory  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.rabbit import RabbitMQStats  # noqa
+from tests.utils import MockURLResponse, get_request_url  # noqa
+
+
+class TestInventory(unittest.TestCase):
+    """
+    Test class for the inventory.
+    """
+
+    def setUp(self):
+        self.resolve = MagicMock(
+            side_effect=lambda stat_type, vhost_name, name:
+            None if name == 'ignored' else name.upper())
+        self.inventory = inventory.Inventory(self.resolve)
+        self.listener = MagicMock()
+        self.inventory.listeners.append(self.listener)
+
+    def test_created(self):
+        """
+        Asserts that new objects are resolved and reported as created.
+        """
+        entries, created, deleted = self.inventory.update(
+            'queue', 'vhost', ['a', 'b', 'ignored'])
+        self.assertEqual(entries, dict(a='A', b='B', ignored=None))
+        self.assertEqual(sorted(created), ['A', 'B'])
+        self.assertEqual(deleted, [])
+        self.assertEqual(len(self.inventory), 3)
+
+    def test_resolve_once(self):
+        """
+        Asserts that known objects are not resolved again.
+        """
+        self.inventory.update('queue', 'vhost', ['a', 'b'])
+        self.resolve.reset_mock()
+        entries, created, deleted = self.inventory.update(
+            'queue', 'vhost', ['a', 'b'])
+        self.assertFalse(self.resolve.called)
+        self.assertEqual((created, deleted), ([], []))
+        self.assertFalse(self.listener.called)
+
+    def test_deleted(self):
+        """
+        Asserts that deleted objects are reported to the listeners.
+        """
+        self.inventory.update('queue', 'vhost', ['a', 'b', 'ignored'])
+        _, created, deleted = self.inventory.update(
+            'queue', 'vhost', ['b', 'c'])
+        self.assertEqual(created, ['C'])
+        self.assertEqual(deleted, ['A'])
+        self.listener.assert_called_once_with('queue', 'vhost', ['A'])
+
+    def test_retain_vhosts(self):
+        """
+        Asserts that the objects of vhosts that are gone are deleted.
+        """
+        self.inventory.update('queue', 'gone', ['a'])
+        self.inventory.update('exchange', 'kept', ['b'])
+        self.assertEqual(self.inventory.retain_vhosts(['kept']),
+                         set(['gone']))
+        self.listener.assert_called_once_with('queue', 'gone', ['A'])
+        self.assertEqual(len(self.inventory), 1)
+
+
+class TestRabbitInventory(unittest.TestCase):
+    """
+    Test the inventory of the RabbitMQ stats.
+    """
+
+    def setUp(self):
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              data_to_ignore=dict(queue=['amq.gen-.*']))
+        self.stats = RabbitMQStats(config)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_queue_stats(self, mock_urlopen):
+        """
+        Asserts that queues are tracked across cycles, and that ignored
+        queues are still counted.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        queues = [dict(name='a/b'), dict(name='amq.gen-1')]
+
+        def urlopen(request, *args, **kwargs):
+            """
+            Serves the queue listing, and empty queues.
+            """
+            if '?columns=' in get_request_url(request):
+                return MockURLResponse(json.dumps(queues))
+            return MockURLResponse(json.dumps(dict()))
+        mock_urlopen.side_effect = urlopen
+        stats = self.stats.get_queue_stats(vhost_name='vhost')
+        self.assertEqual(stats.keys(), ['a%2Fb'])
+        self.assertEqual(self.stats.instrumentation.created, 1)
+        self.assertEqual(self.stats.instrumentation.ignored, 1)
+
+        self.stats.instrumentation.reset()
+        queues[:] = [dict(name='amq.gen-1'), dict(name='c')]
+        stats = self.stats.get_queue_stats(vhost_name='vhost')
+        self.assertEqual(stats.keys(), ['c'])
+        self.assertEqual(self.stats.instrumentation.created, 1)
+        self.assertEqual(self.stats.instrumentation.deleted, 1)
+        self.assertEqual(self.stats.instrumentation.ignored, 1)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_failed_listing(self, mock_urlopen):
+        """
+        Asserts that a failed listing leaves the inventory as it was, with
+        both collect strategies.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        for collect in ('detail', 'list'):
+            self.stats.config.collect = collect
+            self.stats.inventory.update('queue', 'vhost', ['a'])
+            listener = MagicMock()
+            self.stats.inventory.listeners[:] = [listener]
+            mock_urlopen.side_effect = urllib2.HTTPError(
+                "testurl", 503, "Unavailable", None, None)
+            self.assertEqual(self.stats.get_queue_stats(vhost_name='vhost'),
+                             dict())
+            self.assertEqual(self.stats.inventory.objects[('queue', 'vhost')],
+                             dict(a='a'))
+            self.assertFalse(listener.called)
+
+
+class TestPluginInventory(unittest.TestCase):
+    """
+    Test the eviction of deleted objects in the plugin.
+    """
+
+    def test_evict(self):
+        """
+        Asserts that deleted queues are evicted from the per series caches.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              local_rates=True, max_series=10)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        key = ('vhost', 'queues', 'a')
+        plugin.rates.rates(key, (1,), 1.0)
+        plugin.series.admit([key])
+
+        plugin.rabbit.inventory.update('queue', 'vhost', ['a'])
+        plugin.rabbit.inventory.update('queue', 'vhost', [])
+        self.assertEqual(len(plugin.rates), 0)
+        self.assertEqual(len(plugin.series), 0)
+
+    def test_notify(self):
+        """
+        Asserts that a notification is dispatched for deleted series, but
+        not for grouped queues.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              deleted_series='notify', groups=dict(
+                                  queue=[grouping.Grouping(['amq'])]))
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_notification = MagicMock()
+        plugin.rabbit.inventory.update('queue', '%2F', ['a/b', 'amq.1'])
+        plugin.rabbit.inventory.update('queue', '%2F', [])
+        plugin.dispatch_notification.assert_called_once_with(
+            'rabbitmq_default', 'queues', 'a%2Fb',
+            'Queue a/b of vhost / was deleted')
+
+    def test_zero(self):
+        """
+        Asserts that the gauges and rates that deleted series had are
+        zeroed, and nothing else.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              deleted_series='zero')
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_values = MagicMock()
+        plugin.remember('vhost', 'exchanges', 'a', dict(message_stats=dict(
+            publish_in=1, publish_in_details=dict(rate=1.0), publish_out=1)))
+        plugin.remember('vhost', 'queues', 'a', dict(messages=2))
+        plugin.rabbit.inventory.update('exchange', 'vhost', ['a', 'b'])
+        plugin.rabbit.inventory.update('queue', 'vhost', ['a'])
+        plugin.rabbit.inventory.retain_vhosts([])
+
+        calls = [call[0] for call in plugin.dispatch_values.call_args_list]
+        self.assertEqual(sorted(calls), [
+            (0, 'rabbitmq_vhost', 'exchanges', 'a', 'publish_in_details',
+             'rate'),
+            (0, 'rabbitmq_vhost', 'queues', 'a', 'messages')])
+        self.assertEqual(plugin.last_records, dict())
+
+    def test_config(self):
+        """
+        Asserts that DeletedSeries is read and checked.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('DeletedSeries', ('Notify',))])
+        collectd_plugin.configure(config)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].deleted_series,
+                         'notify')
+
+        config.children[-1] = collectd.Config('DeletedSeries', ('delete',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    def test_retain_vhosts(self):
+        """
+        Asserts that the host names of deleted vhosts are forgotten.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo())
+        plugin = collectd_plugin.CollectdPlugin(config)
+        self.assertEqual(plugin.generate_vhost_name('gone'), 'rabbitmq_gone')
+        plugin.generate_vhost_name('')
+        plugin.rabbit.inventory.update('queue', 'gone', ['a'])
+        plugin.retain_vhosts(['kept'])
+        self.assertEqual(plugin.hosts.keys(), [(None, '')])
+        self.assertEqual(len(plugin.rabbit.inventory), 0)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_failed_vhosts(self, mock_urlopen):
+        """
+        Asserts that a failed vhost listing forgets no vhost and expires no
+        series.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              deleted_series='notify')
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_notification = MagicMock()
+        plugin.rabbit.inventory.update('queue', '%2F', ['a'])
+        mock_urlopen.side_effect = urllib2.HTTPError(
+            "testurl", 503, "Unavailable", None, None)
+        plugin.read()
+        self.assertEqual(len(plugin.rabbit.inventory), 1)
+        self.assertFalse(plugin.dispatch_notification.called)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_failed_queues(self, mock_urlopen):
+        """
+        Asserts that the queues of a vhost whose queue listing failed are
+        not expired.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              deleted_series='notify')
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_notification = MagicMock()
+        plugin.dispatch_values = MagicMock()
+        plugin.rabbit.inventory.update('queue', '%2F', ['a'])
+
+        def urlopen(request, *args, **kwargs):
+            """
+            Fails the queue listing, and serves empty listings otherwise.
+            """
+            url = get_request_url(request)
+            if '/api/queues/' in url:
+                raise urllib2.HTTPError(url, 503, "Unavailable", None, None)
+            if '/api/vhosts' in url:
+                return MockURLResponse(json.dumps([dict(name='/')]))
+            if '/api/overview' in url:
+                return MockURLResponse(json.dumps(dict()))
+            return MockURLResponse(json.dumps(list()))
+        mock_urlopen.side_effect = urlopen
+        plugin.read()
+        self.assertEqual(plugin.rabbit.inventory.objects[('queue', '%2F')],
+                         dict(a='a'))
+        self.assertFalse(plugin.dispatch_notification.called)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
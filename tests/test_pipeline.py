@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the fetch and dispatch pipeline """
+
+import logging
+import os
+import sys
+import threading
+import unittest
+
+from mock import MagicMock
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import grouping  # noqa
+from collectd_rabbitmq import pipeline  # noqa
+from collectd_rabbitmq import utils  # noqa
+
+
+class TestPipelined(unittest.TestCase):
+    """
+    Test class for the producer thread.
+    """
+
+    def test_items(self):
+        """
+        Asserts that the items are yielded in order, from another thread.
+        """
+        threads = list()
+
+        def produce():
+            """
+            Yields numbers, noting the producing thread.
+            """
+            for index in range(10):
+                threads.append(threading.current_thread())
+                yield index
+
+        self.assertEqual(list(pipeline.pipelined(produce(), 2)), range(10))
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_error(self):
+        """
+        Asserts that an error of the producer is raised to the consumer
+        after the items produced before it.
+        """
+        def produce():
+            """
+            Yields a number and fails.
+            """
+            yield 1
+            raise KeyError('failed')
+
+        consumed = list()
+        with self.assertRaises(KeyError):
+            for item in pipeline.pipelined(produce(), 2):
+                consumed.append(item)
+        self.assertEqual(consumed, [1])
+
+    def test_stop(self):
+        """
+        Asserts that the producer stops when the consumer does.
+        """
+        produced = list()
+
+        def produce():
+            """
+            Yields numbers forever.
+            """
+            index = 0
+            while True:
+                produced.append(index)
+                yield index
+                index += 1
+
+        items = pipeline.pipelined(produce(), 1)
+        self.assertEqual(next(items), 0)
+        items.close()
+        self.assertTrue(len(produced) <= 3)
+        self.assertFalse(any(thread.name == 'rabbitmq-producer'
+                             for thread in threading.enumerate()))
+
+
+class TestPluginPipeline(unittest.TestCase):
+    """
+    Test the pipelined dispatch of queues.
+    """
+
+    def test_dispatch_queues(self):
+        """
+        Asserts that pipelined queues are dispatched once, grouped queues
+        after the rollup.
+        """
+        groups = dict(queue=[grouping.Grouping(prefixes=['tenant.'])])
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              groups=groups, pipeline=True, pipeline_size=1)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.get_queues = MagicMock(return_value=[
+            dict(name='a'), dict(name='tenant.1'), dict(name='tenant.2')])
+        plugin.rabbit.get_info = MagicMock(return_value=dict(messages=2))
+        plugin.dispatch_queue = MagicMock()
+
+        plugin.dispatch_queues('vhost')
+        dispatched = [args[0][1] for args in
+                      plugin.dispatch_queue.call_args_list]
+        self.assertEqual(sorted(dispatched), ['a', 'group+tenant.'])
+        self.assertEqual(plugin.dispatch_queue.call_args_list[-1][0][2]
+                         .queue_stats[2], 4)
+
+    def test_lock(self):
+        """
+        Asserts that streamed dispatches and evictions hold the lock of the
+        plugin, as the producer evicts from its own thread.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              pipeline=True)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.inventory.update('queue', 'vhost', ['gone'])
+        plugin.rabbit.get_queues = MagicMock(return_value=[dict(name='a')])
+        plugin.rabbit.get_info = MagicMock(return_value=dict(messages=2))
+        locked = list()
+        plugin.dispatch_queue = MagicMock(
+            side_effect=lambda *args: locked.append(plugin.lock.locked()))
+        plugin.evict_series = MagicMock(
+            side_effect=lambda *args: locked.append(plugin.lock.locked()))
+
+        plugin.dispatch_queues('vhost')
+        plugin.evict_series.assert_called_once_with('queue', 'vhost',
+                                                    ['gone'])
+        self.assertEqual(locked, [True, True])
+
+    def test_config(self):
+        """
+        Asserts that Pipeline and PipelineSize are read and checked.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('Pipeline', (True,)),
+            collectd.Config('PipelineSize', ('16',))])
+        collectd_plugin.configure(config)
+        self.assertTrue(collectd_plugin.CONFIGS[-1].pipeline)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].pipeline_size, 16)
+
+        config.children[-1] = collectd.Config('PipelineSize', ('0',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
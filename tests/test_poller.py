@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the designated poller """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import utils  # noqa
+
+
+class TestDesignatedPoller(unittest.TestCase):
+    """
+    Test class for the designated poller.
+    """
+
+    def create_plugin(self, node_name, nodes):
+        """
+        Returns a plugin for node_name in a cluster of nodes, with mocked
+        dispatch methods.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              designated_poller=True, node_name=node_name)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.get_nodes = MagicMock(return_value=nodes)
+        plugin.rabbit.get_node = MagicMock(
+            return_value=dict(name=node_name, fd_used=10))
+        plugin.rabbit.get_vhosts = MagicMock(return_value=list())
+        plugin.dispatch_nodes = MagicMock()
+        plugin.dispatch_overview = MagicMock()
+        plugin.dispatch_values = MagicMock()
+        return plugin
+
+    def test_designated(self):
+        """
+        Asserts that the running node with the lowest name polls the
+        cluster.
+        """
+        nodes = [dict(name='rabbit@b', running=True),
+                 dict(name='rabbit@a', running=True)]
+        plugin = self.create_plugin('rabbit@a', nodes)
+        plugin.read()
+        plugin.rabbit.get_nodes.assert_called_once_with(
+            columns=['name', 'running'])
+        self.assertFalse(plugin.dispatch_nodes.called)
+        self.assertTrue(plugin.dispatch_overview.called)
+        self.assertTrue(plugin.rabbit.get_vhosts.called)
+        plugin.rabbit.get_node.assert_called_once_with('rabbit@a')
+
+    def test_local_node(self):
+        """
+        Asserts that the other nodes only dispatch their own stats.
+        """
+        nodes = [dict(name='rabbit@b', running=True),
+                 dict(name='rabbit@a', running=True)]
+        plugin = self.create_plugin('rabbit@b', nodes)
+        plugin.read()
+        self.assertFalse(plugin.dispatch_nodes.called)
+        self.assertFalse(plugin.dispatch_overview.called)
+        self.assertFalse(plugin.rabbit.get_vhosts.called)
+        plugin.rabbit.get_node.assert_called_once_with('rabbit@b')
+        plugin.dispatch_values.assert_called_once_with(
+            10, 'rabbitmq_default', 'b', None, 'fd_used')
+
+    def test_nodes_once(self):
+        """
+        Asserts that each node of a two host cluster is dispatched once.
+        """
+        nodes = [dict(name='rabbit@a', running=True, fd_used=1),
+                 dict(name='rabbit@b', running=True, fd_used=2)]
+        dispatched = list()
+        for node in nodes:
+            plugin = self.create_plugin(node['name'], nodes)
+            plugin.rabbit.get_node = MagicMock(return_value=node)
+            del plugin.dispatch_nodes
+            plugin.rabbit.get_vhosts.return_value = list()
+            plugin.read()
+            dispatched.extend(args[0][2] for args in
+                              plugin.dispatch_values.call_args_list
+                              if args[0][4] == 'fd_used')
+        self.assertEqual(sorted(dispatched), ['a', 'b'])
+
+    def test_failover(self):
+        """
+        Asserts that the next node takes over when the poller stops.
+        """
+        nodes = [dict(name='rabbit@b', running=True),
+                 dict(name='rabbit@a', running=False)]
+        plugin = self.create_plugin('rabbit@b', nodes)
+        plugin.read()
+        self.assertTrue(plugin.dispatch_overview.called)
+        self.assertTrue(plugin.poller)
+
+    @patch('collectd_rabbitmq.collectd_plugin.socket.gethostname',
+           MagicMock(return_value='h.example.com'))
+    def test_default_node_name(self):
+        """
+        Asserts that the node name defaults to the short host name.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              designated_poller=True)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        self.assertEqual(plugin.node_name, 'rabbit@h')
+
+    def test_config(self):
+        """
+        Asserts that DesignatedPoller and NodeName are read.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('DesignatedPoller', (True,)),
+            collectd.Config('NodeName', ('rabbit@a',))])
+        collectd_plugin.configure(config)
+        self.assertTrue(collectd_plugin.CONFIGS[-1].designated_poller)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].node_name, 'rabbit@a')
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
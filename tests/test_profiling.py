@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for profiling """
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import profiling  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.utils import ProfileInfo  # noqa
+
+
+class TestProfiler(unittest.TestCase):
+    """
+    Test class for the Profiler.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def results(self):
+        """
+        Returns the profile results written so far.
+        """
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith('.prof'))
+
+    def test_profile_every(self):
+        """
+        Asserts that every Nth call is profiled and its result returned.
+        """
+        profiler = profiling.Profiler(ProfileInfo(self.directory, every=2),
+                                      'test')
+        func = MagicMock(return_value='result')
+        for _ in range(4):
+            self.assertEqual(profiler.run(func), 'result')
+        self.assertEqual(func.call_count, 4)
+        self.assertEqual(len(self.results()), 2)
+
+    def test_profile_disabled(self):
+        """
+        Asserts that nothing is written without every or a trigger.
+        """
+        profiler = profiling.Profiler(ProfileInfo(self.directory), 'test')
+        profiler.run(MagicMock())
+        self.assertEqual(self.results(), [])
+
+    def test_profile_trigger(self):
+        """
+        Asserts that the trigger file captures a single call.
+        """
+        profiler = profiling.Profiler(ProfileInfo(self.directory), 'test')
+        open(profiler.trigger, 'w').close()
+        profiler.run(MagicMock())
+        profiler.run(MagicMock())
+        self.assertEqual(len(self.results()), 1)
+        self.assertFalse(os.path.exists(profiler.trigger))
+
+    def test_profile_rotation(self):
+        """
+        Asserts that only the latest results are kept.
+        """
+        profiler = profiling.Profiler(
+            ProfileInfo(self.directory, every=1, keep=2), 'test')
+        for _ in range(5):
+            profiler.run(MagicMock())
+        results = self.results()
+        self.assertEqual(len(results), 2)
+        self.assertTrue(results[-1].endswith('000005.prof'))
+
+    @patch.object(profiling, 'tracemalloc', None)
+    def test_tracemalloc_unavailable(self):
+        """
+        Asserts that tracemalloc mode falls back to cProfile when the
+        interpreter does not provide tracemalloc.
+        """
+        profiler = profiling.Profiler(
+            ProfileInfo(self.directory, every=1, mode='tracemalloc'), 'test')
+        profiler.run(MagicMock())
+        self.assertEqual(len(self.results()), 1)
+
+    def test_keep_config(self):
+        """
+        Asserts that keeping no profile is refused.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('ProfileDirectory', (self.directory,)),
+            collectd.Config('ProfileKeep', ('0',))])
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    @patch('collectd_rabbitmq.collectd_plugin.collectd.register_read')
+    def test_instance_names(self, _):
+        """
+        Asserts that two instances of the same cluster profile under the
+        names of their own callbacks.
+        """
+        profile = ProfileInfo(self.directory)
+        collectd_plugin.CONFIGS = [
+            utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                         profile=profile) for index in range(2)]
+        collectd_plugin.init()
+        names = [instance.profiler.name
+                 for instance in collectd_plugin.INSTANCES]
+        collectd_plugin.CONFIGS = []
+        collectd_plugin.INSTANCES = []
+        self.assertEqual(names, ['rabbitmq-0-http_localhost_15672',
+                                 'rabbitmq-1-http_localhost_15672'])
+
+    def test_profile_exception(self):
+        """
+        Asserts that a profile is written even if the call raises.
+        """
+        profiler = profiling.Profiler(ProfileInfo(self.directory, every=1),
+                                      'test')
+        self.assertRaises(ValueError, profiler.run,
+                          MagicMock(side_effect=ValueError()))
+        self.assertEqual(len(self.results()), 1)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
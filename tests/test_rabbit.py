@@ -26,7 +26,8 @@ import urllib2
 from mock import Mock, patch
 from collectd_rabbitmq.rabbit import RabbitMQStats
 from collectd_rabbitmq.utils import Auth, Config, ConnectionInfo
-from tests.utils import create_mock_url_repsonse, MockURLResponse
+from tests.utils import create_mock_url_repsonse, get_request_url
+from tests.utils import MockURLResponse
 
 
 class TestGetInfo(unittest.TestCase):
@@ -53,6 +54,48 @@ class TestGetInfo(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(test_value, result)
 
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_info_sends_credentials(self, mock_urlopen):
+        """
+        Asserts that get_info authenticates each request itself and passes
+        the configured timeout, rather than installing a global opener.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        conn = ConnectionInfo(host="example.com", timeout=5)
+        stats = RabbitMQStats(Config(Auth('user', 'secret'), conn))
+        mock_urlopen.return_value = MockURLResponse(json.dumps([]))
+        stats.get_info("nodes")
+
+        request = mock_urlopen.call_args[0][0]
+        self.assertEqual(request.get_full_url(),
+                         "http://example.com:15672/api/nodes")
+        self.assertEqual(request.get_header('Authorization'),
+                         'Basic dXNlcjpzZWNyZXQ=')
+        self.assertEqual(mock_urlopen.call_args[1]['timeout'], 5)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_info_instrumentation(self, mock_urlopen):
+        """
+        Asserts that get_info records requests per endpoint family.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        body = json.dumps(dict(name='q1'))
+        mock_urlopen.return_value = MockURLResponse(body)
+        self.stats.get_info("queues", "test_vhost", "q1")
+        self.stats.get_info("queues", "test_vhost")
+        endpoints = self.stats.instrumentation.endpoints
+        self.assertEqual(endpoints['queue'].requests, 1)
+        self.assertEqual(endpoints['queue'].bytes, len(body))
+        self.assertEqual(endpoints['queues'].requests, 1)
+
+        mock_urlopen.side_effect = urllib2.URLError("URL Error ")
+        self.stats.get_info("nodes")
+        self.assertEqual(endpoints['nodes'].errors, 1)
+
     def test_get_info_bad_url(self):
         """
         Asserts that get_info returns None if url is incorrect.
@@ -170,6 +213,28 @@ class TestVhost(TestBaseClass):
         self.assertIn('test_vhostb', vhost_names)
 
 
+class TestNames(TestBaseClass):
+    """
+    Test listing object names.
+    """
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_queue_names(self, mock_urlopen):
+        """
+        Asserts that only the names of queues are requested.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        mock_urlopen.return_value = MockURLResponse(
+            json.dumps([dict(name='a/b'), dict(name='c')]))
+        names = self.stats.get_queue_names('test_vhost')
+        self.assertEqual(names, ['a%2Fb', 'c'])
+        self.assertEqual(get_request_url(mock_urlopen.call_args[0][0]),
+                         'http://example.com:15672/api/queues/test_vhost'
+                         '?columns=name')
+
+
 class TestStatsBaseClass(TestBaseClass):
     """
     Base class for Stats test.
@@ -308,6 +373,75 @@ class TestQueues(TestStatsBaseClass):
         self.assertTrue(stats)
 
 
+class TestListStrategy(TestStatsBaseClass):
+    """
+    Test collecting stats from listings.
+    """
+
+    def setUp(self):
+        TestStatsBaseClass.setUp(self)
+        self.conf = Config(self.auth, self.conn,
+                           data_to_ignore=dict(queue=['amq.gen-.*']),
+                           collect='list')
+        self.stats.config = self.conf
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_all_queue_stats(self, mock_urlopen):
+        """
+        Asserts that all queues of a vhost take a single request, and that
+        ignored queues are skipped.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        queues = [dict(name='q1', messages=1), dict(name='a/b', messages=2),
+                  dict(name='amq.gen-1', messages=3)]
+        mock_urlopen.return_value = MockURLResponse(json.dumps(queues))
+        stats = self.stats.get_queue_stats(vhost_name='test_vhost')
+        self.assertEqual(mock_urlopen.call_count, 1)
+        self.assertEqual(get_request_url(mock_urlopen.call_args[0][0]),
+                         'http://example.com:15672/api/queues/test_vhost'
+                         '?columns=name,message_stats,consumers,'
+                         'consumer_utilisation,messages,messages_ready,'
+                         'messages_unacknowledged')
+        self.assertEqual(sorted(stats.keys()), ['a%2Fb', 'q1'])
+        self.assertEqual(dict(stats['q1'].queue_values())['messages'], 1)
+        self.assertEqual(self.stats.instrumentation.ignored, 1)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_counters_only(self, mock_urlopen):
+        """
+        Asserts that the rates of the broker are not requested when rates
+        are computed locally.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        self.stats.config.local_rates = True
+        mock_urlopen.return_value = MockURLResponse(json.dumps([]))
+        self.stats.get_exchange_stats(vhost_name='test_vhost')
+        url = get_request_url(mock_urlopen.call_args[0][0])
+        self.assertIn('message_stats.publish_in,', url)
+        self.assertNotIn('details', url)
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_single_queue_stats(self, mock_urlopen):
+        """
+        Asserts that a named queue is still requested on its own.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        self.test_stats['name'] = 'test_queue'
+        mock_urlopen.return_value = MockURLResponse(
+            json.dumps(self.test_stats))
+        stats = self.stats.get_queue_stats('test_queue', 'test_vhost')
+        self.assertEqual(get_request_url(mock_urlopen.call_args[0][0]),
+                         'http://example.com:15672/api/queues/test_vhost/'
+                         'test_queue')
+        self.assertTrue(stats['test_queue'])
+
+
 class TestIgnoredQueues(TestStatsBaseClass):
     """
     Test the ignored queues.
@@ -380,8 +514,7 @@ class TestIgnoredQueues(TestStatsBaseClass):
     @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
     def test_get_exchanges_unavailable(self, mock_urlopen):
         """
-        Asserts that get_exchanges returns an empty list if it can't access the
-        data.
+        Asserts that get_exchanges returns None if it can't access the data.
 
         Args:
         :param mock_urlopen: A patched urllib object
@@ -389,7 +522,7 @@ class TestIgnoredQueues(TestStatsBaseClass):
         mock_urlopen.side_effect = urllib2.HTTPError(
             "testurl", 401, "Forbidden", None, None)
         exchanges = self.stats.get_exchanges("test_vhost")
-        self.assertEqual(exchanges, [])
+        self.assertIsNone(exchanges)
 
 
 class TestIgnoredExchanges(TestStatsBaseClass):
@@ -464,8 +597,7 @@ class TestIgnoredExchanges(TestStatsBaseClass):
     @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
     def test_get_queue_unavailable(self, mock_urlopen):
         """
-        Asserts that get_queues returns an empty list if it can't access the
-        data.
+        Asserts that get_queues returns None if it can't access the data.
 
         Args:
         :param mock_urlopen: A patched urllib object
@@ -473,7 +605,7 @@ class TestIgnoredExchanges(TestStatsBaseClass):
         mock_urlopen.side_effect = urllib2.HTTPError(
             "testurl", 401, "Forbidden", None, None)
         queues = self.stats.get_queues("test_vhost")
-        self.assertEqual(queues, [])
+        self.assertIsNone(queues)
 
 
 if __name__ == '__main__':
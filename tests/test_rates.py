@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for locally computed rates """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.rates import RateStore  # noqa
+from collectd_rabbitmq.records import MISSING, NO_RATES  # noqa
+
+
+class TestRateStore(unittest.TestCase):
+    """
+    Test class for the RateStore.
+    """
+
+    def setUp(self):
+        self.store = RateStore()
+
+    def test_rates(self):
+        """
+        Asserts that rates are computed from the previous counters.
+        """
+        key = ('/', 'queues', 'q1')
+        self.assertIs(self.store.rates(key, (10, MISSING, 5), 100.0),
+                      NO_RATES)
+        self.assertEqual(self.store.rates(key, (30, 4, 5), 110.0),
+                         (2.0, MISSING, 0.0))
+
+    def test_counter_reset(self):
+        """
+        Asserts that a counter that went down gets no rate.
+        """
+        key = ('/', 'queues', 'q1')
+        self.store.rates(key, (10, 10), 100.0)
+        self.assertEqual(self.store.rates(key, (2, 20), 110.0),
+                         (MISSING, 1.0))
+        self.assertEqual(self.store.rates(key, (12, 30), 120.0),
+                         (1.0, 1.0))
+
+    def test_no_time_elapsed(self):
+        """
+        Asserts that no rates are computed without time between counters.
+        """
+        key = ('/', 'queues', 'q1')
+        self.store.rates(key, (10,), 100.0)
+        self.assertIs(self.store.rates(key, (20,), 100.0), NO_RATES)
+
+    def test_end_cycle(self):
+        """
+        Asserts that series that were not seen for a cycle are removed.
+        """
+        self.store.rates('q1', (1,), 100.0)
+        self.store.rates('q2', (1,), 100.0)
+        self.assertEqual(self.store.end_cycle(), 0)
+        self.store.rates('q1', (2,), 110.0)
+        self.assertEqual(self.store.end_cycle(), 1)
+        self.assertEqual(len(self.store), 1)
+        self.assertIs(self.store.rates('q2', (2,), 120.0), NO_RATES)
+
+
+class TestLocalRates(unittest.TestCase):
+    """
+    Test dispatching locally computed rates.
+    """
+
+    @patch('collectd_rabbitmq.collectd_plugin.time.time')
+    def test_dispatch_message_stats(self, mock_time):
+        """
+        Asserts that local rates replace the rates of the broker.
+
+        Args:
+        :param mock_time: A patched time.time
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              local_rates=True)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_values = MagicMock()
+
+        def queue(publish):
+            """
+            Returns a queue with publish messages and a broker rate.
+            """
+            return dict(message_stats=dict(
+                publish=publish, publish_details=dict(rate=99.0)))
+
+        mock_time.return_value = 100.0
+        plugin.dispatch_message_stats(queue(10), '/', 'queues', 'q1')
+        plugin.dispatch_values.assert_called_once_with(
+            10, 'rabbitmq_default', 'queues', 'q1', 'publish')
+
+        plugin.dispatch_values.reset_mock()
+        mock_time.return_value = 105.0
+        plugin.dispatch_message_stats(queue(20), '/', 'queues', 'q1')
+        plugin.dispatch_values.assert_any_call(
+            2.0, 'rabbitmq_default', 'queues', 'q1', 'publish_details',
+            'rate')
+        self.assertEqual(plugin.dispatch_values.call_count, 2)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
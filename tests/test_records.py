@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the compact stats records """
+
+import logging
+import sys
+import unittest
+
+from collectd_rabbitmq import records
+
+
+class TestStatsRecord(unittest.TestCase):
+    """
+    Test class for StatsRecord.
+    """
+
+    def setUp(self):
+        self.queue = dict(
+            name='test_queue', vhost='/', node='rabbit@test',
+            arguments={'x-expires': 1000}, consumer_details=[dict()] * 10,
+            messages=5, consumer_utilisation=None,
+            message_stats=dict(publish=10,
+                               publish_details=dict(rate=1.5, samples=[]),
+                               ack=7, ack_details=dict()))
+
+    def test_from_dict(self):
+        """
+        Asserts that only dispatched stats are kept, in order, and that
+        None values are kept apart from missing ones.
+        """
+        record = records.StatsRecord.from_dict(self.queue)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(list(record.message_stats()),
+                         [('ack', 7, records.MISSING),
+                          ('publish', 10, 1.5)])
+        self.assertEqual(list(record.queue_values()),
+                         [('consumer_utilisation', None), ('messages', 5)])
+
+    def test_from_dict_without_stats(self):
+        """
+        Asserts that objects without stats get empty records.
+        """
+        record = records.StatsRecord.from_dict(dict(name='test_exchange'))
+        self.assertIsNone(record.message_counts)
+        self.assertIsNone(record.message_rates)
+        self.assertIsNone(record.queue_stats)
+        self.assertEqual(list(record.message_stats()), [])
+        self.assertEqual(list(record.queue_values()), [])
+
+    def test_as_record(self):
+        """
+        Asserts that records and None are passed through.
+        """
+        record = records.as_record(self.queue)
+        self.assertIs(records.as_record(record), record)
+        self.assertIsNone(records.as_record(None))
+
+    def test_intern_name(self):
+        """
+        Asserts that equal names share a single string.
+        """
+        first = records.intern_name(u''.join([u'test', u'_queue']))
+        second = records.intern_name(''.join(['test', '_queue']))
+        self.assertIs(first, second)
+        self.assertEqual(records.intern_name(u'caf\xe9'), u'caf\xe9')
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
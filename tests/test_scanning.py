@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for partial scans """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import scanning  # noqa
+from collectd_rabbitmq import utils  # noqa
+
+
+class TestScan(unittest.TestCase):
+    """
+    Test class for the scan cursor.
+    """
+
+    def test_slices(self):
+        """
+        Asserts that every name is selected once every slices cycles.
+        """
+        scan = scanning.Scan(slices=3)
+        names = ['e', 'a', 'd', 'b', 'c']
+        selected = [list(scan.select('queue', 'vhost', names))
+                    for _ in range(4)]
+        self.assertEqual(selected, [['a', 'b'], ['c', 'd'], ['e', 'a'],
+                                    ['b', 'c']])
+
+    def test_priority(self):
+        """
+        Asserts that priority names are selected every cycle.
+        """
+        scan = scanning.Scan(slices=2, priority=['^orders'])
+        names = ['a', 'b', 'orders.1']
+        self.assertEqual(list(scan.select('queue', 'vhost', names)),
+                         ['orders.1', 'a'])
+        self.assertEqual(list(scan.select('queue', 'vhost', names)),
+                         ['orders.1', 'b'])
+
+    def test_deleted_cursor(self):
+        """
+        Asserts that the scan resumes after a cursor that was deleted.
+        """
+        scan = scanning.Scan(slices=2)
+        list(scan.select('queue', 'vhost', ['a', 'b', 'c', 'd']))
+        self.assertEqual(list(scan.select('queue', 'vhost', ['a', 'c', 'd'])),
+                         ['c', 'd'])
+
+    @patch('collectd_rabbitmq.scanning.time.time')
+    def test_deadline(self, mock_time):
+        """
+        Asserts that the scan stops at the deadline and resumes from there.
+
+        Args:
+        :param mock_time: A patched time function
+        """
+        scan = scanning.Scan(slices=1, priority=['^p'], deadline=10)
+        mock_time.return_value = 0
+        scan.start_cycle()
+        selected = list()
+        for name in scan.select('queue', 'vhost', ['a', 'b', 'c', 'p']):
+            selected.append(name)
+            mock_time.return_value += 6
+        self.assertEqual(selected, ['p', 'a'])
+
+        scan.start_cycle()
+        self.assertEqual(list(scan.select('queue', 'vhost', ['a', 'b', 'c'])),
+                         ['b', 'c', 'a'])
+
+    def test_retain_vhosts(self):
+        """
+        Asserts that the cursors of deleted vhosts are forgotten.
+        """
+        scan = scanning.Scan(slices=2)
+        list(scan.select('queue', 'gone', ['a']))
+        list(scan.select('queue', 'kept', ['a']))
+        scan.retain_vhosts(['kept'])
+        self.assertEqual(scan.cursors.keys(), [('queue', 'kept')])
+
+
+class TestRabbitScan(unittest.TestCase):
+    """
+    Test partial scans of the RabbitMQ stats.
+    """
+
+    def test_get_stats(self):
+        """
+        Asserts that only the selected queues are requested.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              scan_slices=2)
+        stats = collectd_plugin.CollectdPlugin(config).rabbit
+        stats.get_queues = MagicMock(return_value=[
+            dict(name='a'), dict(name='b'), dict(name='c')])
+        stats.get_info = MagicMock(return_value=dict())
+
+        self.assertEqual(sorted(stats.get_queue_stats(vhost_name='vhost')),
+                         ['a', 'b'])
+        self.assertEqual(stats.instrumentation.skipped, 1)
+        self.assertEqual(sorted(stats.get_queue_stats(vhost_name='vhost')),
+                         ['a', 'c'])
+
+
+class TestPluginScan(unittest.TestCase):
+    """
+    Test partial scans in the plugin.
+    """
+
+    def test_config(self):
+        """
+        Asserts that the scan options are read and checked.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('ScanPriority', ('^orders',)),
+            collectd.Config('ScanDeadline', ('5',)),
+            collectd.Config('ScanSlices', ('4',))])
+        collectd_plugin.configure(config)
+        config = collectd_plugin.CONFIGS[-1]
+        self.assertEqual(config.scan_slices, 4)
+        self.assertEqual(config.scan_deadline, 5.0)
+        self.assertEqual(config.scan_priority, ['^orders'])
+
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('ScanSlices', ('0',))])
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    def test_rates_kept(self):
+        """
+        Asserts that local rates outlive the cycles between two scans of a
+        queue.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              local_rates=True, scan_slices=3)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        self.assertIsNotNone(plugin.rabbit.select)
+        plugin.rates.rates('key', (1,), 1.0)
+        for _ in range(3):
+            plugin.rates.end_cycle()
+        self.assertEqual(len(plugin.rates), 1)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
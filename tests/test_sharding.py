@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for sharded collection """
+
+import json
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import grouping  # noqa
+from collectd_rabbitmq import sharding  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.rabbit import RabbitMQStats  # noqa
+from tests.utils import MockURLResponse  # noqa
+
+
+class TestSharding(unittest.TestCase):
+    """
+    Test class for the shard hash.
+    """
+
+    def test_jump_hash(self):
+        """
+        Asserts the buckets of the reference implementation.
+        """
+        self.assertEqual(sharding.jump_hash(1, 1), 0)
+        self.assertEqual(sharding.jump_hash(42, 57), 43)
+        self.assertEqual(sharding.jump_hash(0xDEAD10CC, 666), 361)
+        self.assertEqual(sharding.jump_hash(256, 1024), 520)
+
+    def test_shard_of(self):
+        """
+        Asserts that shards are stable and balanced.
+        """
+        self.assertEqual([sharding.shard_of('%2F', 'q%d' % index, 4)
+                          for index in range(8)], [1, 0, 1, 3, 0, 1, 2, 2])
+        counts = [0] * 4
+        for index in range(4000):
+            counts[sharding.shard_of('%2F', 'q%d' % index, 4)] += 1
+        self.assertTrue(all(900 < count < 1100 for count in counts))
+
+    def test_consistent(self):
+        """
+        Asserts that an added shard only takes objects from the others.
+        """
+        for index in range(1000):
+            name = 'q%d' % index
+            shard = sharding.shard_of('%2F', name, 5)
+            if shard != 4:
+                self.assertEqual(shard, sharding.shard_of('%2F', name, 4))
+
+
+class TestRabbitSharding(unittest.TestCase):
+    """
+    Test the sharding of listed objects.
+    """
+
+    @patch('collectd_rabbitmq.rabbit.urllib2.urlopen')
+    def test_get_listed_stats(self, mock_urlopen):
+        """
+        Asserts that shards split the queues without overlap, and that the
+        queues of a group stay together.
+
+        Args:
+        :param mock_urlopen: A patched urllib object
+        """
+        queues = [dict(name='q%d' % index) for index in range(100)]
+        queues += [dict(name='tenant.%d' % index) for index in range(20)]
+        mock_urlopen.side_effect = lambda *args, **kwargs: MockURLResponse(
+            json.dumps(queues))
+        groups = dict(queue=[grouping.Grouping(prefixes=['tenant.'])])
+
+        names = list()
+        for index in range(3):
+            config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                                  groups=groups, collect='list',
+                                  shard_index=index, shard_count=3)
+            stats = RabbitMQStats(config)
+            shard = stats.get_queue_stats(vhost_name='vhost')
+            tenants = [name for name in shard if name.startswith('tenant.')]
+            self.assertIn(len(tenants), (0, 20))
+            self.assertEqual(stats.instrumentation.other_shards,
+                             120 - len(shard))
+            names.extend(shard)
+        self.assertEqual(sorted(names),
+                         sorted(queue['name'] for queue in queues))
+
+
+class TestPluginSharding(unittest.TestCase):
+    """
+    Test sharding in the plugin.
+    """
+
+    def test_config(self):
+        """
+        Asserts that the shard is read and checked.
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('ShardIndex', ('1',)),
+            collectd.Config('ShardCount', ('2',))])
+        collectd_plugin.configure(config)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].shard_index, 1)
+        self.assertEqual(collectd_plugin.CONFIGS[-1].shard_count, 2)
+
+        config.children[-1] = collectd.Config('ShardCount', ('1',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+    def test_cluster_stats(self):
+        """
+        Asserts that only the first shard collects cluster wide stats.
+        """
+        for index, expected in ((0, True), (1, False)):
+            config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                                  vhost_totals=True, shard_index=index,
+                                  shard_count=2)
+            plugin = collectd_plugin.CollectdPlugin(config)
+            plugin.rabbit.get_vhosts = MagicMock(
+                return_value=[dict(name='vhost')])
+            plugin.dispatch_nodes = MagicMock()
+            plugin.dispatch_overview = MagicMock()
+            plugin.dispatch_vhost_totals = MagicMock()
+            plugin.dispatch_exchanges = MagicMock()
+            plugin.dispatch_queues = MagicMock()
+            plugin.read()
+
+            self.assertEqual(plugin.dispatch_nodes.called, expected)
+            self.assertEqual(plugin.dispatch_overview.called, expected)
+            self.assertEqual(plugin.dispatch_vhost_totals.called, expected)
+            self.assertTrue(plugin.dispatch_queues.called)
+
+    def test_self_plugin(self):
+        """
+        Asserts that the self metrics of each shard have their own name.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              shard_index=1, shard_count=2)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        self.assertEqual(plugin.self_plugin, 'collectd_rabbitmq_shard1')
+        self.assertEqual(collectd_plugin.CollectdPlugin.self_plugin,
+                         'collectd_rabbitmq')
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
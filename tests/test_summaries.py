@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for queue distribution summaries """
+
+import logging
+import os
+import random
+import sys
+import unittest
+
+from mock import MagicMock
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import grouping  # noqa
+from collectd_rabbitmq import summaries  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq.records import StatsRecord  # noqa
+
+
+class TestSketch(unittest.TestCase):
+    """
+    Test class for the Sketch.
+    """
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.values = [int(rng.paretovariate(1.2)) for _ in range(10000)]
+
+    def assert_quantiles(self, sketch, values):
+        """
+        Asserts that quantiles are within the accuracy of exact ones.
+        """
+        values = sorted(values)
+        for fraction in (0.5, 0.9, 0.99):
+            exact = values[int(fraction * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(fraction) - exact),
+                                 exact * sketch.accuracy * 1.0001)
+
+    def test_quantiles(self):
+        """
+        Asserts that quantiles are within accuracy, and that count, min,
+        max and mean are exact.
+        """
+        sketch = summaries.Sketch()
+        for value in self.values:
+            sketch.add(value)
+        self.assert_quantiles(sketch, self.values)
+        summary = dict(sketch.summary())
+        self.assertEqual(summary['count'], len(self.values))
+        self.assertEqual(summary['min'], min(self.values))
+        self.assertEqual(summary['max'], max(self.values))
+        self.assertAlmostEqual(summary['mean'],
+                               float(sum(self.values)) / len(self.values))
+
+    def test_merge(self):
+        """
+        Asserts that merged sketches summarize all values.
+        """
+        first = summaries.Sketch()
+        second = summaries.Sketch()
+        for index, value in enumerate(self.values):
+            (first if index % 3 else second).add(value)
+        first.merge(second)
+        self.assertEqual(first.count, len(self.values))
+        self.assert_quantiles(first, self.values)
+        self.assertRaises(ValueError, first.merge, summaries.Sketch(0.05))
+
+    def test_zeros(self):
+        """
+        Asserts that zeros are counted apart.
+        """
+        sketch = summaries.Sketch()
+        for value in [0, 0, 0, 10]:
+            sketch.add(value)
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+        self.assertAlmostEqual(sketch.quantile(1.0), 10, delta=0.1)
+
+    def test_empty(self):
+        """
+        Asserts that an empty sketch only has a count.
+        """
+        sketch = summaries.Sketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        self.assertEqual(sketch.summary(), [('count', 0)])
+
+
+class TestSummaries(unittest.TestCase):
+    """
+    Test summarizing and dispatching queue stats.
+    """
+
+    def setUp(self):
+        self.stats = dict(
+            q1=StatsRecord.from_dict(dict(
+                messages=10, messages_unacknowledged=1, consumers=2,
+                message_stats=dict(publish=1,
+                                   publish_details=dict(rate=4.0)))),
+            q2=StatsRecord.from_dict(dict(messages=30, consumers=0)),
+            q3=None)
+
+    def test_summarize(self):
+        """
+        Asserts that missing stats are left out, and missing rates are zero.
+        """
+        sketches = summaries.summarize(self.stats)
+        self.assertEqual(sketches['messages'].count, 2)
+        self.assertEqual(sketches['messages'].total, 40)
+        self.assertEqual(sketches['messages_unacknowledged'].count, 1)
+        self.assertEqual(sketches['publish_rate'].min, 0.0)
+        self.assertEqual(sketches['publish_rate'].max, 4.0)
+
+    def test_dispatch_summaries_only(self):
+        """
+        Asserts that only summaries are dispatched without queue series.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              queue_series=False, queue_summaries=True)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.get_queue_stats = MagicMock(return_value=self.stats)
+        plugin.dispatch_values = MagicMock()
+        plugin.dispatch_queues('%2F')
+
+        plugin.dispatch_values.assert_any_call(
+            30, 'rabbitmq_default', 'queue_summary', 'messages',
+            'rabbitmq_summary', 'max')
+        plugins = set(call[0][2] for call in
+                      plugin.dispatch_values.call_args_list)
+        self.assertEqual(plugins, set(['queue_summary']))
+        self.assertEqual(plugin.dispatch_values.call_count,
+                         7 * len(summaries.FIELDS))
+
+    def test_grouped_queues(self):
+        """
+        Asserts that grouped queues are summarized one by one, not as the
+        record of their group.
+        """
+        stats = dict(('tenant-%d' % index,
+                      StatsRecord.from_dict(dict(messages=index)))
+                     for index in range(100))
+        stats['orders'] = StatsRecord.from_dict(dict(messages=5))
+        groups = dict(queue=[grouping.Grouping(prefixes=['tenant-'])])
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              queue_summaries=True, groups=groups)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.rabbit.get_queue_stats = MagicMock(return_value=stats)
+        plugin.dispatch_values = MagicMock()
+        plugin.dispatch_queues('%2F')
+
+        summary = dict((call[0][5], call[0][0]) for call in
+                       plugin.dispatch_values.call_args_list
+                       if call[0][2:4] == ('queue_summary', 'messages'))
+        self.assertEqual(summary['count'], 101)
+        self.assertEqual(summary['min'], 0)
+        self.assertEqual(summary['max'], 99)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for watched queues """
+
+import logging
+import os
+import sys
+import unittest
+
+from mock import MagicMock, call, patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import records  # noqa
+from collectd_rabbitmq import utils  # noqa
+
+WATCH = utils.WatchInfo('payments', 0.5, [('/', 'payments.ingest')])
+
+
+class TestWatcher(unittest.TestCase):
+    """
+    Test class for the watcher of a few queues.
+    """
+
+    def create_plugin(self, **kwargs):
+        """
+        Returns a plugin watching WATCH, with mocked dispatch.
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              watches=[WATCH], **kwargs)
+        plugin = collectd_plugin.CollectdPlugin(config)
+        plugin.dispatch_values = MagicMock()
+        return plugin
+
+    def test_read(self):
+        """
+        Asserts that the watched queues are requested with their columns
+        only and dispatched, apart from the collection cycles.
+        """
+        plugin = self.create_plugin()
+        watcher = plugin.watchers[0]
+        watcher.rabbit.get_info = MagicMock(return_value=dict(
+            name='payments.ingest', messages=3))
+        watcher.dispatcher.dispatch_values = MagicMock()
+        watcher.read()
+        watcher.rabbit.get_info.assert_called_once_with(
+            'queues', '%2F', 'payments.ingest',
+            columns=records.COLUMNS['queue'], project=True)
+        self.assertIn(call(3, 'rabbitmq_default', 'queues',
+                           'payments.ingest', 'messages'),
+                      watcher.dispatcher.dispatch_values.call_args_list)
+        self.assertFalse(plugin.dispatch_values.called)
+
+    def test_own_state(self):
+        """
+        Asserts that a watcher shares no state with the collection cycles.
+        """
+        plugin = self.create_plugin(local_rates=True)
+        del plugin.dispatch_values
+        watcher = plugin.watchers[0]
+        watcher.rabbit.get_info = MagicMock(return_value=dict(
+            name='payments.ingest', messages=3))
+        watcher.read()
+        self.assertEqual(plugin.hosts, dict())
+        self.assertEqual(len(plugin.rates), 0)
+        self.assertEqual(len(watcher.dispatcher.rates), 1)
+        self.assertEqual(plugin.instrumentation.values_dispatched, 0)
+        self.assertEqual(watcher.rabbit.instrumentation.values_dispatched, 1)
+        self.assertNotIsInstance(watcher.dispatcher,
+                                 collectd_plugin.CollectdPlugin)
+
+    def test_local_rates(self):
+        """
+        Asserts that only counters are requested with local rates.
+        """
+        plugin = self.create_plugin(local_rates=True)
+        self.assertEqual(plugin.watchers[0].columns,
+                         records.COUNTER_COLUMNS['queue'])
+
+    def test_not_poller(self):
+        """
+        Asserts that the nodes that do not poll the cluster do not poll
+        the watched queues either.
+        """
+        plugin = self.create_plugin(designated_poller=True)
+        plugin.poller = False
+        watcher = plugin.watchers[0]
+        watcher.rabbit.get_info = MagicMock()
+        watcher.read()
+        self.assertFalse(watcher.rabbit.get_info.called)
+
+    def test_before_election(self):
+        """
+        Asserts that with a designated poller, no node polls the watched
+        queues before it was elected, and the elected one does.
+        """
+        plugin = self.create_plugin(designated_poller=True)
+        self.assertIsNone(plugin.poller)
+        watcher = plugin.watchers[0]
+        watcher.rabbit.get_info = MagicMock(return_value=None)
+        watcher.read()
+        self.assertFalse(watcher.rabbit.get_info.called)
+
+        plugin.poller = True
+        watcher.read()
+        self.assertTrue(watcher.rabbit.get_info.called)
+
+    def test_excluded(self):
+        """
+        Asserts that the watched queues are left out of the cycles of
+        every shard, and only watched by the first.
+        """
+        for index, watchers in ((0, 1), (1, 0)):
+            plugin = self.create_plugin(shard_count=2, shard_index=index)
+            self.assertEqual(len(plugin.watchers), watchers)
+            stats = plugin.rabbit
+            stats.get_queues = MagicMock(return_value=[
+                dict(name='payments.ingest'), dict(name='other')])
+            self.assertIsNone(stats.inventory.resolve(
+                'queue', '%2F', 'payments.ingest'))
+            self.assertIsNotNone(stats.inventory.resolve(
+                'queue', 'vhost', 'payments.ingest'))
+
+    @patch('collectd_rabbitmq.collectd_plugin.collectd.register_read')
+    def test_config(self, mock_register):
+        """
+        Asserts that Watch blocks are read, and registered with their own
+        interval.
+
+        Args:
+        :param mock_register: A patched register_read function
+        """
+        config = collectd.Config('Module', ('rabbitmq',), [
+            collectd.Config('Username', ('guest',)),
+            collectd.Config('Password', ('guest',)),
+            collectd.Config('Host', ('localhost',)),
+            collectd.Config('Port', ('15672',)),
+            collectd.Config('Realm', ('RabbitMQ Management',)),
+            collectd.Config('Watch', ('payments',), [
+                collectd.Config('Interval', ('0.5',)),
+                collectd.Config('Queue', ('/', 'payments.ingest'))])])
+        del collectd_plugin.CONFIGS[:]
+        collectd_plugin.configure(config)
+        watch = collectd_plugin.CONFIGS[-1].watches[0]
+        self.assertEqual(watch.name, 'payments')
+        self.assertEqual(watch.interval, 0.5)
+        self.assertEqual(watch.queues, [('/', 'payments.ingest')])
+
+        del collectd_plugin.INSTANCES[:]
+        collectd_plugin.init()
+        watcher = collectd_plugin.INSTANCES[-1].watchers[0]
+        mock_register.assert_called_with(
+            watcher.read, 0.5,
+            name='rabbitmq-0-http://localhost:15672-watch-payments')
+        del collectd_plugin.CONFIGS[:]
+        del collectd_plugin.INSTANCES[:]
+
+        config.children[-1].children[-1] = collectd.Config('Queue', ('/',))
+        self.assertRaises(ValueError, collectd_plugin.configure, config)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
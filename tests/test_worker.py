@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# -*- coding: iso-8859-15 -*-
+
+# Copyright (c) 2014 The New York Times Company
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test module for the worker process """
+
+import BaseHTTPServer
+import cPickle
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+from mock import patch
+
+# Updating path so that the mock collectd gets added
+sys.path.append(os.path.dirname(__file__))
+import collectd  # noqa
+from collectd_rabbitmq import collectd_plugin  # noqa
+from collectd_rabbitmq import rabbit  # noqa
+from collectd_rabbitmq import records  # noqa
+from collectd_rabbitmq import utils  # noqa
+from collectd_rabbitmq import worker  # noqa
+
+QUEUES = [dict(name='a', messages=3, consumers=1,
+               backing_queue_status=dict(len=3)),
+          dict(name='b', messages=0, message_stats=dict(publish=4))]
+RESPONSES = {
+    '/api/queues/%2F': QUEUES,
+    '/api/queues/%2F/a': QUEUES[0],
+    '/api/queues/%2F/b': QUEUES[1],
+}
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves RESPONSES, whatever the columns, and 404 for the other paths.
+    """
+
+    def do_GET(self):  # pylint: disable=C0103
+        """
+        Serves a response.
+        """
+        path = self.path.split('?')[0]
+        if path not in RESPONSES:
+            self.send_error(404)
+            return
+        body = json.dumps(RESPONSES[path])
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        """
+        Keeps the test output quiet.
+        """
+        pass
+
+
+class TestProject(unittest.TestCase):
+    """
+    Test class for the projection of API values.
+    """
+
+    def test_project(self):
+        """
+        Asserts that queues and exchanges are projected, single or listed.
+        """
+        queue = dict(name='a', messages=3)
+        self.assertIsInstance(rabbit.project_info(('queues', '%2F', 'a'),
+                                                  None, queue),
+                              records.StatsRecord)
+        names, listed = rabbit.project_info(('queues', '%2F'), ['name'],
+                                            [queue, dict()])
+        self.assertEqual((names, listed), (['a'], None))
+        names, listed = rabbit.project_info(
+            ('exchanges', '%2F'), ['name', 'messages'], [queue])
+        self.assertEqual(listed[0].queue_stats[2], 3)
+        self.assertEqual(rabbit.project_info(('nodes', 'rabbit@a'), None,
+                                             queue), queue)
+        self.assertEqual(rabbit.project_listing((names, listed), None),
+                         (names, listed))
+
+    def test_missing(self):
+        """
+        Asserts that MISSING is still MISSING once unpickled.
+        """
+        record = records.as_record(dict(messages=3))
+        record = cPickle.loads(cPickle.dumps(record, 2))
+        self.assertIs(record.queue_stats[0], records.MISSING)
+        self.assertEqual(record.queue_stats[2], 3)
+
+
+class TestWorker(unittest.TestCase):
+    """
+    Test the plugin with a worker process.
+    """
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        config = utils.Config(
+            utils.Auth(), utils.ConnectionInfo(
+                '127.0.0.1', self.server.server_address[1]), worker=True)
+        self.plugin = collectd_plugin.CollectdPlugin(config)
+        self.stats = self.plugin.rabbit
+
+    def tearDown(self):
+        self.stats.worker.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_queue_stats(self):
+        """
+        Asserts that the worker requests and projects the queues.
+        """
+        self.assertIsInstance(self.stats, worker.WorkerRabbitMQStats)
+        stats = self.stats.get_queue_stats(vhost_name='%2F')
+        self.assertEqual(sorted(stats), ['a', 'b'])
+        self.assertEqual(stats['a'].queue_stats[2], 3)
+        self.assertEqual(stats['b'].message_counts[1], 4)
+        self.assertEqual(self.stats.instrumentation.endpoints['queue']
+                         .requests, 2)
+
+    def test_listing(self):
+        """
+        Asserts that the worker sends back projected listings, names only
+        or with records.
+        """
+        self.assertEqual(self.stats.get_queues('%2F', columns=['name'],
+                                               project=True),
+                         (['a', 'b'], None))
+        names, listed = self.stats.get_queues(
+            '%2F', columns=records.COLUMNS['queue'], project=True)
+        self.assertEqual(names, ['a', 'b'])
+        self.assertIsInstance(listed[0], records.StatsRecord)
+        self.assertEqual(listed[0].queue_stats[2], 3)
+
+    def test_list_collect(self):
+        """
+        Asserts that Collect list takes the projected listing.
+        """
+        self.stats.config.collect = 'list'
+        stats = self.stats.get_queue_stats(vhost_name='%2F')
+        self.assertEqual(stats['b'].message_counts[1], 4)
+        self.assertEqual(self.stats.instrumentation.endpoints['queues']
+                         .requests, 1)
+
+    @patch('collectd_rabbitmq.worker.collectd.error')
+    def test_log(self, mock_error):
+        """
+        Asserts that the messages of the worker are logged by the plugin.
+
+        Args:
+        :param mock_error: A patched collectd error function
+        """
+        self.assertIsNone(self.stats.get_info('queues', '%2F', 'c'))
+        self.assertIn('HTTP Error', mock_error.call_args[0][0])
+        self.assertEqual(self.stats.instrumentation.endpoints['queue']
+                         .errors, 1)
+
+    def test_restart(self):
+        """
+        Asserts that a worker that died is started again.
+        """
+        self.assertEqual(self.stats.get_info('queues', '%2F', 'a',
+                                             project=True).queue_stats[2], 3)
+        self.stats.worker.process.kill()
+        self.stats.worker.process.wait()
+        self.assertEqual(self.stats.get_info('queues', '%2F', 'a',
+                                             project=True).queue_stats[2], 3)
+        self.assertEqual(self.stats.worker.starts, 2)
+
+
+class TestWorkerStart(unittest.TestCase):
+    """
+    Test a worker that cannot be started.
+    """
+
+    @patch('collectd_rabbitmq.worker.collectd.error')
+    def test_failed_start(self, mock_error):
+        """
+        Asserts that a worker that cannot be started fails its requests
+        without raising, and is not started again before its delay.
+
+        Args:
+        :param mock_error: A patched collectd error function
+        """
+        config = utils.Config(utils.Auth(), utils.ConnectionInfo(),
+                              worker=True,
+                              worker_python='/nonexistent/python')
+        stats = worker.WorkerRabbitMQStats(config)
+        with patch('collectd_rabbitmq.worker.subprocess.Popen',
+                   side_effect=OSError(2, 'No such file')) as mock_popen:
+            self.assertIsNone(stats.get_info('queues', '%2F', 'a'))
+            self.assertIsNone(stats.get_info('queues', '%2F', 'b'))
+            self.assertEqual(mock_popen.call_count, 1)
+            self.assertIn('No such file', mock_error.call_args[0][0])
+
+            stats.worker.restart_at = 0.0
+            self.assertIsNone(stats.get_info('queues', '%2F', 'a'))
+            self.assertEqual(mock_popen.call_count, 2)
+        self.assertEqual(stats.worker.failures, 2)
+        self.assertGreater(stats.worker.restart_at - time.time(),
+                           worker.RESTART_DELAY)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger().setLevel(logging.DEBUG)
+    unittest.main()
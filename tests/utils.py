@@ -18,8 +18,11 @@
 """ Simple test modules rabbit test module """
 
 import json
+import urllib
 import urlparse
 
+from collectd_rabbitmq.records import StatsRecord
+
 
 def get_message_stats_data(name):
     """
@@ -34,10 +37,42 @@ def get_message_stats_data(name):
                 ))
 
 
-def create_mock_url_repsonse(url):
+def create_queue_record(messages, consumers, ready=None, publish=None,
+                        publish_rate=1.0, deliver_rate=None):
+    """
+    Returns the records.StatsRecord of a queue. publish is its publish
+    counter, with publish_rate as rate, and deliver_rate adds a deliver_get
+    rate.
+    """
+    data = dict(messages=messages, consumers=consumers)
+    if ready is not None:
+        data['messages_ready'] = ready
+    message_stats = dict()
+    if publish is not None:
+        message_stats.update(publish=publish,
+                             publish_details=dict(rate=publish_rate))
+    if deliver_rate is not None:
+        message_stats.update(deliver_get=1,
+                             deliver_get_details=dict(rate=deliver_rate))
+    if message_stats:
+        data['message_stats'] = message_stats
+    return StatsRecord.from_dict(data)
+
+
+def get_request_url(request):
+    """
+    Returns the URL of a urllib2 request or of a plain URL string.
+    """
+    if hasattr(request, 'get_full_url'):
+        return request.get_full_url()
+    return request
+
+
+def create_mock_url_repsonse(url, *args, **kwargs):
     """
     Returns mocked stats data based on URL.
     """
+    url = get_request_url(url)
     name = urlparse.urlparse(url).path.split('/')[-1:][0]
     data = get_message_stats_data(name)
     return MockURLResponse(json.dumps(data))
@@ -158,7 +193,7 @@ def get_node_stats_data():
     }]
 
 
-def create_mock_node_url_repsonse(url=None):
+def create_mock_node_url_repsonse(url=None, *args, **kwargs):
     """
     Returns mocked node stats data based on URL.
     """
@@ -166,6 +201,29 @@ def create_mock_node_url_repsonse(url=None):
     return MockURLResponse(json.dumps(data))
 
 
+def create_generated_url_response(payloads):
+    """
+    Returns a urlopen side effect that serves the payloads of a
+    benchmarks.fixtures.ClusterGenerator, including single objects.
+    """
+    objects = dict()
+    for path, payload in payloads.items():
+        if path.startswith(('queues/', 'exchanges/')):
+            for item in payload:
+                objects["%s/%s" % (path, item['name'])] = item
+
+    def urlopen(url, *args, **kwargs):
+        """
+        Returns the generated payload for url.
+        """
+        path = urlparse.urlparse(get_request_url(url)).path
+        parts = [urllib.unquote(part) for part in path.split('/')][2:]
+        key = '/'.join(parts)
+        payload = payloads.get(key, objects.get(key))
+        return MockURLResponse(json.dumps(payload))
+    return urlopen
+
+
 class MockURLResponse(object):
     """
     A class to mock URL lib response